@@ -0,0 +1,178 @@
+import os
+import stat
+from functools import partial
+import sys
+import time
+import types
+
+import pytest
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+
+# pygfs/__init__.py imports the analysis tasks and their dependencies (netCDF4, jcb, ...);
+# only the archive task and its utilities are tested here, so the package is not initialized
+if 'pygfs' not in sys.modules:
+    pygfs = types.ModuleType('pygfs')
+    pygfs.__path__ = [os.path.join(HOMEgfs, 'ush', 'python', 'pygfs')]
+    sys.modules['pygfs'] = pygfs
+
+from wxflow import AttrDict, cast_strdict_as_dtypedict
+from pygfs.task.archive import Archive
+from pygfs.utils.archive_utils import manifest_path, scan_fileset, schedule_datasets
+
+# Stand-in for htar: each call is logged; creating a tarball whose name is in
+# FAKE_HTAR_FAILURES (as name:count) fails for its first count attempts
+fake_htar = """#!/usr/bin/env bash
+target=""
+while (( $# > 0 )); do
+  if [[ "$1" == -*f ]]; then target=$2; shift; fi
+  shift
+done
+name=$(basename "${target}")
+echo "${name}" >> "${FAKE_HTAR_LOG}"
+attempts=$(grep -cx "${name}" "${FAKE_HTAR_LOG}")
+for failure in ${FAKE_HTAR_FAILURES:-}; do
+  if [[ "${failure%%:*}" == "${name}" ]] && (( attempts <= ${failure##*:} )); then
+    echo "HTAR: write error on ${target}" >&2
+    exit 72
+  fi
+done
+echo "HTAR: HTAR SUCCESSFUL"
+"""
+
+
+@pytest.fixture
+def fake_hpss(tmp_path, monkeypatch):
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    for exe, script in [('htar', fake_htar), ('hsi', '#!/usr/bin/env bash\nexit 0\n')]:
+        (bindir / exe).write_text(script)
+        (bindir / exe).chmod(stat.S_IRWXU)
+    log = tmp_path / 'htar.log'
+    log.touch()
+    monkeypatch.setenv('PATH', f"{bindir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('FAKE_HTAR_LOG', str(log))
+    return log
+
+
+def archive_task(tmp_path, **config):
+    task_config = {'PDY': '20240101', 'cyc': '00', 'assim_freq': '6', 'ROTDIR': str(tmp_path / 'rotdir'),
+                   'ARCH_HTAR_SESSIONS': '1', 'ARCH_HTAR_RETRIES': '0', 'ARCH_HTAR_BACKOFF': '0'}
+    task_config.update({key: str(value) for key, value in config.items()})
+    archive = Archive(cast_strdict_as_dtypedict(task_config))
+    archive.tar_cmd = "htar"
+    return archive
+
+
+def dataset(name, size):
+    return AttrDict(target=f"/hpss/expt/{name}", size=size, fileset=[f"{name}.file"], has_rstprod=False)
+
+
+def archived_dataset(tmp_path, name):
+    # The archive job runs from ROTDIR
+    rotdir = tmp_path / 'rotdir'
+    (rotdir / 'gfs.20240101' / '00').mkdir(parents=True, exist_ok=True)
+    if not (rotdir / 'gfs.20240101' / '00' / 'gfs.t00z.atmf000.nc').exists():
+        (rotdir / 'gfs.20240101' / '00' / 'gfs.t00z.atmf000.nc').write_bytes(b'data' * 100)
+    os.chdir(rotdir)
+    fileset = ['gfs.20240101/00']
+    return AttrDict(target=f"/hpss/expt/{name}", fileset=fileset, has_rstprod=False,
+                    manifest=scan_fileset(fileset))
+
+
+def test_htar_skip_on_rerun(tmp_path, fake_hpss, monkeypatch):
+    archive = archive_task(tmp_path, ARCH_INCREMENTAL='YES', ARCH_MANIFEST_DIR=tmp_path / 'manifests')
+    monkeypatch.chdir(tmp_path)
+    dataset = archived_dataset(tmp_path, 'gfsa.tar')
+
+    assert not archive._manifest_matches(dataset)
+    archive.execute_backup_datasets([dataset])
+    assert (tmp_path / 'manifests' / 'hpss' / 'expt' / 'gfsa.tar.manifest.json').is_file()
+
+    # Rerun: the tarball is up to date and htar is not run again
+    dataset = archived_dataset(tmp_path, 'gfsa.tar')
+    dataset.up_to_date = archive._manifest_matches(dataset)
+    assert dataset.up_to_date
+    archive.execute_backup_datasets([dataset])
+    assert fake_hpss.read_text().split() == ['gfsa.tar']
+
+    # Rerun after a file changed
+    os.utime('gfs.20240101/00/gfs.t00z.atmf000.nc', (0, 0))
+    dataset = archived_dataset(tmp_path, 'gfsa.tar')
+    assert not archive._manifest_matches(dataset)
+
+
+def test_tar_skip_on_rerun(tmp_path, monkeypatch):
+    archive = archive_task(tmp_path, ARCH_INCREMENTAL='YES', ARCH_VERIFY='DEEP', ARCH_CHECKSUM='sha256')
+    monkeypatch.chdir(tmp_path)
+    archive.tar_cmd = "tar"
+    archive.cvf = partial(Archive._create_tarball, checksum='sha256')
+    dataset = archived_dataset(tmp_path, 'gfsa.tar')
+    dataset.target = str(tmp_path / 'atardir' / 'gfsa.tar')
+
+    archive.execute_backup_datasets([dataset])
+    assert os.path.isfile(manifest_path(dataset.target))
+    mtime = os.stat(dataset.target).st_mtime_ns
+
+    dataset.up_to_date = archive._manifest_matches(dataset)
+    assert dataset.up_to_date
+    archive.execute_backup_datasets([dataset])
+    assert os.stat(dataset.target).st_mtime_ns == mtime
+
+
+def test_htar_retries(tmp_path, fake_hpss, monkeypatch):
+    monkeypatch.setenv('FAKE_HTAR_FAILURES', 'gfsa.tar:2')
+    archive = archive_task(tmp_path, ARCH_HTAR_RETRIES=2, ARCH_HTAR_BACKOFF=0.01)
+
+    archive.execute_backup_datasets([dataset('gfsa.tar', 10), dataset('gfsb.tar', 20)])
+
+    # Largest first, then gfsa.tar succeeds on its third attempt
+    assert fake_hpss.read_text().split() == ['gfsb.tar', 'gfsa.tar', 'gfsa.tar', 'gfsa.tar']
+
+
+def test_htar_failure_after_retries(tmp_path, fake_hpss, monkeypatch):
+    monkeypatch.setenv('FAKE_HTAR_FAILURES', 'gfsa.tar:3')
+    archive = archive_task(tmp_path, ARCH_HTAR_SESSIONS=2, ARCH_HTAR_RETRIES=2, ARCH_HTAR_BACKOFF=0.01)
+
+    # A dataset failing every attempt does not stop the others, but fails the task
+    with pytest.raises(RuntimeError, match='gfsa.tar'):
+        archive.execute_backup_datasets([dataset('gfsa.tar', 10), dataset('gfsb.tar', 20)])
+
+    calls = fake_hpss.read_text().split()
+    assert calls.count('gfsa.tar') == 3
+    assert calls.count('gfsb.tar') == 1
+
+
+def test_schedule_datasets_largest_first():
+    started = []
+    datasets = [{'target': name, 'size': size} for name, size in [('small', 1), ('large', 100), ('medium', 10)]]
+
+    results = schedule_datasets(lambda dataset: started.append(dataset['target']), datasets, nworkers=1)
+
+    assert started == ['large', 'medium', 'small']
+    assert [result.target for result in results] == ['large', 'medium', 'small']
+    assert all(result.error is None and result.attempts == 1 for result in results)
+
+
+def test_schedule_datasets_backoff_and_timing():
+    failures = {'flaky': 2, 'broken': 10}
+
+    def action(dataset):
+        time.sleep(0.01)
+        if failures[dataset['target']] > 0:
+            failures[dataset['target']] -= 1
+            raise OSError(f"failed {dataset['target']}")
+
+    datasets = [{'target': 'flaky', 'size': 2}, {'target': 'broken', 'size': 1}]
+    results = schedule_datasets(action, datasets, nworkers=2, retries=2, backoff=0.05)
+    results = {result.target: result for result in results}
+
+    assert results['flaky'].error is None
+    assert results['flaky'].attempts == 3
+    assert isinstance(results['broken'].error, OSError)
+    assert results['broken'].attempts == 3
+    # Three attempts, with backoffs of 0.05 and 0.1 s in between
+    for result in results.values():
+        assert result.elapsed >= 3 * 0.01 + 0.05 + 0.1
+        assert result.size > 0
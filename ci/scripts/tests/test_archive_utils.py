@@ -0,0 +1,270 @@
+import glob
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import types
+
+import pytest
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+
+# pygfs/__init__.py imports the analysis tasks and their dependencies (netCDF4, jcb, ...);
+# only the archive utilities are tested here, so the package is not initialized
+if 'pygfs' not in sys.modules:
+    pygfs = types.ModuleType('pygfs')
+    pygfs.__path__ = [os.path.join(HOMEgfs, 'ush', 'python', 'pygfs')]
+    sys.modules['pygfs'] = pygfs
+
+from pygfs.utils.archive_utils import (FileIndex, create_diag_tarball, create_tarball, manifest_matches, manifest_path,
+                                       scan_fileset, verify_tarball, write_manifest)
+
+
+def make_tree(root):
+    """
+    Small tree of files to archive, returned as a relative fileset (as the archive job runs from ROTDIR)
+    """
+    os.makedirs(root / 'gfs.20240101' / '00' / 'atmos', exist_ok=True)
+    (root / 'gfs.20240101' / '00' / 'atmos' / 'gfs.t00z.atmf000.nc').write_bytes(os.urandom(3000))
+    (root / 'gfs.20240101' / '00' / 'atmos' / 'gfs.t00z.sfcf000.nc').write_bytes(os.urandom(700))
+    (root / 'gfs.20240101' / '00' / 'gfs.t00z.log').write_text('log\n')
+    return ['gfs.20240101/00/atmos', 'gfs.20240101/00/gfs.t00z.log']
+
+
+def make_links(root):
+    """
+    Hidden files and symbolic links (to a file, a directory and nothing) next to the tree of make_tree
+    """
+    atmos = root / 'gfs.20240101' / '00' / 'atmos'
+    (atmos / '.gfs.t00z.atmf000.nc.lock').write_text('')
+    os.symlink('gfs.t00z.atmf000.nc', atmos / 'gfs.t00z.atmf000.link.nc')
+    os.symlink('gfs.t00z.missing.nc', atmos / 'gfs.t00z.broken.nc')
+    os.symlink('00', root / 'gfs.20240101' / '00.link')
+
+
+@pytest.mark.parametrize("pattern", [
+    '*', 'gfs.*', '*/*', 'gfs.20240101/*', 'gfs.20240101/*/', 'gfs.20240101/00*/atmos/*.nc',
+    'gfs.20240101/*/atmos/gfs.t00z.atmf000.nc', 'gfs.20240101/0[0-9]/gfs.t??z.log', 'gfs.20240101/**/*.nc',
+    'gfs.20240101/00/atmos/.*', 'gfs.20240101/00/atmos/gfs.t00z.broken.nc', 'gfs.20240101/00.link/',
+    'gfs.20240101/00.link/atmos/*', 'gfs.20240101/00/gfs.t00z.log/*', 'gfs.20240101/00/atmos/*.grb2',
+    'gdas.*/*', 'gfs.20240101/00/missing', './gfs.20240101/00/*', '{root}/gfs.20240101/*/atmos/*f000*'])
+def test_file_index_glob(tmp_path, monkeypatch, pattern):
+    monkeypatch.chdir(tmp_path)
+    make_tree(tmp_path)
+    make_links(tmp_path)
+    pattern = pattern.format(root=tmp_path)
+
+    assert sorted(FileIndex().glob(pattern)) == sorted(glob.glob(pattern))
+
+
+def test_file_index_entries(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fileset = make_tree(tmp_path)
+    make_links(tmp_path)
+    index = FileIndex()
+
+    for path in ['gfs.20240101/00/atmos/gfs.t00z.atmf000.nc', 'gfs.20240101/00/atmos/gfs.t00z.atmf000.link.nc',
+                 'gfs.20240101/00/atmos/gfs.t00z.broken.nc', 'gfs.20240101/00.link']:
+        stat = os.lstat(path)
+        assert index.entry(path) == {'mode': stat.st_mode, 'size': stat.st_size,
+                                     'gid': stat.st_gid, 'mtime': stat.st_mtime}
+        assert index.entry(path) is index.entry(path)
+
+    # The group is that of the file a link points to, as os.stat
+    assert index.gid('gfs.20240101/00/atmos/gfs.t00z.atmf000.link.nc') == \
+        os.stat('gfs.20240101/00/atmos/gfs.t00z.atmf000.link.nc').st_gid
+    with pytest.raises(FileNotFoundError):
+        index.gid('gfs.20240101/00/atmos/gfs.t00z.broken.nc')
+
+    # Links are archived as links: no size, and linked directories are not descended into
+    entries = {name: size for name, size, _ in scan_fileset(fileset + ['gfs.20240101/00.link'], index)}
+    assert entries['gfs.20240101/00/atmos/gfs.t00z.atmf000.link.nc'] == 0
+    assert entries['gfs.20240101/00/atmos/gfs.t00z.broken.nc'] == 0
+    assert entries['gfs.20240101/00.link'] == 0
+    assert not any(name.startswith('gfs.20240101/00.link/') for name in entries)
+
+    # Once scanned, the tarball is sized from the index without further metadata requests
+    monkeypatch.setattr(os, 'lstat', None)
+    monkeypatch.setattr(os, 'scandir', None)
+    assert sum(size for _, size, _ in scan_fileset(fileset, index)) == 3000 + 700 + len('log\n')
+
+
+@pytest.mark.parametrize("checksum, chunk_size", [(None, 1024 * 1024), (None, 1000), ('sha256', 1000)])
+def test_create_tarball_matches_tarfile(tmp_path, monkeypatch, checksum, chunk_size):
+    monkeypatch.chdir(tmp_path)
+    fileset = make_tree(tmp_path)
+    make_links(tmp_path)
+    os.link('gfs.20240101/00/gfs.t00z.log', 'gfs.20240101/00/gfs.t00z.log.hardlink')
+    (tmp_path / 'gfs.20240101' / '00' / 'empty').write_bytes(b'')
+    fileset += ['gfs.20240101/00.link', 'gfs.20240101/00/gfs.t00z.log.hardlink', 'gfs.20240101/00/empty',
+                str(tmp_path / 'gfs.20240101' / '00' / 'atmos' / 'gfs.t00z.sfcf000.nc')]
+
+    report = create_tarball('gfsa.tar', fileset, chunk_size=chunk_size, checksum=checksum)
+    with tarfile.open('gfsa.tarfile.tar', 'w') as tarball:
+        for filename in fileset:
+            tarball.add(filename)
+
+    with open('gfsa.tar', 'rb') as fh, open('gfsa.tarfile.tar', 'rb') as fh_ref:
+        assert fh.read() == fh_ref.read()
+    assert report.members == 11
+    assert ('checksums' in report) == (checksum is not None)
+
+
+def test_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fileset = make_tree(tmp_path)
+    target = str(tmp_path / 'atardir' / 'gfsa.tar')
+
+    entries = scan_fileset(fileset)
+    report = create_tarball(target, fileset, checksum='sha256')
+    path = write_manifest(target, entries, report.checksums, 'sha256')
+
+    assert path == manifest_path(target) == f'{target}.manifest.json'
+    with open(path) as fh:
+        manifest = json.load(fh)
+    assert manifest['target'] == 'gfsa.tar'
+    assert manifest['tarball_size'] == os.path.getsize(target)
+    assert [member['name'] for member in manifest['members']] == [
+        'gfs.20240101/00/atmos', 'gfs.20240101/00/atmos/gfs.t00z.atmf000.nc',
+        'gfs.20240101/00/atmos/gfs.t00z.sfcf000.nc', 'gfs.20240101/00/gfs.t00z.log']
+    assert manifest['members'][1]['size'] == 3000
+    assert manifest['members'][0]['hash'] is None
+    assert all(len(member['hash']) == 64 for member in manifest['members'][1:])
+
+    assert verify_tarball(target, deep=True) == []
+    assert manifest_matches(target, entries)
+
+
+def test_manifest_mismatch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fileset = make_tree(tmp_path)
+    target = str(tmp_path / 'gfsa.tar')
+
+    assert not manifest_matches(target, scan_fileset(fileset))
+
+    create_tarball(target, fileset)
+    write_manifest(target, scan_fileset(fileset))
+    assert manifest_matches(target, scan_fileset(fileset))
+
+    # A file was updated
+    os.utime('gfs.20240101/00/gfs.t00z.log', (0, 0))
+    assert not manifest_matches(target, scan_fileset(fileset))
+    os.utime('gfs.20240101/00/gfs.t00z.log')
+
+    # A file was added
+    (tmp_path / 'gfs.20240101' / '00' / 'atmos' / 'gfs.t00z.atmf003.nc').write_bytes(b'data')
+    assert not manifest_matches(target, scan_fileset(fileset))
+    os.remove('gfs.20240101/00/atmos/gfs.t00z.atmf003.nc')
+
+    # The tarball was truncated
+    entries = scan_fileset(fileset)
+    create_tarball(target, fileset)
+    write_manifest(target, entries)
+    assert manifest_matches(target, entries)
+    with open(target, 'r+b') as fh:
+        fh.truncate(1024)
+    assert not manifest_matches(target, entries)
+
+
+def test_remote_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fileset = make_tree(tmp_path)
+    manifest_dir = str(tmp_path / 'manifests')
+    target = '/NCEPDEV/emc-global/5year/expt/2024010100/gfsa.tar'
+    entries = scan_fileset(fileset)
+
+    path = write_manifest(target, entries, manifest_dir=manifest_dir)
+
+    assert path == os.path.join(manifest_dir, 'NCEPDEV/emc-global/5year/expt/2024010100/gfsa.tar.manifest.json')
+    with open(path) as fh:
+        assert json.load(fh)['tarball_size'] is None
+    assert manifest_matches(target, entries, manifest_dir=manifest_dir, target_exists=lambda target: True)
+    assert not manifest_matches(target, entries, manifest_dir=manifest_dir, target_exists=lambda target: False)
+    assert not manifest_matches(target, entries, manifest_dir=manifest_dir)
+    assert not manifest_matches(target, entries[1:], manifest_dir=manifest_dir, target_exists=lambda target: True)
+
+
+def serial_diag_tarball(target, diags):
+    """
+    Stat tarball as written before create_diag_tarball: gzip each diag, then add the .gz files
+    """
+    with tarfile.open(target, "w") as tarball:
+        for diag in diags:
+            with open(diag, "rb") as f_in, gzip.open(f"{diag}.gz", "wb", compresslevel=9) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            tarball.add(f"{diag}.gz", arcname=f"{os.path.basename(diag)}.gz")
+            os.remove(f"{diag}.gz")
+
+
+def gzip_members(target):
+    """
+    Name and gzip data of each member, without the time stamp of the gzip header
+    """
+    members = []
+    with tarfile.open(target, "r") as tarball:
+        for tarinfo in tarball:
+            data = tarball.extractfile(tarinfo).read()
+            members.append((tarinfo.name, data[:4] + data[8:]))
+    return members
+
+
+def write_diags(tmp_path, ndiags=10):
+    rng = random.Random(42)
+    diags = []
+    for ii in range(ndiags):
+        diag = tmp_path / 'diags' / f'diag_conv_t_ges.2024010100_{ii:04d}.nc4'
+        diag.parent.mkdir(exist_ok=True)
+        # Compressible data of various sizes
+        diag.write_bytes(bytes(rng.choice(b'0123456789') for _ in range(rng.randint(0, 50000))))
+        diags.append(str(diag))
+    return diags
+
+
+@pytest.mark.parametrize("nworkers, spool_size", [(1, 16 * 1024 * 1024), (3, 4096), (8, 1)])
+def test_diag_tarball(tmp_path, nworkers, spool_size):
+    # Some compressed diags are larger than the spool, and spill to disk
+    diags = write_diags(tmp_path)
+
+    report = create_diag_tarball(str(tmp_path / 'atmstat'), diags, nworkers=nworkers, spool_size=spool_size)
+    serial_diag_tarball(str(tmp_path / 'atmstat.serial'), diags)
+
+    members = gzip_members(tmp_path / 'atmstat')
+    assert members == gzip_members(tmp_path / 'atmstat.serial')
+    assert [name for name, _ in members] == [f'{os.path.basename(diag)}.gz' for diag in diags]
+    assert report.members == len(diags)
+    assert report.bytes == sum(os.path.getsize(diag) for diag in diags)
+    with tarfile.open(tmp_path / 'atmstat', "r") as tarball:
+        for diag, tarinfo in zip(diags, tarball):
+            with open(diag, 'rb') as fh:
+                assert gzip.decompress(tarball.extractfile(tarinfo).read()) == fh.read()
+
+
+def test_diag_tarball_bounded(tmp_path, monkeypatch):
+    diags = write_diags(tmp_path, 40)
+    spools = {'open': 0, 'max': 0}
+
+    class CountingSpool(tempfile.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spools['open'] += 1
+            spools['max'] = max(spools['max'], spools['open'])
+
+        def close(self):
+            if not self.closed:
+                spools['open'] -= 1
+            super().close()
+
+        def __exit__(self, *args):
+            self.close()
+
+    monkeypatch.setattr(tempfile, 'SpooledTemporaryFile', CountingSpool)
+    create_diag_tarball(str(tmp_path / 'atmstat'), diags, nworkers=3)
+
+    # No more compressed members than workers are held at a time
+    assert spools['open'] == 0
+    assert 1 <= spools['max'] <= 3
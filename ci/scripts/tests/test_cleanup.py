@@ -0,0 +1,218 @@
+import logging
+import os
+import sqlite3
+import sys
+import types
+from datetime import datetime, timezone
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+
+# pygfs/__init__.py imports the analysis tasks and their dependencies (netCDF4, jcb, ...);
+# only the cleanup task and its utilities are tested here, so the package is not initialized
+if 'pygfs' not in sys.modules:
+    pygfs = types.ModuleType('pygfs')
+    pygfs.__path__ = [os.path.join(HOMEgfs, 'ush', 'python', 'pygfs')]
+    sys.modules['pygfs'] = pygfs
+
+from wxflow import cast_strdict_as_dtypedict
+from pygfs.task.cleanup import Cleanup, ROCOTO_LOG_SUCCESS
+from pygfs.utils.cleanup_utils import prune_trees
+
+
+def cleanup_task(tmp_path, **config):
+    # Cycles 2024010800 to 2024010900 are cleaned up (RMOLDSTD/RMOLDEND)
+    task_config = {'PDY': '20240110', 'cyc': '00', 'assim_freq': '6', 'RUN': 'gfs', 'PSLOT': 'test',
+                   'ROTDIR': str(tmp_path / 'rotdir'), 'DATAROOT': str(tmp_path / 'dataroot'),
+                   'EXPDIR': str(tmp_path / 'expdir'), 'COM_TOP_TMPL': '${ROTDIR}/${RUN}.${YMD}/${HH}',
+                   'RMOLDSTD': '48', 'RMOLDEND': '24', 'RMOLDRTOFS': '24', 'FHMAX_FITS': '132', 'FHMAX_GFS': '120',
+                   'CDATE_MOS': '2024010812', 'exclude_string': '*prepbufr*, *cnvstat*', 'CLEANUP_NTHREADS': '4'}
+    task_config.update({key: str(value) for key, value in config.items()})
+    return Cleanup(cast_strdict_as_dtypedict(task_config))
+
+
+def epoch(cycle):
+    return int(datetime.strptime(cycle, '%Y%m%d%H').replace(tzinfo=timezone.utc).timestamp())
+
+
+def write_rocoto_db(path):
+    """
+    Rocoto database where 2024010806 has a dead job and 2024011000 is not done
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE cycles (id INTEGER PRIMARY KEY, cycle INTEGER, activated INTEGER, done INTEGER)')
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, taskname VARCHAR, cycle INTEGER, state VARCHAR)')
+    for cycle in ['2024010718', '2024010800', '2024010806', '2024010812', '2024010818', '2024010900', '2024011000']:
+        connection.execute('INSERT INTO cycles (cycle, activated, done) VALUES (?, ?, ?)',
+                           (epoch(cycle), epoch(cycle), None if cycle == '2024011000' else epoch(cycle) + 3600))
+        for task in ['prep', 'anal', 'fcst']:
+            state = 'DEAD' if cycle == '2024010806' and task == 'anal' else 'SUCCEEDED'
+            connection.execute('INSERT INTO jobs (taskname, cycle, state) VALUES (?, ?, ?)', (task, epoch(cycle), state))
+    connection.commit()
+    connection.close()
+
+
+def write_files(root, names):
+    for name in names:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(b'x' * 100)
+
+
+def test_prune_exclude(tmp_path):
+    write_files(tmp_path, ['com/atmos/gfs.t00z.prepbufr', 'com/atmos/gfs.t00z.atmf000.nc', 'com/chem/gfs.t00z.aero.nc',
+                           'com/analysis/gfs.t00z.cnvstat', 'com/analysis/gfs.t00z.abias', 'run/a/b/c.nc', 'run/d.nc'])
+    (tmp_path / 'com' / 'empty').mkdir()
+    os.symlink(tmp_path / 'run', tmp_path / 'com' / 'run.link')
+
+    stats = prune_trees([{'path': str(tmp_path / 'com'), 'exclude': ['*prepbufr*', '*cnvstat*']},
+                         {'path': str(tmp_path / 'missing')}])
+
+    # The directories keeping excluded files remain, links are removed without being followed
+    remaining = sorted(os.path.relpath(os.path.join(root, name), tmp_path)
+                       for root, dirs, files in os.walk(tmp_path) for name in dirs + files)
+    assert remaining == ['com', 'com/analysis', 'com/analysis/gfs.t00z.cnvstat', 'com/atmos', 'com/atmos/gfs.t00z.prepbufr',
+                         'run', 'run/a', 'run/a/b', 'run/a/b/c.nc', 'run/d.nc']
+    assert (stats[0].files, stats[0].dirs, stats[0].inodes) == (4, 2, 6)
+    assert stats[1] == {'files': 0, 'dirs': 0, 'inodes': 0, 'nbytes': 0}
+
+
+def test_prune_fifo(tmp_path):
+    for directory in ['excluded', 'removed']:
+        write_files(tmp_path, [f'{directory}/data/gfs.t00z.atmf000.nc'])
+        os.mkfifo(tmp_path / directory / 'data' / 'pipe')
+
+    stats = prune_trees([{'path': str(tmp_path / 'excluded'), 'exclude': ['*prepbufr*']},
+                         {'path': str(tmp_path / 'removed'), 'exclude': []},
+                         {'path': str(tmp_path / 'missing')}], nworkers=2)
+
+    # As find -type f -o -type l with exclusions, as rm -rf without
+    assert os.listdir(tmp_path / 'excluded' / 'data') == ['pipe']
+    assert not os.path.lexists(tmp_path / 'removed')
+    assert (stats[0].files, stats[0].dirs) == (1, 0)
+    assert (stats[1].files, stats[1].dirs) == (2, 2)
+
+
+def test_prune_dry_run(tmp_path):
+    write_files(tmp_path, ['com/atmos/gfs.t00z.prepbufr', 'com/atmos/gfs.t00z.atmf000.nc', 'run/a/b/c.nc', 'file.txt'])
+    targets = [{'path': str(tmp_path / 'com'), 'exclude': ['*prepbufr*']}, {'path': str(tmp_path / 'run')},
+               {'path': str(tmp_path / 'file.txt')}]
+
+    dry_run_stats = prune_trees(targets, dry_run=True)
+    assert sorted(os.listdir(tmp_path)) == ['com', 'file.txt', 'run']
+    assert os.path.exists(tmp_path / 'run' / 'a' / 'b' / 'c.nc')
+
+    # A dry run reports what is then removed
+    assert prune_trees(targets) == dry_run_stats
+    assert [(stat.files, stat.dirs) for stat in dry_run_stats] == [(1, 0), (1, 3), (1, 0)]
+    assert sorted(os.listdir(tmp_path)) == ['com']
+
+
+def test_read_rocoto_db(tmp_path):
+    task = cleanup_task(tmp_path)
+    write_rocoto_db(tmp_path / 'expdir' / 'test.db')
+
+    # Cycles with a dead job are not cleaned up
+    assert task.get_cycle_status() == {datetime(2024, 1, 8, 0): True, datetime(2024, 1, 8, 6): False,
+                                       datetime(2024, 1, 8, 12): True, datetime(2024, 1, 8, 18): True,
+                                       datetime(2024, 1, 9, 0): True}
+    assert Cleanup._read_rocoto_db(task.task_config.rocoto_db, datetime(2024, 1, 7, 18), datetime(2024, 1, 10, 0)) == \
+        {datetime(2024, 1, 7, 18), datetime(2024, 1, 8, 0), datetime(2024, 1, 8, 12), datetime(2024, 1, 8, 18),
+         datetime(2024, 1, 9, 0)}
+
+
+def test_rocoto_log_status(tmp_path):
+    task = cleanup_task(tmp_path)
+
+    # Without a usable database, the status is read from the Rocoto logs
+    (tmp_path / 'expdir').mkdir()
+    connection = sqlite3.connect(tmp_path / 'expdir' / 'test.db')
+    connection.execute('CREATE TABLE cycles (id INTEGER PRIMARY KEY, cycle INTEGER)')
+    connection.close()
+    (tmp_path / 'expdir' / 'logs').mkdir()
+    (tmp_path / 'expdir' / 'logs' / '2024010800.log').write_text(f'2024-01-08 04:00:00 :: {ROCOTO_LOG_SUCCESS}\n')
+    (tmp_path / 'expdir' / 'logs' / '2024010806.log').write_text(f'{ROCOTO_LOG_SUCCESS}\nTask anal is DEAD\n')
+
+    status = task.get_cycle_status()
+    assert [cycle for cycle, succeeded in status.items() if succeeded] == [datetime(2024, 1, 8, 0)]
+    assert len(status) == 5
+
+
+def test_retention_policy(tmp_path):
+    task = cleanup_task(tmp_path)
+    write_rocoto_db(tmp_path / 'expdir' / 'test.db')
+    rotdir = tmp_path / 'rotdir'
+    (tmp_path / 'dataroot' / 'gfsefcs01.2024011000').mkdir(parents=True)
+
+    targets = task.retention_policy(task.get_cycle_status())
+
+    # Each path is pruned once and nothing below a directory removed entirely (here DATAROOT)
+    assert [(target.path, target.exclude) for target in targets] == [
+        (f'{rotdir}/gfs.20240108/00', ['*prepbufr*', '*cnvstat*']),
+        (f'{rotdir}/rtofs.20240108', []),
+        (f'{rotdir}/gfsmos.20240108', []),
+        (f'{rotdir}/gfs.20240108/12', ['*prepbufr*', '*cnvstat*']),
+        (f'{rotdir}/gfs.20240108/18', ['*prepbufr*', '*cnvstat*']),
+        (f'{rotdir}/gfs.20240109/00', ['*prepbufr*', '*cnvstat*']),
+        (f'{rotdir}/vrfyarch/gfs.20240103', []),
+        (f'{rotdir}/gfs.20240105', []),
+        (str(tmp_path / 'dataroot'), [])]
+
+    # The RUN directory of RMOLDSTD hours ago covers the COM directories of that day
+    task = cleanup_task(tmp_path, FHMAX_GFS=24, RMOLDRTOFS=48)
+    targets = task.retention_policy(task.get_cycle_status())
+    assert [target.path for target in targets] == [f'{rotdir}/gfsmos.20240108', f'{rotdir}/gfs.20240109/00',
+                                                   f'{rotdir}/vrfyarch/gfs.20240103', f'{rotdir}/gfs.20240108',
+                                                   str(tmp_path / 'dataroot')]
+
+    # Without CLEANUP_COM, only the forecast run directories
+    task = cleanup_task(tmp_path, CLEANUP_COM='NO')
+    assert [target.path for target in task.retention_policy({})] == [
+        f'{tmp_path}/dataroot/gfsfcst.2024011000', f'{tmp_path}/dataroot/gfsefcs01.2024011000']
+
+
+def write_rotdir(tmp_path):
+    write_rocoto_db(tmp_path / 'expdir' / 'test.db')
+    rotdir = tmp_path / 'rotdir'
+    for cycle in ['20240105/00', '20240108/00', '20240108/06', '20240109/00', '20240110/00']:
+        write_files(rotdir, [f'gfs.{cycle}/analysis/atmos/gfs.t00z.prepbufr', f'gfs.{cycle}/analysis/atmos/gfs.t00z.atmanl.nc',
+                             f'gfs.{cycle}/model/atmos/history/gfs.t00z.atmf000.nc'])
+    write_files(rotdir, ['vrfyarch/gfs.20240103/00/pgbf00.gfs.2024010300', 'vrfyarch/gfs.20240106/00/pgbf00.gfs.2024010600'])
+    write_files(tmp_path, ['dataroot/gfsfcst.2024011000/RESTART/sfc_data.nc', 'dataroot/cleanup.1234/output'])
+    return rotdir
+
+
+def tree(root):
+    return sorted(os.path.relpath(os.path.join(path, name), root) for path, _, files in os.walk(root) for name in files)
+
+
+def test_execute(tmp_path, caplog):
+    rotdir = write_rotdir(tmp_path)
+    before = tree(rotdir)
+
+    caplog.set_level(logging.INFO)
+    cleanup_task(tmp_path, CLEANUP_DRY_RUN='YES').execute()
+
+    # Nothing is removed by a dry run, which reports what would be freed
+    assert tree(rotdir) == before
+    assert os.path.isdir(tmp_path / 'dataroot')
+    messages = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Would free')]
+    assert len(messages) == 6
+    assert messages[0].startswith('Would free 5 inodes (2 files, 3 directories), ')
+    assert messages[0].endswith(f' in {rotdir}/gfs.20240108/00 (cycle 2024010800 succeeded)')
+    assert messages[-1].startswith('Would free a total of 29 inodes and ')
+
+    caplog.clear()
+    cleanup_task(tmp_path).execute()
+    assert tree(rotdir) == ['gfs.20240108/00/analysis/atmos/gfs.t00z.prepbufr',
+                            'gfs.20240108/06/analysis/atmos/gfs.t00z.atmanl.nc',
+                            'gfs.20240108/06/analysis/atmos/gfs.t00z.prepbufr',
+                            'gfs.20240108/06/model/atmos/history/gfs.t00z.atmf000.nc',
+                            'gfs.20240109/00/analysis/atmos/gfs.t00z.prepbufr',
+                            'gfs.20240110/00/analysis/atmos/gfs.t00z.atmanl.nc',
+                            'gfs.20240110/00/analysis/atmos/gfs.t00z.prepbufr',
+                            'gfs.20240110/00/model/atmos/history/gfs.t00z.atmf000.nc',
+                            'vrfyarch/gfs.20240106/00/pgbf00.gfs.2024010600']
+    assert not os.path.exists(tmp_path / 'dataroot')
+    assert [record.getMessage() for record in caplog.records if record.getMessage().startswith('Freed a total')] == \
+        ['Freed a total of 29 inodes and ' + messages[-1].split(' and ')[1]]
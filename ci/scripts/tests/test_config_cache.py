@@ -0,0 +1,103 @@
+import os
+import sys
+
+from wxflow import Configuration
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+sys.path.append(os.path.join(HOMEgfs, 'workflow'))
+
+from config_cache import CachedConfiguration
+
+configs = {
+    'config.base': """#! /usr/bin/env bash
+echo "BEGIN: config.base"
+export EXPDIR="{expdir}"
+export PARMgfs="{parmdir}"
+export RUN=${{RUN:-"gdas"}}
+export CDUMP=${{RUN/enkf}}
+machine="HERA"
+export assim_freq=6
+source "${{PARMgfs}}/monitor.parm"
+echo "END: config.base"
+""",
+    'config.resources': """#! /usr/bin/env bash
+step=$1
+echo "BEGIN: config.resources"
+case ${{step}} in
+  "fcst") export ntasks_fcst=$(( assim_freq * 16 ));;
+  "anal") export ntasks_anal=480;;
+  *) echo "FATAL ERROR: unknown step ${{step}}"; exit 2;;
+esac
+echo "END: config.resources"
+""",
+    'config.fcst': """#! /usr/bin/env bash
+echo "BEGIN: config.fcst"
+source "${{EXPDIR}}/config.resources" fcst
+export FCST_MACHINE="${{machine}}_${{RUN}}"
+export FHMAX=$(( MONITOR_CYCLES * assim_freq ))
+echo "END: config.fcst"
+""",
+    'config.anal': """#! /usr/bin/env bash
+echo "BEGIN: config.anal"
+. "${{EXPDIR}}/config.resources" anal
+if [[ "${{RUN}}" == "gfs" ]]; then
+  export DO_ANAL_GFS="YES"
+fi
+export ANAL_PARAMS="${{MONITOR_NAME}},${{machine}}"
+echo "END: config.anal"
+""",
+}
+
+
+def write_expdir(tmp_path, monitor_cycles=4):
+    expdir = tmp_path / 'expdir'
+    parmdir = tmp_path / 'parm'
+    expdir.mkdir(exist_ok=True)
+    parmdir.mkdir(exist_ok=True)
+    for name, content in configs.items():
+        (expdir / name).write_text(content.format(expdir=expdir, parmdir=parmdir))
+    (parmdir / 'monitor.parm').write_text(f'echo "monitor parameters"\nMONITOR_CYCLES={monitor_cycles}\nexport MONITOR_NAME=da_mon\n')
+    return expdir
+
+
+def test_cached_configuration_matches_configuration(tmp_path):
+    expdir = write_expdir(tmp_path)
+    cfg = Configuration(expdir)
+    cached_cfg = CachedConfiguration(expdir)
+
+    # config.resources is only sourced by the other configs, with a step
+    for config in [config for config in configs if config != 'config.resources']:
+        for files in [config, ['config.base', config]]:
+            for envvars in [{}, {'RUN': 'gfs'}, {'RUN': 'enkfgdas'}]:
+                assert cached_cfg.parse_config(files, **envvars) == cfg.parse_config(files, **envvars)
+
+    # Sourced again, from the memory cache
+    assert cached_cfg.parse_config(['config.base', 'config.fcst'], RUN='gfs') == \
+        cfg.parse_config(['config.base', 'config.fcst'], RUN='gfs')
+    assert cached_cfg.hits == 1
+
+
+def test_cache_file(tmp_path):
+    expdir = write_expdir(tmp_path)
+    cache_file = tmp_path / 'config_cache.json'
+
+    cached_cfg = CachedConfiguration(expdir, cache_file=cache_file)
+    fcst = cached_cfg.parse_config(['config.base', 'config.fcst'])
+    cached_cfg.save()
+    assert fcst.FHMAX == 24
+
+    cached_cfg = CachedConfiguration(expdir, cache_file=cache_file)
+    assert cached_cfg.parse_config(['config.base', 'config.fcst']) == fcst
+    assert (cached_cfg.hits, cached_cfg.misses) == (1, 0)
+
+    # A change to a file sourced from outside the experiment directory invalidates the cache
+    write_expdir(tmp_path, monitor_cycles=8)
+    cached_cfg = CachedConfiguration(expdir, cache_file=cache_file)
+    assert cached_cfg.parse_config(['config.base', 'config.fcst']).FHMAX == 48
+    assert (cached_cfg.hits, cached_cfg.misses) == (0, 1)
+
+    # As does a change to a config file
+    (expdir / 'config.resources').write_text((expdir / 'config.resources').read_text().replace('16', '32'))
+    cached_cfg = CachedConfiguration(expdir, cache_file=cache_file)
+    assert cached_cfg.parse_config(['config.base', 'config.fcst']).ntasks_fcst == 192
@@ -0,0 +1,141 @@
+import os
+import stat
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+sys.path.append(os.path.join(HOMEgfs, 'test'))
+
+import diff_ROTDIR
+from diff_ROTDIR import compare_grib_messages, compare_rotdirs, diff_stats, grib_messages
+
+# Stand-in for wgrib2 -s -npts -no_header -bin, decoding the synthetic messages of grib2_message
+fake_wgrib2 = """#!/usr/bin/env python3
+import sys
+gribfile, binfile = sys.argv[1], sys.argv[sys.argv.index('-bin') + 1]
+with open(gribfile, 'rb') as f:
+    data = f.read()
+offset = 0
+with open(binfile, 'wb') as out:
+    while offset < len(data):
+        length = int.from_bytes(data[offset + 8:offset + 16], 'big')
+        message = data[offset:offset + length]
+        out.write(message[32:-4])
+        name = message[16:32].decode().strip()
+        print(f"{data[:offset].count(b'GRIB') + 1}:{offset}:d=2024010100:{name}:6 hour fcst::npts={(length - 36) // 4}")
+        offset += length
+"""
+
+
+def grib2_message(name, values):
+    """
+    Synthetic GRIB2 message: section 0, the field name, the values as float32 and section 8
+    """
+    payload = name.encode().ljust(16) + np.asarray(values, dtype=np.float32).tobytes()
+    return b'GRIB' + bytes(3) + bytes([2]) + struct.pack('>Q', 16 + len(payload) + 4) + payload + b'7777'
+
+
+@pytest.fixture
+def wgrib2(tmp_path, monkeypatch):
+    path = tmp_path / 'bin' / 'wgrib2'
+    path.parent.mkdir()
+    path.write_text(fake_wgrib2)
+    path.chmod(stat.S_IRWXU)
+    monkeypatch.setenv('WGRIB2', str(path))
+    # Decode with wgrib2 even where eccodes is installed
+    monkeypatch.setitem(sys.modules, 'eccodes', None)
+    return path
+
+
+def test_diff_stats():
+    a = np.ma.masked_array([1.0, 2.0, 4.0, np.nan, 5.0, 0.0], mask=[0, 0, 0, 0, 1, 0])
+    b = np.ma.masked_array([1.0, 2.5, 3.0, np.nan, 6.0, 1.0], mask=[0, 0, 0, 0, 0, 0])
+
+    # The missing values only match missing values
+    assert diff_stats(a, b) == (4, 1.0, 1.0)
+    assert diff_stats(a[:3], b[:3]) == (2, 1.0, 0.25)
+    assert diff_stats(np.array(['a', 'b']), np.array(['a', 'c'])) == (1, None, None)
+
+
+def test_compare_grib_wgrib2(tmp_path, wgrib2):
+    fields = [('TMP:500 mb', [280.0, 281.0, 9.999e20]), ('UGRD:500 mb', [1.0, 2.0, 3.0]), ('VGRD:500 mb', [0.0, 0.5])]
+    (tmp_path / 'a.grib2').write_bytes(b''.join(grib2_message(name, values) for name, values in fields))
+    fields[1] = ('UGRD:500 mb', [1.0, 2.5, 3.0])
+    # Same values, other metadata
+    fields[2] = ('VGRD:500 m', [0.0, 0.5])
+    (tmp_path / 'b.grib2').write_bytes(b''.join(grib2_message(name, values) for name, values in fields))
+
+    messagesA = grib_messages(tmp_path / 'a.grib2')
+    messagesB = grib_messages(tmp_path / 'b.grib2')
+    pairs = [(index, a, b) for index, (a, b) in enumerate(zip(messagesA, messagesB))]
+
+    assert compare_grib_messages(tmp_path / 'a.grib2', tmp_path / 'b.grib2', pairs) == [
+        {'name': '2:UGRD:500 mb', 'status': 'different', 'ndiff': 1, 'max_abs_diff': 0.5, 'max_rel_diff': 0.2},
+        {'name': '3:VGRD:500 mb', 'status': 'metadata differs', 'ndiff': 0, 'max_abs_diff': 0.0, 'max_rel_diff': 0.0}]
+    assert compare_grib_messages(tmp_path / 'a.grib2', tmp_path / 'a.grib2', pairs) == []
+
+    # Undefined values are missing
+    fieldA, = diff_ROTDIR._wgrib2_fields([grib2_message(*fields[0])], str(wgrib2))
+    assert fieldA[0] == 'TMP:500 mb'
+    assert np.isnan(fieldA[1][2]) and fieldA[1][0] == 280.0
+
+
+def test_compare_grib_no_decoder(tmp_path, wgrib2, monkeypatch):
+    (tmp_path / 'a.grib2').write_bytes(grib2_message('TMP:500 mb', [280.0]))
+    (tmp_path / 'b.grib2').write_bytes(grib2_message('TMP:500 mb', [281.0]))
+    pairs = [(0, grib_messages(tmp_path / 'a.grib2')[0], grib_messages(tmp_path / 'b.grib2')[0])]
+
+    monkeypatch.setenv('WGRIB2', str(tmp_path / 'missing' / 'wgrib2'))
+    with pytest.raises(RuntimeError, match='eccodes module cannot be imported and wgrib2 is not found'):
+        compare_grib_messages(tmp_path / 'a.grib2', tmp_path / 'b.grib2', pairs)
+
+
+def test_compare_rotdirs(tmp_path):
+    for exp, nml, value in [('expA', 'layout = 8,8\n', 280.0), ('expB', 'layout = 8,16\n', 280.0)]:
+        cycle_dir = tmp_path / exp / 'gfs.20240101' / '00'
+        (cycle_dir / 'atmos').mkdir(parents=True)
+        (cycle_dir / 'atmos' / 'input.nml').write_text(f'&fv_core_nml\n{nml}/\n')
+        (cycle_dir / 'atmos' / 'gfs.t00z.pgrb2.0p25.f000').write_bytes(grib2_message('TMP:500 mb', [value]))
+        (cycle_dir / 'atmos' / 'gfs.t00z.log').write_text(exp)
+    (tmp_path / 'expA' / 'gfs.20240101' / '00' / 'ice').mkdir()
+    (tmp_path / 'expA' / 'gfs.20240101' / '00' / 'ice' / 'ice_in').write_text('&setup_nml\n/\n')
+
+    report = compare_rotdirs(str(tmp_path / 'expA' / 'gfs.20240101' / '00'),
+                             str(tmp_path / 'expB' / 'gfs.20240101' / '00'), set(), nproc=2)
+
+    assert report['summary'] == {'different': 1, 'identical': 1, 'missing in B': 1}
+    files = {file['file']: file for file in report['files']}
+    assert set(files) == {'atmos/input.nml', 'atmos/gfs.t00z.pgrb2.0p25.f000', 'ice/ice_in'}
+    assert '-layout = 8,8\n+layout = 8,16\n' in files['atmos/input.nml']['diff']
+    assert files['atmos/gfs.t00z.pgrb2.0p25.f000'] == {'file': 'atmos/gfs.t00z.pgrb2.0p25.f000', 'type': 'grib2',
+                                                       'status': 'identical'}
+
+
+def test_compare_netcdf(tmp_path, monkeypatch):
+    nc = pytest.importorskip('netCDF4')
+
+    for name, offset in [('a.nc', 0.0), ('b.nc', 0.5)]:
+        with nc.Dataset(tmp_path / name, 'w') as dataset:
+            dataset.createDimension('time', None)
+            dataset.createDimension('lat', 3)
+            dataset.createVariable('lat', 'f8', ('lat',))[:] = [-10.0 + offset, 0.0, 10.0]
+            dataset.createVariable('ps', 'f4', ('time', 'lat'))[:] = np.ones((4, 3))
+            tmp = dataset.createVariable('tmp', 'f4', ('time', 'lat'), fill_value=-999.0)
+            tmp[:] = np.arange(12, dtype=np.float32).reshape(4, 3) * 10
+            tmp[3, 2] = 110.0 + 4 * offset
+            tmp[0, 0] = np.ma.masked
+            if name == 'a.nc':
+                dataset.createVariable('only_a', 'i4', ('lat',))[:] = [1, 2, 3]
+
+    # Read a row at a time
+    monkeypatch.setattr(diff_ROTDIR, 'NETCDF_CHUNK_VALUES', 3)
+    report = diff_ROTDIR.compare_netcdf(tmp_path / 'a.nc', tmp_path / 'b.nc', {'lat'})
+
+    assert report == {'status': 'different', 'variables': [
+        {'name': 'only_a', 'status': 'missing in B'},
+        {'name': 'ps', 'ndiff': 0, 'max_abs_diff': 0.0, 'max_rel_diff': 0.0, 'status': 'identical'},
+        {'name': 'tmp', 'ndiff': 1, 'max_abs_diff': 2.0, 'max_rel_diff': 2.0 / 112.0, 'status': 'different'}]}
@@ -0,0 +1,85 @@
+import os
+import sys
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+sys.path.append(os.path.join(HOMEgfs, 'workflow'))
+
+from rocoto.tasks import Tasks
+
+# The forecast hour helpers only need the class, not an application configuration
+tasks = Tasks.__new__(Tasks)
+
+
+def test_fhr_groups():
+
+    # The first hour of a group counts as one, it is waited for by the rocoto dependency
+    fhrs = [0, 1, 2, 3, 4, 5, 6, 9, 12, 18, 24]
+
+    assert Tasks._get_fhr_groups(fhrs) == [[fhr] for fhr in fhrs]
+    assert Tasks._get_fhr_groups(fhrs, 3) == [[0, 1, 2], [3, 4, 5], [6], [9], [12], [18], [24]]
+    assert Tasks._get_fhr_groups(fhrs, 6) == [[0, 1, 2, 3, 4, 5], [6, 9], [12], [18], [24]]
+    assert Tasks._get_fhr_groups([6, 12, 18, 24, 30], 2) == [[6, 12], [18, 24], [30]]
+    assert Tasks._get_fhr_groups([6], 4) == [[6]]
+    assert Tasks._get_fhr_groups([], 4) == []
+
+
+def test_fhr_var_dict():
+
+    fhrs = [0, 3, 6, 9, 12]
+
+    # Not grouped: the variables of a metatask with a job per hour
+    assert tasks._get_fhr_var_dict(fhrs, {}) == {'fhr': '000 003 006 009 012'}
+    assert tasks._get_fhr_task_suffix(tasks._get_fhr_var_dict(fhrs, {})) == '_f#fhr#'
+
+    var_dict = tasks._get_fhr_var_dict(fhrs, {'NFHRS_PER_GROUP': 2})
+    assert var_dict == {'fhr': '000 006 012',
+                        'grp': '_f000-f003 _f006-f009 _f012',
+                        'lst': 'f000_f003 f006_f009 f012'}
+    assert tasks._get_fhr_task_suffix(var_dict) == '#grp#'
+    assert tasks._get_fhr_group_names(var_dict) == {'000': '_f000-f003', '003': '_f000-f003', '006': '_f006-f009',
+                                                    '009': '_f006-f009', '012': '_f012'}
+
+
+def test_fhr_var_dict_next():
+
+    # As the ocean products: the next hour of the last hour is never written
+    fhrs = [6, 12, 18, 24, 30]
+    fhrs_next = [12, 18, 24, 30, 36]
+
+    var_dict = tasks._get_fhr_var_dict(fhrs, {}, fhrs_next)
+    assert var_dict == {'fhr': '006 012 018 024 030', 'fhr_next': '012 018 024 030 036'}
+
+    var_dict = tasks._get_fhr_var_dict(fhrs, {'NFHRS_PER_GROUP': 3}, fhrs_next)
+    assert var_dict['fhr_next'] == '012 030'
+    assert var_dict['lst'] == 'f006_f012_f018 f024_f030'
+    assert var_dict['lst_next'] == 'f012_f018_f024 f030_-'
+
+
+def test_set_fhr_group_task():
+
+    resources = {'walltime': '00:20:00', 'nodes': 1, 'ntasks': 24, 'ppn': 128}
+    inputs = ['@Y@m@d/@H/model/ocean/history/gfs.ocean.t@Hz.6hr_avg.f#fhr_next#.nc',
+              '@Y@m@d/@H/model/atmos/history/gfs.t@Hz.atmf#fhr#.nc']
+
+    # Nothing changes if the hours are not grouped
+    task_dict = {'resources': resources, 'envars': []}
+    tasks._set_fhr_group_task(task_dict, tasks._get_fhr_var_dict([6, 12, 18], {}), {}, inputs)
+    assert task_dict == {'resources': resources, 'envars': []}
+
+    config = {'NFHRS_PER_GROUP': 4, 'NFHRS_CONCURRENT': 2, 'FHR_INPUT_TIMEOUT': 600}
+    var_dict = tasks._get_fhr_var_dict([6, 12, 18, 24, 30, 36], config, [12, 18, 24, 30, 36, 42])
+    task_dict = {'resources': resources, 'envars': []}
+    tasks._set_fhr_group_task(task_dict, var_dict, config, inputs)
+
+    # Resources of two concurrent hours, walltime of the largest group (4 hours)
+    assert task_dict['resources'] == {'walltime': '01:20:00', 'nodes': 1, 'ntasks': 48, 'ppn': 128}
+    assert resources['ntasks'] == 24
+    envars = ''.join(task_dict['envars'])
+    assert '<envar><name>FHRLST</name><value>#lst#</value></envar>' in envars
+    assert '<envar><name>FHRLST_NEXT</name><value>#lst_next#</value></envar>' in envars
+    assert '<envar><name>NFHRS_CONCURRENT</name><value>2</value></envar>' in envars
+    assert '<envar><name>FHR_INPUT_TIMEOUT</name><value>600</value></envar>' in envars
+    assert ('<envar><name>FHR_INPUTS</name><value><cyclestr>'
+            '@Y@m@d/@H/model/ocean/history/gfs.ocean.t@Hz.6hr_avg.f{fhr3_next}.nc '
+            '@Y@m@d/@H/model/atmos/history/gfs.t@Hz.atmf{fhr3}.nc</cyclestr></value></envar>') in envars
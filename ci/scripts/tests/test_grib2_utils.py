@@ -0,0 +1,116 @@
+import os
+import sys
+import types
+
+import pytest
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+
+# pygfs/__init__.py imports the analysis tasks and their dependencies (netCDF4, jcb, ...);
+# only its utilities are tested here, so they are imported without initializing the package
+if 'pygfs' not in sys.modules:
+    pygfs = types.ModuleType('pygfs')
+    pygfs.__path__ = [os.path.join(HOMEgfs, 'ush', 'python', 'pygfs')]
+    sys.modules['pygfs'] = pygfs
+
+from pygfs.utils.grib2_utils import message_table, partition_messages, write_chunks
+
+
+def grib2_message(nbytes):
+    """
+    Synthetic GRIB2 message of nbytes bytes: section 0, padding and section 8
+    """
+    section0 = b'GRIB' + bytes(3) + bytes([2]) + nbytes.to_bytes(8, 'big')
+    return section0 + bytes(nbytes - len(section0) - 4) + b'7777'
+
+
+def write_grib2(path, records):
+    """
+    Write the (name, nbytes) records as a GRIB2 file and its wgrib2 inventory
+    """
+    offset = 0
+    inventory = []
+    with open(path, 'wb') as fh:
+        for number, (name, nbytes) in enumerate(records, start=1):
+            fh.write(grib2_message(nbytes))
+            inventory.append(f"{number}:{offset}:d=2024010100:{name}:500 mb:6 hour fcst:")
+            offset += nbytes
+    with open(f"{path}.idx", 'w') as fh:
+        fh.write('\n'.join(inventory) + '\n')
+    return f"{path}.idx"
+
+
+records = [('HGT', 5000), ('UGRD', 4000), ('VGRD', 4000), ('TMP', 100), ('LAND', 200), ('ICEC', 200),
+           ('RH', 9000), ('PRES', 100), ('UGRD', 3000), ('VGRD', 3000), ('SPFH', 600), ('USTM', 100),
+           ('VSTM', 100), ('APCP', 7000), ('TCDC', 300)]
+
+
+def test_chunks_concatenate_to_original(tmp_path):
+    gribfile = str(tmp_path / 'tmpfile_f006')
+    inventory = write_grib2(gribfile, records)
+
+    messages = message_table(gribfile, inventory)
+    chunks = partition_messages(messages, 4)
+    chunk_files = write_chunks(gribfile, messages, chunks, f"{gribfile}_")
+
+    assert len(chunk_files) == 4
+    assert [index for chunk in chunks for index in chunk] == list(range(len(records)))
+    data = b''.join(open(chunk_file, 'rb').read() for chunk_file in chunk_files)
+    assert data == open(gribfile, 'rb').read()
+
+
+def test_paired_records_stay_together(tmp_path):
+    gribfile = str(tmp_path / 'tmpfile_f006')
+    inventory = write_grib2(gribfile, records)
+    messages = message_table(gribfile, inventory)
+
+    for nchunks in range(1, len(records) + 1):
+        chunks = partition_messages(messages, nchunks)
+        for chunk in chunks:
+            # No chunk ends on a u-component or on land, whose next record is in the same chunk
+            assert records[chunk.stop - 1][0] not in ('UGRD', 'USTM', 'LAND')
+            assert records[chunk.start][0] not in ('VGRD', 'VSTM', 'ICEC')
+
+
+def test_chunks_are_balanced(tmp_path):
+    gribfile = str(tmp_path / 'tmpfile_f006')
+    inventory = write_grib2(gribfile, [('TMP', 100)] * 8 + [('HGT', 8000)] * 2 + [('TMP', 100)] * 8)
+    messages = message_table(gribfile, inventory)
+
+    chunks = partition_messages(messages, 3, record_cost=0)
+    sizes = [sum(messages[index].length for index in chunk) for chunk in chunks]
+
+    # The two large records are in their own chunks, as the equal record count split would not
+    assert len(chunks) == 3
+    assert max(sizes) == 8000 + 100 * 8
+
+
+def test_more_chunks_than_records(tmp_path):
+    gribfile = str(tmp_path / 'tmpfile_f006')
+    inventory = write_grib2(gribfile, [('TMP', 100), ('UGRD', 200), ('VGRD', 200), ('HGT', 300)])
+    messages = message_table(gribfile, inventory)
+
+    chunks = partition_messages(messages, 24)
+
+    # One chunk per record, except for the u and v components
+    assert chunks == [range(0, 1), range(1, 3), range(3, 4)]
+    assert partition_messages([], 24) == []
+
+
+def test_inventory_mismatch(tmp_path):
+    gribfile = str(tmp_path / 'tmpfile_f006')
+    inventory = write_grib2(gribfile, records)
+    other_gribfile = str(tmp_path / 'tmpfileb_f006')
+    write_grib2(other_gribfile, records[:-1])
+
+    with pytest.raises(ValueError):
+        message_table(other_gribfile, inventory)
+
+
+def test_not_grib2(tmp_path):
+    gribfile = tmp_path / 'tmpfile_f006'
+    gribfile.write_bytes(grib2_message(100) + b'not a GRIB2 message')
+
+    with pytest.raises(ValueError):
+        message_table(str(gribfile))
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import sys
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+sys.path.append(os.path.join(HOMEgfs, 'workflow'))
+
+from rocoto_accounting import SlurmAccounting, PBSAccounting, LSFAccounting
+
+sacct_output = """\
+101|COMPLETED|2024-01-01T00:00:00|2024-01-01T00:02:00|600|01:05:30.500|40
+102|RUNNING|2024-01-01T00:00:00|2024-01-01T00:10:00|300|00:10:00|128
+103|CANCELLED by 42|2024-01-01T00:00:00|2024-01-01T00:00:30|5|00:00.100|1
+"""
+
+qstat_output = """{
+    "Jobs": {
+        "201.pbs01": {
+            "job_state": "F",
+            "qtime": "Mon Jan  1 00:00:00 2024",
+            "stime": "Mon Jan  1 00:01:00 2024",
+            "resources_used": {"cput": "02:00:00", "walltime": "00:30:00"},
+            "Resource_List": {"ncpus": 256}
+        },
+        "202.pbs01": {
+            "job_state": "Q",
+            "qtime": "Mon Jan  1 00:00:00 2024",
+            "Resource_List": {"ncpus": 8}
+        }
+    }
+}
+"""
+
+bjobs_output = """\
+301;DONE;24;Jan  1 00:00;Jan  1 00:03;125.0 second(s);60 second(s)
+302;PEND;4;Jan  1 00:00;-;-;-
+"""
+
+
+class FakeScheduler:
+
+    def __init__(self, output):
+        self.output = output
+        self.calls = []
+
+    def __call__(self, args):
+        self.calls.append(args)
+        return self.output
+
+
+def test_slurm_accounting():
+    run = FakeScheduler(sacct_output)
+    backend = SlurmAccounting(run=run)
+    records = backend.update(['101', '102', '103'])
+
+    assert records['101'].qtime == 120
+    assert records['101'].cputime == 3930
+    assert records['101'].runtime == 600
+    assert records['101'].slots == 40
+    assert records['101'].finished
+    assert not records['102'].finished
+    assert records['103'].finished
+    assert run.calls[0][-1] == '101,102,103'
+
+    # Only the unfinished job is queried again
+    backend.update(['101', '102', '103'])
+    assert run.calls[1][-1] == '102'
+
+
+def test_pbs_accounting():
+    backend = PBSAccounting(run=FakeScheduler(qstat_output))
+    records = backend.update(['201.pbs01', '202'])
+
+    assert records['201.pbs01'].qtime == 60
+    assert records['201.pbs01'].cputime == 7200
+    assert records['201.pbs01'].runtime == 1800
+    assert records['201.pbs01'].slots == 256
+    assert records['201.pbs01'].finished
+    assert records['202'].slots == 8
+    assert not records['202'].finished
+
+
+def test_lsf_accounting():
+    backend = LSFAccounting(run=FakeScheduler(bjobs_output))
+    records = backend.update(['301', '302'])
+
+    assert records['301'].qtime == 180
+    assert records['301'].cputime == 125
+    assert records['301'].runtime == 60
+    assert records['301'].slots == 24
+    assert records['301'].finished
+    assert records['302'].cputime is None
+    assert not records['302'].finished
+
+
+def test_update_database():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR, taskname VARCHAR, state VARCHAR)')
+    connection.executemany('INSERT INTO jobs (jobid, taskname, state) VALUES (?, ?, ?)',
+                           [('101', 'prep', 'SUCCEEDED'), ('102', 'anal', 'RUNNING'), (None, 'fcst', None)])
+    # Table made by earlier versions of rocoto_viewer
+    connection.execute('CREATE TABLE jobs_augment AS SELECT * FROM jobs')
+
+    run = FakeScheduler(sacct_output)
+    backend = SlurmAccounting(run=run)
+    backend.update_database(connection)
+    assert run.calls[0][-1] == '101,102'
+
+    rows = connection.execute('SELECT taskname, qtime, cputime, runtime, slots FROM jobs_augment ORDER BY id').fetchall()
+    assert rows == [('prep', 120, 3930, 600, 40), ('anal', 600, 600, 300, 128), ('fcst', None, None, None, None)]
+
+    # Finished jobs are not queried again, even by a new backend (e.g. the next viewer refresh)
+    run = FakeScheduler(sacct_output)
+    SlurmAccounting(run=run).update_database(connection)
+    assert run.calls[0][-1] == '102'
+
+
+def test_update_unreported_jobs():
+    # 104 finished long ago and was purged from the scheduler history, 105 was just submitted
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR, taskname VARCHAR, state VARCHAR)')
+    connection.executemany('INSERT INTO jobs (jobid, taskname, state) VALUES (?, ?, ?)',
+                           [('101', 'prep', 'SUCCEEDED'), ('104', 'anal', 'DEAD'), ('105', 'fcst', 'QUEUED')])
+
+    run = FakeScheduler(sacct_output)
+    backend = SlurmAccounting(run=run)
+    records = backend.update_database(connection)
+    assert run.calls[0][-1] == '101,104,105'
+    assert records['104'] == (None, None, None, None, True)
+    assert '105' not in records
+
+    # Only the job Rocoto has not seen finish is queried again
+    backend.update_database(connection)
+    assert run.calls[1][-1] == '105'
+    run = FakeScheduler(sacct_output)
+    SlurmAccounting(run=run).update_database(connection)
+    assert run.calls[0][-1] == '105'
+
+    rows = connection.execute('SELECT jobid, finished FROM jobs_accounting ORDER BY jobid').fetchall()
+    assert rows == [('101', 1), ('104', 1)]
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+import pytest
+
+_here = os.path.dirname(__file__)
+HOMEgfs = os.sep.join(_here.split(os.sep)[:-3])
+sys.path.append(os.path.join(HOMEgfs, 'workflow'))
+
+from rocoto_status import Experiment
+
+
+def watched_experiment(tmp_path):
+    """
+    Experiment watching test.xml and test.db, as of its last refresh (without a task model)
+    """
+    experiment = Experiment.__new__(Experiment)
+    experiment.workflow_file = str(tmp_path / 'test.xml')
+    experiment.database_file = str(tmp_path / 'test.db')
+    experiment.workflow_signature = Experiment._signature(experiment.workflow_file)
+    experiment.database_signature = Experiment._database_signature(experiment.database_file)
+    return experiment
+
+
+def insert_job(connection, taskname):
+    with connection:
+        connection.execute('INSERT INTO jobs (taskname, state, data) VALUES (?, ?, ?)', (taskname, 'QUEUED', bytes(8192)))
+
+
+@pytest.mark.parametrize('journal_mode', ['WAL', 'DELETE'])
+def test_database_changed(tmp_path, journal_mode):
+    (tmp_path / 'test.xml').write_text('<workflow/>\n')
+    with closing(sqlite3.connect(tmp_path / 'test.db')) as rocoto, closing(sqlite3.connect(tmp_path / 'test.db')) as reader:
+        rocoto.execute(f'PRAGMA journal_mode={journal_mode}')
+        with rocoto:
+            rocoto.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, taskname VARCHAR, state VARCHAR, data BLOB)')
+        insert_job(rocoto, 'prep')
+        # Another process (e.g. a viewer) reading the database keeps the WAL from being removed
+        reader.execute('SELECT COUNT(*) FROM jobs').fetchone()
+
+        experiment = watched_experiment(tmp_path)
+        assert not experiment.changed()
+
+        database = Experiment._signature(experiment.database_file)
+        insert_job(rocoto, 'anal')
+        if journal_mode == 'WAL':
+            # The commit only went to the -wal file
+            assert Experiment._signature(experiment.database_file) == database
+        assert experiment.changed()
+
+        experiment.database_signature = Experiment._database_signature(experiment.database_file)
+        assert not experiment.changed()
+
+    # Closing the last connection checkpoints the WAL into the database and removes it
+    assert experiment.changed() == (journal_mode == 'WAL')
+
+
+def test_workflow_changed(tmp_path):
+    (tmp_path / 'test.xml').write_text('<workflow/>\n')
+    experiment = watched_experiment(tmp_path)
+    assert experiment.database_signature == (None, None)
+    assert not experiment.changed()
+
+    (tmp_path / 'test.xml').write_text('<workflow realtime="F"/>\n')
+    assert experiment.changed()
@@ -1,13 +1,15 @@
 import sys
+import sqlite3
 import os
+import stat
 from shutil import rmtree
 import wget
+import pytest
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(os.path.dirname(script_dir), 'utils'))
 
-from rocotostat import rocoto_statcount, rocotostat_summary, is_done, is_stalled, CommandNotFoundError
-from wxflow import which
+from rocotostat import rocoto_statcount, rocotostat_summary, is_done, is_stalled, RocotoDatabase, get_rocotostat
 
 test_data_url = 'https://noaa-nws-global-pds.s3.amazonaws.com/data/CI/'
 
@@ -25,11 +27,8 @@ if not os.path.isfile(os.path.join(testdata_full_path, 'database.db')):
     database_destination = os.path.join(testdata_full_path, 'database.db')
     wget.download(database_url, database_destination)
 
-rocotostat_cmd = which('rocotostat')
-if not rocotostat_cmd:
-    raise CommandNotFoundError("rocotostat not found in PATH")
-
-rocotostat_cmd.add_default_arg(['-w', os.path.join(testdata_path, 'workflow.xml'), '-d', os.path.join(testdata_path, 'database.db')])
+# Read the database directly, rocotostat is not needed
+rocotostat_cmd = RocotoDatabase(os.path.join(testdata_full_path, 'database.db'), os.path.join(testdata_full_path, 'workflow.xml'))
 
 
 def test_rocoto_statcount():
@@ -64,7 +63,6 @@ def test_rocoto_done():
 def test_rocoto_stalled():
     testdata_path = 'testdata/rocotostat_stalled'
     testdata_full_path = os.path.join(script_dir, testdata_path)
-    xml = os.path.join(testdata_full_path, 'stalled.xml')
     db = os.path.join(testdata_full_path, 'stalled.db')
 
     if not os.path.isfile(os.path.join(testdata_full_path, 'stalled.db')):
@@ -78,8 +76,7 @@ def test_rocoto_stalled():
         database_destination = os.path.join(testdata_full_path, 'stalled.db')
         wget.download(database_url, database_destination)
 
-    rocotostat_cmd = which('rocotostat')
-    rocotostat_cmd.add_default_arg(['-w', xml, '-d', db])
+    rocotostat_cmd = RocotoDatabase(db, os.path.join(testdata_full_path, 'stalled.xml'))
 
     result = rocoto_statcount(rocotostat_cmd)
 
@@ -87,3 +84,84 @@ def test_rocoto_stalled():
     assert is_stalled(result)
 
     rmtree(testdata_full_path)
+
+
+def test_rocoto_unknown_schema(tmp_path):
+    db = tmp_path / 'unknown.db'
+    connection = sqlite3.connect(db)
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR(64))')
+    connection.close()
+
+    with pytest.raises(ValueError):
+        RocotoDatabase(db)
+
+
+def write_workflow(path, cycledef):
+    path.write_text(f"""<?xml version="1.0"?>
+<!DOCTYPE workflow
+[
+    <!ENTITY SDATE "202401010000">
+    <!ENTITY EDATE "202401011800">
+]>
+<workflow realtime="F" scheduler="slurm" cyclethrottle="1">
+    <log><cyclestr>/tmp/logs/@Y@m@d@H.log</cyclestr></log>
+    <cycledef group="gfs">{cycledef}</cycledef>
+</workflow>
+""")
+    return path
+
+
+def write_database(path, cycles):
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, taskname VARCHAR(64), cycle DATETIME, state VARCHAR(64))')
+    connection.execute('CREATE TABLE cycles (id INTEGER PRIMARY KEY, cycle DATETIME, activated DATETIME, done DATETIME)')
+    connection.executemany('INSERT INTO cycles (cycle, activated, done) VALUES (?, ?, ?)', cycles)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_rocoto_summary_cycles_not_activated(tmp_path):
+    # Four cycles in the XML; only the first was activated (and is done)
+    workflow = write_workflow(tmp_path / 'workflow.xml', '&SDATE; &EDATE; 06:00:00')
+    db = write_database(tmp_path / 'database.db', [(1704067200, 1704067200, 1704070800)])
+
+    result = rocotostat_summary(get_rocotostat(workflow, db))
+
+    assert result['CYCLES_TOTAL'] == 4
+    assert result['CYCLES_DONE'] == 1
+    assert not is_done(result)
+
+    # No cycle activated yet
+    db = write_database(tmp_path / 'empty.db', [])
+    result = rocotostat_summary(get_rocotostat(workflow, db))
+
+    assert result['CYCLES_TOTAL'] == 4
+    assert result['CYCLES_DONE'] == 0
+    assert not is_done(result)
+
+
+def test_rocoto_summary_cli_fallback(tmp_path, monkeypatch):
+    # A crontab cycledef is not read from the XML, rocotostat is run instead
+    workflow = write_workflow(tmp_path / 'workflow.xml', '00 00,12 1 1 2024 *')
+    db = write_database(tmp_path / 'database.db', [(1704067200, 1704067200, 1704070800)])
+
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    (bindir / 'rocotostat').write_text("""#!/usr/bin/env bash
+echo "$@" >> "${0}.log"
+echo "   CYCLE         STATE           ACTIVATED              DEACTIVATED"
+echo "202401010000        Done    Jan 01 2024 00:00:00    Jan 01 2024 01:00:00"
+echo "202401011200      Active    Jan 01 2024 12:00:00                       -"
+""")
+    (bindir / 'rocotostat').chmod(stat.S_IRWXU)
+    monkeypatch.setenv('PATH', f"{bindir}{os.pathsep}{os.environ['PATH']}")
+
+    rocotostat = get_rocotostat(workflow, db)
+    result = rocotostat_summary(rocotostat)
+
+    assert not isinstance(rocotostat, RocotoDatabase)
+    assert result['CYCLES_TOTAL'] == 2
+    assert result['CYCLES_DONE'] == 1
+    assert not is_done(result)
+    assert (bindir / 'rocotostat.log').read_text().split() == ['-w', str(workflow), '-d', str(db), '--summary']
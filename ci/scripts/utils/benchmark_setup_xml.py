@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Time setup_xml.py end-to-end on the ci/cases experiments
+
+Each case is created once with create_experiment.py in a scratch RUNTESTS
+directory, then setup_xml.py is run --repeat times on its EXPDIR.  The first
+run fills the cache of sourced configs, so both the first (cold) and the best
+of the following (warm) wall times are reported, with the size of the XML.
+Cases that cannot be created on this host are reported and skipped.
+
+    benchmark_setup_xml.py [--cases C48_ATM C96C48_hybatmDA ...] [--repeat 5] [--runtests DIR]
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from os.path import basename, splitext
+
+_here = os.path.dirname(__file__)
+_top = os.path.abspath(os.path.join(os.path.abspath(_here), '../../..'))
+
+
+def run_timed(args, env):
+    start = time.perf_counter()
+    result = subprocess.run(args, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, encoding='utf-8')
+    return time.perf_counter() - start, result
+
+
+def benchmark_case(case, runtests, repeat):
+    """
+    Create the experiment of a case and time setup_xml.py on it; returns None if it cannot be created
+    """
+    env = dict(os.environ, RUNTESTS=runtests, pslot=case)
+    case_yaml = os.path.join(_top, 'ci', 'cases', 'pr', f'{case}.yaml')
+    elapsed, result = run_timed([sys.executable, os.path.join(_top, 'workflow', 'create_experiment.py'),
+                                 '--overwrite', '--yaml', case_yaml], env)
+    if result.returncode != 0:
+        output = result.stdout.strip().splitlines()
+        reason = output[-1] if output else f'exit status {result.returncode}, no output'
+        print(f'{case}: unable to create the experiment, skipping\n  {reason}')
+        return None
+
+    expdir = os.path.join(runtests, 'EXPDIR', case)
+    # Start from a cold config cache, as for a new experiment
+    if os.path.exists(os.path.join(expdir, '.config_cache.json')):
+        os.remove(os.path.join(expdir, '.config_cache.json'))
+
+    timings = []
+    for _ in range(repeat):
+        elapsed, result = run_timed([sys.executable, os.path.join(_top, 'workflow', 'setup_xml.py'), expdir], env)
+        if result.returncode != 0:
+            print(f'{case}: setup_xml.py failed with exit status {result.returncode}\n{result.stdout or "(no output)"}')
+            return None
+        timings.append(elapsed)
+
+    return {'cold': timings[0],
+            'warm': min(timings[1:]) if len(timings) > 1 else None,
+            'xml_size': os.path.getsize(os.path.join(expdir, f'{case}.xml'))}
+
+
+def input_args():
+    parser = ArgumentParser(description='Time setup_xml.py on the ci/cases experiments')
+    parser.add_argument('--cases', nargs='+', help='cases to run (default: all of ci/cases/pr)',
+                        default=sorted(splitext(basename(case))[0]
+                                       for case in glob.glob(os.path.join(_top, 'ci', 'cases', 'pr', '*.yaml'))))
+    parser.add_argument('--repeat', type=int, default=5, help='number of setup_xml.py runs per case')
+    parser.add_argument('--runtests', help='directory where the experiments are created (default: a temporary directory)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = input_args()
+    runtests = args.runtests or tempfile.mkdtemp(prefix='benchmark_setup_xml.')
+
+    results = dict()
+    try:
+        for case in args.cases:
+            results[case] = benchmark_case(case, runtests, max(1, args.repeat))
+    finally:
+        if args.runtests is None:
+            shutil.rmtree(runtests, ignore_errors=True)
+
+    print(f"\n{'case':32s} {'cold (s)':>9s} {'warm (s)':>9s} {'XML (kB)':>9s}")
+    for case, result in results.items():
+        if result is None:
+            print(f'{case:32s} {"-":>9s} {"-":>9s} {"-":>9s}')
+            continue
+        warm = f"{result['warm']:.2f}" if result['warm'] is not None else '-'
+        print(f"{case:32s} {result['cold']:9.2f} {warm:>9s} {result['xml_size'] / 1024:9.1f}")
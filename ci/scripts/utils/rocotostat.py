@@ -3,6 +3,10 @@
 import sys
 import os
 import copy
+import sqlite3
+import xml.etree.ElementTree as ET
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
 from time import sleep
 
 from wxflow import which, Logger, CommandNotFoundError, ProcessError
@@ -12,6 +16,14 @@ from collections import Counter
 
 logger = Logger(level=os.environ.get("LOGGING_LEVEL", "DEBUG"), colored_log=False)
 
+STATUS_CASES = ['SUCCEEDED', 'FAIL', 'DEAD', 'RUNNING', 'SUBMITTING', 'QUEUED', 'UNAVAILABLE', 'UNKNOWN']
+
+# Tables and columns of the Rocoto database read by RocotoDatabase
+ROCOTO_SCHEMA = {
+    'jobs': {'taskname', 'cycle', 'state'},
+    'cycles': {'cycle', 'done'},
+}
+
 
 def attempt_multiple_times(expression, max_attempts, sleep_duration=0, exception_class=Exception):
     """
@@ -56,6 +68,159 @@ def attempt_multiple_times(expression, max_attempts, sleep_duration=0, exception
         raise last_exception
 
 
+def workflow_cycles(workflow_file):
+    """
+    Cycles defined by the cycledefs of a workflow XML.
+
+    Only cycledefs of the form 'start end interval' (as written by setup_xml.py)
+    are supported; the interval is [[[dd:]hh:]mm:]ss as read by Rocoto.
+
+    Parameters
+    ----------
+    workflow_file : str
+        Path to the workflow XML.
+
+    Returns
+    -------
+    set
+        Cycles as seconds since the epoch, as stored in the Rocoto database.
+
+    Raises
+    ------
+    ValueError
+        If the XML cannot be read or has a cycledef of another form (e.g. crontab).
+    """
+
+    try:
+        root = ET.parse(workflow_file).getroot()
+    except (OSError, ET.ParseError) as err:
+        raise ValueError(f"Unable to read the cycledefs of {workflow_file}: {err}")
+
+    cycles = set()
+    for cycledef in root.iter('cycledef'):
+        fields = (cycledef.text or '').split()
+        if len(fields) != 3:
+            raise ValueError(f"Unsupported cycledef '{cycledef.text}' in {workflow_file}")
+        start, end = (datetime.strptime(field, '%Y%m%d%H%M').replace(tzinfo=timezone.utc) for field in fields[:2])
+        units = [int(unit) for unit in fields[2].split(':')][::-1]
+        interval = timedelta(**dict(zip(['seconds', 'minutes', 'hours', 'days'], units)))
+        if interval <= timedelta(0):
+            raise ValueError(f"Unsupported cycledef '{cycledef.text}' in {workflow_file}")
+        while start <= end:
+            cycles.add(int(start.timestamp()))
+            start += interval
+
+    return cycles
+
+
+class RocotoDatabase:
+    """
+    Read-only reader of the Rocoto database of a workflow.
+
+    Computes the same status counts as rocotostat directly from the database,
+    with a couple of aggregate queries instead of running rocotostat and parsing
+    its output. The database is opened read-only while Rocoto may be writing it
+    (rollback journal or WAL), and the queries run in a single read transaction
+    so they see a consistent state.
+
+    The database only has the cycles Rocoto activated so far; as rocotostat, the
+    summary also counts the cycles of the workflow XML not activated yet.
+
+    Parameters
+    ----------
+    database_file : str
+        Path to the Rocoto database.
+    workflow_file : str, optional
+        Path to the workflow XML, whose cycledefs are counted in the summary.
+    timeout : float, optional
+        Seconds to wait for a lock held by rocotorun. Default is 60.
+
+    Raises
+    ------
+    ValueError
+        If the database does not have the tables and columns of a Rocoto database,
+        or the cycledefs of the workflow are not supported (see workflow_cycles).
+    """
+
+    def __init__(self, database_file, workflow_file=None, timeout=60):
+        self.database_file = os.path.abspath(database_file)
+        self.timeout = timeout
+        self.workflow_cycles = workflow_cycles(workflow_file) if workflow_file is not None else set()
+
+        missing = []
+        with self._connect() as connection:
+            for table, columns in ROCOTO_SCHEMA.items():
+                table_columns = {row[1] for row in connection.execute(f'PRAGMA table_info({table})')}
+                missing.extend(f'{table}.{column}' for column in sorted(columns - table_columns))
+        if missing:
+            raise ValueError(f"{self.database_file} is not a known Rocoto database schema, missing {', '.join(missing)}")
+
+    def _connect(self):
+        return closing(sqlite3.connect(f'file:{self.database_file}?mode=ro', uri=True, timeout=self.timeout))
+
+    def query(self, statements):
+        """
+        Run the statements in one read transaction and return the rows of each.
+        """
+        with self._connect() as connection:
+            connection.execute('BEGIN')
+            try:
+                return [connection.execute(statement).fetchall() for statement in statements]
+            finally:
+                connection.rollback()
+
+    def statcount(self):
+        """
+        Count of each status case over the jobs of all cycles (as rocotostat --all).
+        """
+        (states,) = self.query(['SELECT state, COUNT(*) FROM jobs GROUP BY state'])
+        status_counts = Counter(dict(states))
+        return {case: status_counts[case] for case in STATUS_CASES}
+
+    def summary(self):
+        """
+        Total number of cycles and number of cycles marked as done (as rocotostat --summary).
+
+        The total counts the cycles of the database and of the workflow cycledefs.
+        """
+        (cycles,) = self.query(['SELECT cycle, COALESCE(done, 0) > 0 FROM cycles'])
+        total = len(self.workflow_cycles.union(cycle for cycle, _ in cycles))
+        done = sum(done for _, done in cycles)
+        return {'CYCLES_TOTAL': total, 'CYCLES_DONE': done}
+
+
+def get_rocotostat(workflow_file, database_file):
+    """
+    get_rocotostat Get the reader of the status of a Rocoto workflow.
+
+    Returns a RocotoDatabase reading the database directly. If the database
+    schema is unknown (or it cannot be opened), or the cycledefs of the workflow
+    cannot be read, falls back to the rocotostat command with the workflow and
+    database as default arguments.
+
+    Input:
+    workflow_file - Path to the workflow XML.
+    database_file - Path to the Rocoto database.
+
+    Output:
+    rocotostat - A RocotoDatabase or the rocotostat command.
+    """
+
+    try:
+        return RocotoDatabase(database_file, workflow_file)
+    except (ValueError, sqlite3.Error) as err:
+        logger.warning(f"Unable to read the Rocoto database directly, using rocotostat: {err}")
+
+    try:
+        rocotostat = which("rocotostat", required=True)
+    except CommandNotFoundError:
+        logger.exception("rocotostat not found in PATH")
+        raise CommandNotFoundError("rocotostat not found in PATH")
+
+    rocotostat.add_default_arg(['-w', os.path.abspath(workflow_file), '-d', os.path.abspath(database_file)])
+    return rocotostat
+
+
 def input_args():
     """
     Parse command-line arguments.
@@ -67,8 +232,8 @@ def input_args():
     """
 
     description = """
-        Using rocotostat to get the status of all jobs this scripts
-        determines rocoto_state: if all cycles are done, then rocoto_state is Done.
+        Reading the status of all jobs from the Rocoto database (or with rocotostat
+        if the database schema is unknown) this scripts determines rocoto_state: if all cycles are done, then rocoto_state is Done.
         Assuming rocotorun had just been run, and the rocoto_state is not Done, then
         rocoto_state is Stalled if there are no jobs that are RUNNING, SUBMITTING, or QUEUED.
         """
@@ -95,11 +260,14 @@ def rocotostat_summary(rocotostat):
     number of cycles and the number of cycles marked as 'Done'.
 
     Input:
-    rocotostat - The rocotostat command.
+    rocotostat - The rocotostat command, or a RocotoDatabase to read the database directly.
 
     Output:
     rocoto_status - A dictionary with the total number of cycles and the number of cycles marked as 'Done'.
     """
+    if isinstance(rocotostat, RocotoDatabase):
+        return rocotostat.summary()
+
     rocotostat = copy.deepcopy(rocotostat)
     rocotostat.add_default_arg('--summary')
     rocotostat_output = attempt_multiple_times(lambda: rocotostat(output=str), 3, 90, ProcessError)
@@ -122,11 +290,13 @@ def rocoto_statcount(rocotostat):
     of each status case.
 
     Input:
-    rocotostat - The rocotostat command.
+    rocotostat - The rocotostat command, or a RocotoDatabase to read the database directly.
 
     Output:
     rocoto_status - A dictionary with the count of each status case.
     """
+    if isinstance(rocotostat, RocotoDatabase):
+        return rocotostat.statcount()
 
     rocotostat = copy.deepcopy(rocotostat)
     rocotostat.add_default_arg('--all')
@@ -136,11 +306,9 @@ def rocoto_statcount(rocotostat):
     rocotostat_output = [line.split()[0:4] for line in rocotostat_output]
     rocotostat_output = [line for line in rocotostat_output if len(line) != 1]
 
-    status_cases = ['SUCCEEDED', 'FAIL', 'DEAD', 'RUNNING', 'SUBMITTING', 'QUEUED', 'UNAVAILABLE', 'UNKNOWN']
-
     rocoto_status = {}
     status_counts = Counter(case for sublist in rocotostat_output for case in sublist)
-    for case in status_cases:
+    for case in STATUS_CASES:
         rocoto_status[case] = status_counts[case]
 
     return rocoto_status
@@ -151,7 +319,7 @@ def is_done(rocoto_status):
     is_done Check if all cycles are done.
 
     is_done(rocoto_status) checks if the total number of cycles equals the number of
-    done cycles in the rocoto_status dictionary.
+    done cycles in the rocoto_status dictionary. A workflow without cycles is not done.
 
     Input:
     rocoto_status - A dictionary with the count of each status case.
@@ -160,7 +328,7 @@ def is_done(rocoto_status):
     boolean - True if all cycles are done, False otherwise.
     """
 
-    if rocoto_status['CYCLES_TOTAL'] == rocoto_status['CYCLES_DONE']:
+    if rocoto_status['CYCLES_TOTAL'] > 0 and rocoto_status['CYCLES_TOTAL'] == rocoto_status['CYCLES_DONE']:
         return True
     else:
         return False
@@ -190,20 +358,15 @@ if __name__ == '__main__':
     """
     main Execute the script.
 
-    main() parses the input arguments, checks if the rocotostat command is available,
-    adds default arguments to the rocotostat command, and runs it and reports
-    out to stdout spcific information of rocoto workflow.
+    main() parses the input arguments, opens the Rocoto database read-only (or, if
+    its schema is unknown, checks if the rocotostat command is available and adds
+    default arguments to it), reads the status and reports out to stdout spcific
+    information of rocoto workflow.
     """
 
     args = input_args()
 
-    try:
-        rocotostat = which("rocotostat")
-    except CommandNotFoundError:
-        logger.exception("rocotostat not found in PATH")
-        raise CommandNotFoundError("rocotostat not found in PATH")
-
-    rocotostat.add_default_arg(['-w', os.path.abspath(args.w.name), '-d', os.path.abspath(args.d.name)])
+    rocotostat = get_rocotostat(args.w.name, args.d.name)
 
     rocoto_status = rocoto_statcount(rocotostat)
     rocoto_status.update(rocotostat_summary(rocotostat))
@@ -22,6 +22,12 @@ export FORECAST_HOUR=$(( ${fhr3_base/10#-/-10#} ))
 ###############################################################
 # Execute the JJOB
 ###############################################################
+if [[ -n "${FHRLST:-}" ]]; then
+  # Process each forecast hour of the group as soon as its inputs are available
+  "${HOMEgfs}/ush/run_fhr_group.sh" "${HOMEgfs}/jobs/JGLOBAL_ATMOS_PRODUCTS"
+  exit $?
+fi
+
 "${HOMEgfs}/jobs/JGLOBAL_ATMOS_PRODUCTS"
 
 exit $?
@@ -49,6 +49,12 @@ export FORECAST_HOUR=$(( 10#${FHR3} ))
 ###############################################################
 # Execute the JJOB
 ###############################################################
+if [[ -n "${FHRLST:-}" ]]; then
+  # Process each forecast hour of the group as soon as its inputs are available
+  "${HOMEgfs}/ush/run_fhr_group.sh" "${HOMEgfs}/jobs/JGLOBAL_ATMOS_UPP"
+  exit $?
+fi
+
 "${HOMEgfs}/jobs/JGLOBAL_ATMOS_UPP"
 
 exit $?
@@ -52,8 +52,7 @@ def main():
     archive.execute_store_products(arcdir_set)
 
     # Create the backup tarballs and store in ATARDIR
-    for atardir_set in atardir_sets:
-        archive.execute_backup_dataset(atardir_set)
+    archive.execute_backup_datasets(atardir_sets)
 
     os.chdir(cwd)
 
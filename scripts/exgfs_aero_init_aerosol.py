@@ -19,6 +19,10 @@ ROTDIR: 	Rotating (COM) directory
 USHgfs: 	Path to global-workflow `ush` directory
 PARMgfs: 	Path to global-workflow `parm` directory
 
+Optionally, AERO_MERGE_MODE may be set to 'subprocess' to run the merge script as a separate
+process for each tile, one after another, instead of merging all tiles concurrently in a pool
+of worker processes (the default, 'pool').
+
 Additionally, the following data files are used:
 
 - Tiled atmospheric initial conditions that follow the naming pattern determined by `atm_base_pattern` and `atm_file_pattern`
@@ -36,7 +40,10 @@ The tiled atmospheric intial condition files will be updated with conservation-a
 
 import os
 import subprocess
+import time as timer
 import typing
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from functools import partial
 
@@ -89,7 +96,9 @@ def main() -> None:
     tracer_files, rest_files, core_files = get_restart_files(time, incr, max_lookback, fcst_length, rot_dir, run)
 
     if (tracer_files is not None):
-        merge_tracers(merge_script, atm_files, tracer_files, rest_files, core_files[0], ctrl_files[0], tracer_list_file)
+        merge_mode = get_env_var("AERO_MERGE_MODE", fail_on_missing=False) or "pool"
+        merge_tracers(merge_script, atm_files, tracer_files, rest_files, core_files[0], ctrl_files[0], tracer_list_file,
+                      merge_mode)
 
     return
 
@@ -238,11 +247,15 @@ def merge_tracers(merge_script: str,
                   rest_files: typing.List[str],
                   core_file: str,
                   ctrl_file: str,
-                  tracer_list_file: str) -> None:
+                  tracer_list_file: str,
+                  merge_mode: str = "pool") -> None:
     '''
     Call the merger script to merge the tracers into the atmospheric IC files. Merged file is written to a temp file
     which then overwrites the original upon successful completion of the script.
 
+    By default, the merge script is imported once and all tiles are merged concurrently in a pool of
+    worker processes. With merge_mode 'subprocess', the script is run as a separate process for each tile in turn.
+
     Parameters
     ----------
     merge_script : str
@@ -259,6 +272,8 @@ def merge_tracers(merge_script: str,
             Path of control file
     tracer_list_file : str
             Full path to the file listing the tracer variables to add
+    merge_mode : str, optional
+            'pool' (default) to merge the tiles concurrently in-process, or 'subprocess'
 
     Returns
     ----------
@@ -269,7 +284,9 @@ def merge_tracers(merge_script: str,
     ValueError
             If `atm_files`, `tracer_files`, and `rest_files` are not all the same length
     CalledProcessError
-            If merge script exits with a non-zero error
+            If merge script exits with a non-zero error (subprocess mode)
+    SystemExit
+            If the merge of a tile fails (pool mode)
 
     '''
     print("Merging tracers")
@@ -279,12 +296,99 @@ def merge_tracers(merge_script: str,
     if (len(atm_files) != len(rest_files)):
         raise ValueError("Atmosphere file list and dycore file list are not the same length")
 
-    for atm_file, tracer_file, rest_file in zip(atm_files, tracer_files, rest_files):
-        if debug:
-            print(f"\tMerging tracers from {tracer_file} into {atm_file}")
-        temp_file = f'{atm_file}.tmp'
-        subprocess.run([merge_script, atm_file, tracer_file, core_file, ctrl_file, rest_file, tracer_list_file, temp_file], check=True)
-        os.replace(temp_file, atm_file)
+    start = timer.perf_counter()
+
+    if merge_mode == "subprocess":
+        for atm_file, tracer_file, rest_file in zip(atm_files, tracer_files, rest_files):
+            if debug:
+                print(f"\tMerging tracers from {tracer_file} into {atm_file}")
+            tile_start = timer.perf_counter()
+            temp_file = f'{atm_file}.tmp'
+            subprocess.run([merge_script, atm_file, tracer_file, core_file, ctrl_file, rest_file, tracer_list_file, temp_file], check=True)
+            os.replace(temp_file, atm_file)
+            print(f"\tMerged {atm_file} in {timer.perf_counter() - tile_start:.2f} s")
+    else:
+        with open(tracer_list_file) as variable_file:
+            tracer_names = variable_file.read().splitlines()
+
+        with ProcessPoolExecutor(max_workers=min(len(atm_files), os.cpu_count() or 1)) as executor:
+            futures = {}
+            for atm_file, tracer_file, rest_file in zip(atm_files, tracer_files, rest_files):
+                if debug:
+                    print(f"\tMerging tracers from {tracer_file} into {atm_file}")
+                futures[atm_file] = executor.submit(merge_tile_file, merge_script, atm_file, tracer_file, core_file,
+                                                    ctrl_file, rest_file, tracer_names)
+            for atm_file, future in futures.items():
+                print(f"\tMerged {atm_file} in {future.result():.2f} s")
+
+    print(f"Merged tracers for {len(atm_files)} tiles in {timer.perf_counter() - start:.2f} s")
+
+
+def merge_tile_file(merge_script: str,
+                    atm_file: str,
+                    tracer_file: str,
+                    core_file: str,
+                    ctrl_file: str,
+                    rest_file: str,
+                    tracer_names: typing.List[str]) -> float:
+    '''
+    Merge the tracers of one tile in the current process, writing to a temp file that then
+    replaces the atmospheric IC file.
+
+    Parameters
+    ----------
+    merge_script : str
+            Full path to the merge script, imported as a module
+    atm_file : str
+            Path to the atmospheric IC file of the tile
+    tracer_file : str
+            Path to the tracer restart file of the tile
+    core_file : str
+            Path of dycore restart file
+    ctrl_file : str
+            Path of control file
+    rest_file : str
+            Path to the dycore restart file of the tile
+    tracer_names : list of str
+            Tracer variables to add
+
+    Returns
+    ----------
+    float
+            Wall time of the merge in seconds
+
+    '''
+    start = timer.perf_counter()
+    temp_file = f'{atm_file}.tmp'
+    load_merge_module(merge_script).merge_tile(atm_file, ctrl_file, core_file, rest_file, tracer_file, tracer_names, temp_file)
+    os.replace(temp_file, atm_file)
+    return timer.perf_counter() - start
+
+
+def load_merge_module(merge_script: str):
+    '''
+    Import the merge script as a module, once per process
+
+    Parameters
+    ----------
+    merge_script : str
+            Full path to the merge script
+
+    Returns
+    ----------
+    module
+            The imported merge script
+
+    '''
+    if merge_script not in _merge_modules:
+        spec = importlib.util.spec_from_file_location("merge_fv3_aerosol_tile", merge_script)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _merge_modules[merge_script] = module
+    return _merge_modules[merge_script]
+
+
+_merge_modules = {}
 
 
 if __name__ == "__main__":
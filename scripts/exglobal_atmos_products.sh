@@ -8,6 +8,7 @@ export WGRIB2=${WGRIB2:-${wgrib2_ROOT}/bin/wgrib2}
 # Scripts used
 INTERP_ATMOS_MASTERSH=${INTERP_ATMOS_MASTERSH:-"${USHgfs}/interp_atmos_master.sh"}
 INTERP_ATMOS_SFLUXSH=${INTERP_ATMOS_SFLUXSH:-"${USHgfs}/interp_atmos_sflux.sh"}
+SPLIT_GRIB2=${SPLIT_GRIB2:-"${USHgfs}/split_grib2.py"}
 
 # Variables used in this job
 downset=${downset:-1}  # No. of groups of pressure grib2 products to create
@@ -84,52 +85,31 @@ for (( nset=1 ; nset <= downset ; nset++ )); do
   # process grib2 chunkfiles to interpolate using MPMD
   tmpfile="tmpfile${grp}_${fhr3}"
 
-  # shellcheck disable=SC2312
-  ncount=$(${WGRIB2} "${tmpfile}" | wc -l)
+  # Inventory of tmpfile, used to keep u and v components (and land and icec) in the same chunk
+  ${WGRIB2} -s "${tmpfile}" > "${tmpfile}.idx"
+  export err=$?; err_chk
+  ncount=$(wc -l < "${tmpfile}.idx")
   if (( nproc > ncount )); then
     echo "WARNING: Total no. of available processors '${nproc}' exceeds no. of records '${ncount}' in ${tmpfile}"
     echo "Reduce nproc to ${ncount} (or less) to not waste resources"
   fi
-  inv=$(( ncount / nproc ))
-  rm -f "${DATA}/poescript"
 
-  last=0
-  for (( iproc = 1 ; iproc <= nproc ; iproc++ )); do
-    first=$((last + 1))
-    last=$((last + inv))
-    if (( last > ncount )); then (( last = ncount )); fi
-
-    # if final record of is u-component, add next record v-component
-    # if final record is land, add next record icec
-    # grep returns 1 if no match is found, so temporarily turn off exit on non-zero rc
-    set +e
-    # shellcheck disable=SC2312
-    ${WGRIB2} -d "${last}" "${tmpfile}" | grep -E -i "ugrd|ustm|uflx|u-gwd|land"
-    rc=$?
-    set_strict
-    if (( rc == 0 )); then  # Matched the grep
-      last=$(( last + 1 ))
-    fi
-    if (( iproc == nproc )); then
-      last=${ncount}
-    fi
+  # Break tmpfile into processor specific chunks in preparation for MPMD
+  # The chunks are balanced by size and number of records, and copied as byte ranges of tmpfile
+  "${SPLIT_GRIB2}" --inventory "${tmpfile}.idx" --prefix "${tmpfile}_" "${tmpfile}" "${nproc}" > "${tmpfile}.chunks"
+  export err=$?; err_chk
+  nchunks=$(wc -l < "${tmpfile}.chunks")
 
-    # Break tmpfile into processor specific chunks in preparation for MPMD
-    ${WGRIB2} "${tmpfile}" -for "${first}":"${last}" -grib "${tmpfile}_${iproc}"
-    export err=$?; err_chk
+  rm -f "${DATA}/poescript"
+  for (( iproc = 1 ; iproc <= nchunks ; iproc++ )); do
     input_file="${tmpfile}_${iproc}"
     output_file_prefix="pgb2${grp}file_${fhr3}_${iproc}"
     echo "${INTERP_ATMOS_MASTERSH} ${input_file} ${output_file_prefix} ${grid_string}" >> "${DATA}/poescript"
-
-    # if at final record and have not reached the final processor then write echo's to
-    # poescript for remaining processors
-    if (( last == ncount )); then
-      for (( pproc = iproc+1 ; pproc < nproc ; pproc++ )); do
-        echo "/bin/echo ${pproc}" >> "${DATA}/poescript"
-      done
-      break
-    fi
-  done  # for (( iproc = 1 ; iproc <= nproc ; iproc++ )); do
+  done
+  # Write echo's to poescript for remaining processors
+  for (( pproc = nchunks + 1 ; pproc <= nproc ; pproc++ )); do
+    echo "/bin/echo ${pproc}" >> "${DATA}/poescript"
+  done
 
   # Run with MPMD or serial
   if [[ "${USE_CFP:-}" = "YES" ]]; then
@@ -149,7 +129,7 @@ for (( nset=1 ; nset <= downset ; nset++ )); do
   # Concatenate grib files from each processor into a single one
   # and clean-up as you go
   echo "Concatenating processor-specific grib2 files into a single product file"
-  for (( iproc = 1 ; iproc <= nproc ; iproc++ )); do
+  for (( iproc = 1 ; iproc <= nchunks ; iproc++ )); do
     for grid in "${grids[@]}"; do
       cat "pgb2${grp}file_${fhr3}_${iproc}_${grid}" >> "pgb2${grp}file_${fhr3}_${grid}"
       rm  "pgb2${grp}file_${fhr3}_${iproc}_${grid}"
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+import os
+
+from pygfs.task.cleanup import Cleanup
+from wxflow import Logger, cast_strdict_as_dtypedict, logit
+
+# Initialize root logger
+logger = Logger(level=os.environ.get("LOGGING_LEVEL", "DEBUG"), colored_log=True)
+
+
+@logit(logger)
+def main():
+
+    config = cast_strdict_as_dtypedict(os.environ)
+
+    # Instantiate the Cleanup object
+    cleanup = Cleanup(config)
+
+    # Remove the past cycles following the retention policy, then DATAROOT
+    cleanup.execute()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+#! /bin/env python3
+'''
+Compares the relevant output files of two experiment ROTDIRs and writes a
+  machine-readable (JSON) report.
+
+This is a faster replacement for diff_ROTDIR.sh that selects the same files:
+  both cycle directories are walked once, and every pair of files is first
+  hashed (in parallel) so byte-identical pairs are skipped without opening
+  them. The pairs that differ are compared according to their format over a
+  process pool:
+    - Text files, with a unified diff
+    - GRiB2 files, message by message: identical messages are skipped and the
+      others are decoded (with eccodes when it can be imported, otherwise with
+      the wgrib2 executable, ${WGRIB2} or the first found in PATH) to report the
+      max absolute and relative difference of each field
+    - NetCDF files, variable by variable with NumPy, reading the variables
+      in chunks so large files do not have to fit in memory. Variables listed
+      in the coordinate file are ignored, as in nccmp.
+
+Syntax
+------
+diff_ROTDIR.py [-c coord_file] [-o report] [-j nproc] rotdir cdate expA expB
+
+  OR
+
+diff_ROTDIR.py [-c coord_file] [-o report] [-j nproc] dirA dirB
+
+Parameters
+----------
+rotdir: string
+    Root rotdir where ROTDIRs are held
+cdate: string
+    Experiment date/cycle in YYYYMMDDHH format
+expA, expB: string
+    Experiment ids (PSLOT) to compare
+dirA, dirB: string
+    Full paths to the cycle directories to be compared
+    (${rotdir}/${exp}/gfs.${YYYYMMDD}/${cyc})
+
+The exit status is 1 if any compared file differs or is missing from dirB.
+'''
+import difflib
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+# Files compared, as (type, pattern relative to the cycle directory); same selection as diff_ROTDIR.sh
+FILE_PATTERNS = [
+    ('text', 'atmos/input.nml'),
+    ('text', 'atmos/storms.*'),
+    ('text', 'atmos/trak.*'),
+    ('text', 'ice/ice_in'),
+    ('text', 'ocean/MOM_input'),
+    ('grib2', 'atmos/*grb2*'),
+    ('grib2', 'atmos/*.flux.*'),
+    ('grib2', 'wave/gridded/*.grib2'),
+    ('grib2', 'ocean/*grb2'),
+    ('netcdf', 'atmos/*.nc'),
+    ('netcdf', 'ice/*.nc'),
+    ('netcdf', 'ocean/*.nc'),
+]
+
+# Number of GRiB2 messages compared by a single task of the process pool
+GRIB_MESSAGES_PER_TASK = 64
+
+# Value of the undefined grid points in the binary output of wgrib2
+WGRIB2_UNDEFINED = np.float32(9.999e20)
+
+# Max number of values of a NetCDF variable read at once from each file
+NETCDF_CHUNK_VALUES = 2**24
+
+
+def walk_files(top):
+    '''
+    Relative path of every file under top, from a single walk of the directory.
+    '''
+    files = set()
+    for root, dirs, names in os.walk(top):
+        for name in names:
+            files.add(os.path.relpath(os.path.join(root, name), top))
+    return files
+
+
+def select_files(files):
+    '''
+    The files to compare and their type, in the order of FILE_PATTERNS.
+    '''
+    selected = {}
+    for file_type, pattern in FILE_PATTERNS:
+        for file in sorted(fnmatch.filter(files, pattern)):
+            # The patterns match within their directory only, as the shell globs
+            if os.path.dirname(file) == os.path.dirname(pattern):
+                selected.setdefault(file, file_type)
+    return selected
+
+
+def file_hash(path):
+    '''
+    Size and SHA-256 of a file.
+    '''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**22), b''):
+            sha.update(block)
+    return os.path.getsize(path), sha.hexdigest()
+
+
+def read_coordinates(coord_file):
+    with open(coord_file) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def compare_text(fileA, fileB):
+    with open(fileA, errors='replace') as f:
+        linesA = f.readlines()
+    with open(fileB, errors='replace') as f:
+        linesB = f.readlines()
+    diff = ''.join(difflib.unified_diff(linesA, linesB, fromfile=fileA, tofile=fileB))
+    return {'status': 'different' if diff else 'identical', 'diff': diff}
+
+
+def diff_stats(valuesA, valuesB):
+    '''
+    Number of differing values and max absolute and relative differences of two arrays of the same shape.
+
+    Missing (masked or NaN) values only match missing values. The relative difference of a
+      value is relative to the largest magnitude of the pair.
+    '''
+    if not (np.issubdtype(valuesA.dtype, np.number) and np.issubdtype(valuesB.dtype, np.number)):
+        ndiff = int(np.count_nonzero(np.asarray(valuesA) != np.asarray(valuesB)))
+        return ndiff, None, None
+
+    a = np.ma.filled(np.ma.asarray(valuesA, dtype=np.float64), np.nan)
+    b = np.ma.filled(np.ma.asarray(valuesB, dtype=np.float64), np.nan)
+    missingA = np.isnan(a)
+    missingB = np.isnan(b)
+    valid = ~(missingA | missingB)
+    abs_diff = np.abs(a[valid] - b[valid])
+    scale = np.maximum(np.abs(a[valid]), np.abs(b[valid]))
+    rel_diff = np.divide(abs_diff, scale, out=np.zeros_like(abs_diff), where=scale > 0)
+
+    ndiff = int(np.count_nonzero(abs_diff) + np.count_nonzero(missingA != missingB))
+    max_abs = float(abs_diff.max()) if abs_diff.size else 0.0
+    max_rel = float(rel_diff.max()) if rel_diff.size else 0.0
+    return ndiff, max_abs, max_rel
+
+
+def merge_stats(stats, chunk):
+    ndiff, max_abs, max_rel = chunk
+    stats['ndiff'] += ndiff
+    if max_abs is not None:
+        stats['max_abs_diff'] = max(stats['max_abs_diff'] or 0.0, max_abs)
+        stats['max_rel_diff'] = max(stats['max_rel_diff'] or 0.0, max_rel)
+
+
+def compare_netcdf(fileA, fileB, coordinates):
+    '''
+    Compare the non-coordinate variables of two NetCDF files, chunk by chunk along their first dimension.
+    '''
+    try:
+        import netCDF4 as nc
+    except ImportError as err:
+        raise ImportError(f"Unable to import netCDF4 module\n{err}")
+
+    variables = []
+    with nc.Dataset(fileA) as ncA, nc.Dataset(fileB) as ncB:
+        for name in sorted(set(ncA.variables) | set(ncB.variables)):
+            if name in coordinates:
+                continue
+            if name not in ncA.variables or name not in ncB.variables:
+                variables.append({'name': name, 'status': 'missing in ' + ('A' if name not in ncA.variables else 'B')})
+                continue
+            varA = ncA.variables[name]
+            varB = ncB.variables[name]
+            if varA.shape != varB.shape:
+                variables.append({'name': name, 'status': f'shape differs: {varA.shape} vs {varB.shape}'})
+                continue
+
+            stats = {'name': name, 'ndiff': 0, 'max_abs_diff': None, 'max_rel_diff': None}
+            if len(varA.shape) == 0:
+                merge_stats(stats, diff_stats(np.ma.asarray(varA[...]), np.ma.asarray(varB[...])))
+            else:
+                step = max(1, NETCDF_CHUNK_VALUES // max(1, int(np.prod(varA.shape[1:]))))
+                for start in range(0, varA.shape[0], step):
+                    merge_stats(stats, diff_stats(np.ma.asarray(varA[start:start + step]),
+                                                  np.ma.asarray(varB[start:start + step])))
+            stats['status'] = 'different' if stats['ndiff'] else 'identical'
+            variables.append(stats)
+
+    ndiff = sum(1 for var in variables if var['status'] != 'identical')
+    return {'status': 'different' if ndiff else 'identical', 'variables': variables}
+
+
+def grib_messages(path):
+    '''
+    Offset and length of each message of a GRiB2 file, from the length in its indicator section.
+    '''
+    messages = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + 16 <= size:
+            f.seek(offset)
+            indicator = f.read(16)
+            if indicator[:4] != b'GRIB':
+                # Skip any padding between messages
+                start = indicator.find(b'G', 1)
+                offset += start if start > 0 else 16
+                continue
+            length = struct.unpack('>Q', indicator[8:16])[0] if indicator[7] == 2 else \
+                struct.unpack('>I', b'\0' + indicator[4:7])[0]
+            messages.append((offset, length))
+            offset += max(length, 16)
+    return messages
+
+
+def _eccodes_fields(messages):
+    '''
+    Name and values of each GRiB2 message, decoded with eccodes.
+    '''
+    import eccodes
+    fields = []
+    for message in messages:
+        gid = eccodes.codes_new_from_message(message)
+        try:
+            name = ':'.join(str(eccodes.codes_get(gid, key)) for key in ('shortName', 'typeOfLevel', 'level'))
+            fields.append((name, eccodes.codes_get_array(gid, 'values')))
+        finally:
+            eccodes.codes_release(gid)
+    return fields
+
+
+def _wgrib2_fields(messages, wgrib2):
+    '''
+    Name and values of each GRiB2 message, decoded with a single call to wgrib2.
+
+    The values of all the messages are written in one binary file, split with the number of points
+      wgrib2 reports for each field. Undefined values are returned as NaN.
+    '''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gribfile = os.path.join(tmpdir, 'messages.grib2')
+        binfile = os.path.join(tmpdir, 'values.bin')
+        with open(gribfile, 'wb') as f:
+            for message in messages:
+                f.write(message)
+        result = subprocess.run([wgrib2, gribfile, '-s', '-npts', '-no_header', '-bin', binfile],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
+        if result.returncode != 0:
+            raise RuntimeError(f'{wgrib2} failed to decode the GRiB2 messages: {result.stderr.strip()}')
+        values = np.fromfile(binfile, dtype=np.float32)
+
+    # One line per field: "N[.sub]:offset:d=YYYYMMDDHH:VAR:level:forecast::npts=NPTS", submessages are concatenated
+    names = [None] * len(messages)
+    arrays = [[] for _ in messages]
+    start = 0
+    for line in result.stdout.splitlines():
+        record, _, _, var, level = (line.split(':') + [''] * 5)[:5]
+        npts = int(line.rsplit('npts=', 1)[1])
+        index = int(record.split('.')[0]) - 1
+        names[index] = names[index] or f'{var}:{level}'
+        arrays[index].append(values[start:start + npts])
+        start += npts
+    if start != values.size or None in names:
+        raise RuntimeError(f'unexpected output of {wgrib2} for {len(messages)} GRiB2 messages')
+
+    fields = []
+    for name, array in zip(names, arrays):
+        array = np.concatenate(array).astype(np.float64)
+        array[array == WGRIB2_UNDEFINED] = np.nan
+        fields.append((name, array))
+    return fields
+
+
+def decode_grib_messages(messages):
+    '''
+    Name and values of each GRiB2 message, with eccodes or else wgrib2.
+    '''
+    try:
+        return _eccodes_fields(messages)
+    except ImportError:
+        pass
+    wgrib2 = shutil.which(os.environ.get('WGRIB2', 'wgrib2'))
+    if wgrib2 is None:
+        raise RuntimeError('GRiB2 messages differ but cannot be decoded: the eccodes module cannot be imported '
+                           'and wgrib2 is not found (set WGRIB2 or add it to PATH)')
+    return _wgrib2_fields(messages, wgrib2)
+
+
+def compare_grib_messages(fileA, fileB, pairs):
+    '''
+    Compare pairs of GRiB2 messages (index, (offset, length) in fileA, (offset, length) in fileB).
+
+    The messages that are not byte-identical are decoded to compare their values.
+    '''
+    indices = []
+    messagesA = []
+    messagesB = []
+    with open(fileA, 'rb') as fA, open(fileB, 'rb') as fB:
+        for index, (offsetA, lengthA), (offsetB, lengthB) in pairs:
+            fA.seek(offsetA)
+            messageA = fA.read(lengthA)
+            fB.seek(offsetB)
+            messageB = fB.read(lengthB)
+            if messageA != messageB:
+                indices.append(index)
+                messagesA.append(messageA)
+                messagesB.append(messageB)
+    if not indices:
+        return []
+
+    results = []
+    fieldsA = decode_grib_messages(messagesA)
+    fieldsB = decode_grib_messages(messagesB)
+    for index, (nameA, valuesA), (_, valuesB) in zip(indices, fieldsA, fieldsB):
+        result = {'name': f'{index + 1}:{nameA}', 'status': 'different',
+                  'ndiff': None, 'max_abs_diff': None, 'max_rel_diff': None}
+        if valuesA.shape == valuesB.shape:
+            ndiff, max_abs, max_rel = diff_stats(valuesA, valuesB)
+            result.update({'ndiff': ndiff, 'max_abs_diff': max_abs, 'max_rel_diff': max_rel})
+            if ndiff == 0:
+                # Same values, only the metadata or the packing differ
+                result['status'] = 'metadata differs'
+        else:
+            result['status'] = f'shape differs: {valuesA.shape} vs {valuesB.shape}'
+        results.append(result)
+    return results
+
+
+def compare_files(pairs, coordinates, nproc):
+    '''
+    Compare the pairs of files (relative path, type, fileA, fileB) that are not byte-identical.
+
+    The GRiB2 files are split into tasks of GRIB_MESSAGES_PER_TASK messages, so large files
+      are spread over the pool.
+    '''
+    reports = {}
+    with ProcessPoolExecutor(max_workers=nproc) as executor:
+        futures = {}
+        grib_futures = {}
+        for file, file_type, fileA, fileB in pairs:
+            if file_type == 'text':
+                futures[file] = executor.submit(compare_text, fileA, fileB)
+            elif file_type == 'netcdf':
+                futures[file] = executor.submit(compare_netcdf, fileA, fileB, coordinates)
+            else:
+                messagesA = grib_messages(fileA)
+                messagesB = grib_messages(fileB)
+                reports[file] = {'status': 'identical', 'variables': []}
+                if len(messagesA) != len(messagesB):
+                    reports[file]['status'] = f'number of messages differs: {len(messagesA)} vs {len(messagesB)}'
+                message_pairs = [(index, a, b) for index, (a, b) in enumerate(zip(messagesA, messagesB))]
+                grib_futures[file] = [executor.submit(compare_grib_messages, fileA, fileB,
+                                                      message_pairs[i:i + GRIB_MESSAGES_PER_TASK])
+                                      for i in range(0, len(message_pairs), GRIB_MESSAGES_PER_TASK)]
+
+        for file, future in futures.items():
+            try:
+                reports[file] = future.result()
+            except Exception as err:
+                reports[file] = {'status': 'error', 'error': str(err)}
+        for file, file_futures in grib_futures.items():
+            try:
+                for future in file_futures:
+                    reports[file]['variables'].extend(future.result())
+            except Exception as err:
+                reports[file] = {'status': 'error', 'error': str(err)}
+                continue
+            if reports[file]['variables'] and reports[file]['status'] == 'identical':
+                reports[file]['status'] = 'different'
+    return reports
+
+
+def compare_rotdirs(dirA, dirB, coordinates, nproc=None):
+    '''
+    Compare the relevant files of two cycle directories and return the report.
+    '''
+    filesB = walk_files(dirB)
+    selected = select_files(walk_files(dirA))
+
+    reports = {}
+    pairs = []
+    for file in selected:
+        if file not in filesB:
+            reports[file] = {'status': 'missing in B'}
+        else:
+            pairs.append(file)
+
+    # Byte-identical files need no further comparison
+    with ThreadPoolExecutor(max_workers=nproc) as executor:
+        hashesA = executor.map(file_hash, [os.path.join(dirA, file) for file in pairs])
+        hashesB = executor.map(file_hash, [os.path.join(dirB, file) for file in pairs])
+        different = []
+        for file, hashA, hashB in zip(pairs, hashesA, hashesB):
+            if hashA == hashB:
+                reports[file] = {'status': 'identical'}
+            else:
+                different.append((file, selected[file], os.path.join(dirA, file), os.path.join(dirB, file)))
+
+    reports.update(compare_files(different, coordinates, nproc))
+
+    files = [dict(file=file, type=selected[file], **reports[file]) for file in selected]
+    summary = {}
+    for file in files:
+        summary[file['status']] = summary.get(file['status'], 0) + 1
+    return {'dirA': dirA, 'dirB': dirB, 'summary': summary, 'files': files}
+
+
+def print_report(report):
+    for file in report['files']:
+        print(f"=== {file['file']} ===")
+        if file['status'] != 'different':
+            print(file.get('error', file['status']))
+        elif file['type'] == 'text':
+            print(file['diff'])
+        else:
+            for var in file['variables']:
+                if var['status'] == 'identical':
+                    continue
+                print(f"{var['name']}: {var['status']} ndiff={var.get('ndiff')} "
+                      f"max_abs_diff={var.get('max_abs_diff')} max_rel_diff={var.get('max_rel_diff')}")
+    print('Summary: ' + ', '.join(f'{count} {status}' for status, count in sorted(report['summary'].items())))
+
+
+def input_args():
+    parser = ArgumentParser(description='Compare the output files of two experiment ROTDIRs')
+    parser.add_argument('dirs', nargs='+', metavar='dir',
+                        help='dirA dirB (cycle directories) or rotdir cdate expA expB')
+    parser.add_argument('-c', '--coord-file', default=os.path.join(_here, 'coordinates.lst'),
+                        help='file containing a list of NetCDF coordinate variables to ignore')
+    parser.add_argument('-o', '--output', help='write the JSON report to this file (default: stdout summary only)')
+    parser.add_argument('-j', '--nproc', type=int, default=None, help='number of parallel workers (default: number of CPUs)')
+    args = parser.parse_args()
+
+    if len(args.dirs) == 4:
+        rotdir, cdate, expA, expB = args.dirs
+        args.dirs = [os.path.join(rotdir, exp, f'gfs.{cdate[:8]}', cdate[8:10]) for exp in (expA, expB)]
+    elif len(args.dirs) != 2:
+        parser.error(f'{len(args.dirs)} is not a valid number of arguments, use 2 or 4')
+    return args
+
+
+if __name__ == '__main__':
+    args = input_args()
+    dirA, dirB = args.dirs
+
+    report = compare_rotdirs(dirA, dirB, read_coordinates(args.coord_file), args.nproc)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    sys.exit(0 if set(report['summary']) <= {'identical'} else 1)
@@ -5,9 +5,11 @@
 # script to run executables to produce netCDF analysis
 # on GFS gaussian grid for downstream users
 import os
+import shlex
 import shutil
 import subprocess
 import sys
+import time
 import gsi_utils
 from collections import OrderedDict
 import datetime
@@ -20,7 +22,7 @@ python2fortran_bool = {True: '.true.', False: '.false.'}
 def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                 ComIn_Ges, GPrefix,
                 FixDir, atmges_ens_mean, RunDir, NThreads, NEMSGet, IAUHrs,
-                ExecCMD, ExecCMDMPI, ExecAnl, ExecChgresInc, run, JEDI):
+                ExecCMD, ExecCMDMPI, ExecAnl, ExecChgresInc, run, JEDI, DryRun=False):
     print('calcanl_gfs beginning at: ', datetime.datetime.utcnow())
 
     IAUHH = IAUHrs
@@ -33,17 +35,17 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                 CalcAnlDir = RunDir + '/calcanl_' + format(fh, '02')
                 if not os.path.exists(CalcAnlDir):
                     gsi_utils.make_dir(CalcAnlDir)
-                gsi_utils.copy_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
+                gsi_utils.link_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
                 gsi_utils.link_file(RunDir + '/siginc.nc', CalcAnlDir + '/siginc.nc.06')
                 gsi_utils.link_file(RunDir + '/sigf06', CalcAnlDir + '/ges.06')
                 gsi_utils.link_file(RunDir + '/siganl', CalcAnlDir + '/anl.06')
-                gsi_utils.copy_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
+                gsi_utils.link_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
                 # for ensemble res analysis
                 if Run in ["gdas", "gfs"]:
                     CalcAnlDir = RunDir + '/calcanl_ensres_' + format(fh, '02')
                     if not os.path.exists(CalcAnlDir):
                         gsi_utils.make_dir(CalcAnlDir)
-                    gsi_utils.copy_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
+                    gsi_utils.link_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
                     gsi_utils.link_file(RunDir + '/siginc.nc', CalcAnlDir + '/siginc.nc.06')
                     gsi_utils.link_file(ComOut + '/' + APrefix + 'atmanl.ensres.nc', CalcAnlDir + '/anl.ensres.06')
                     gsi_utils.link_file(ComIn_Ges + '/' + GPrefix + 'atmf006.ensres.nc', CalcAnlDir + '/ges.ensres.06')
@@ -69,7 +71,7 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                                         CalcAnlDir6 + '/ges.' + format(fh, '02'))
                     gsi_utils.link_file(RunDir + '/sigf' + format(fh, '02'),
                                         CalcAnlDir + '/ges.' + format(fh, '02'))
-                    gsi_utils.copy_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
+                    gsi_utils.link_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
                     # for ensemble res analysis
                     CalcAnlDir = RunDir + '/calcanl_ensres_' + format(fh, '02')
                     CalcAnlDir6 = RunDir + '/calcanl_ensres_' + format(6, '02')
@@ -89,16 +91,16 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
         CalcAnlDir = RunDir + '/calcanl_' + format(6, '02')
         if not os.path.exists(CalcAnlDir):
             gsi_utils.make_dir(CalcAnlDir)
-        gsi_utils.copy_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
+        gsi_utils.link_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
         gsi_utils.link_file(RunDir + '/siginc.nc', CalcAnlDir + '/siginc.nc.06')
         gsi_utils.link_file(RunDir + '/sigf06', CalcAnlDir + '/ges.06')
         gsi_utils.link_file(RunDir + '/siganl', CalcAnlDir + '/anl.06')
-        gsi_utils.copy_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
+        gsi_utils.link_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
         # for ensemble res analysis
         CalcAnlDir = RunDir + '/calcanl_ensres_' + format(6, '02')
         if not os.path.exists(CalcAnlDir):
             gsi_utils.make_dir(CalcAnlDir)
-        gsi_utils.copy_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
+        gsi_utils.link_file(ExecAnl, CalcAnlDir + '/calc_anl.x')
         gsi_utils.link_file(RunDir + '/siginc.nc', CalcAnlDir + '/siginc.nc.06')
         gsi_utils.link_file(ComOut + '/' + APrefix + 'atmanl.ensres.nc', CalcAnlDir + '/anl.ensres.06')
         gsi_utils.link_file(ComIn_Ges + '/' + GPrefix + 'atmf006.ensres.nc', CalcAnlDir + '/ges.ensres.06')
@@ -130,98 +132,34 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
 
     sys.stdout.flush()
     # need to gather information about runtime environment
-    ExecCMD = ExecCMD.replace("$ncmd", "1")
     os.environ['OMP_NUM_THREADS'] = str(NThreads)
     os.environ['ncmd'] = str(nFH)
-    ExecCMDMPI1 = ExecCMDMPI.replace("$ncmd", str(1))
-    ExecCMDMPI = ExecCMDMPI.replace("$ncmd", str(nFH))
-    ExecCMDLevs = ExecCMDMPI.replace("$ncmd", str(levs))
-    ExecCMDMPI13 = ExecCMDMPI.replace("$ncmd", str(13))
 
-    # are we using mpirun with lsf, srun, or aprun with Cray?
-    launcher = ExecCMDMPI.split(' ')[0]
+    # are we using mpirun with lsf, srun, mpiexec with PBS, or aprun with Cray?
+    launcher = shlex.split(ExecCMDMPI)[0] if ExecCMDMPI.strip() else ''
+    if launcher not in mpi_launchers:
+        print('unknown MPI launcher. Failure.')
+        sys.exit(1)
+    hosts = get_hosts(launcher)
+    nhosts = len(hosts)
+
+    # need to account for when fewer than LEVS tasks are available
     if launcher == 'mpirun':
-        hostfile = os.getenv('LSB_DJOB_HOSTFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'mpirun -np ' + str(nFH) + ' --hostfile hosts'
         tasks = int(os.getenv('LSB_DJOB_NUMPROC', 1))
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'mpirun -np ' + str(tasks) + ' --hostfile hosts'
-            ExecCMDMPILevs_nohost = 'mpirun -np ' + str(tasks)
-        else:
-            ExecCMDMPILevs_host = 'mpirun -np ' + str(levs) + ' --hostfile hosts'
-            ExecCMDMPILevs_nohost = 'mpirun -np ' + str(levs)
-        ExecCMDMPI1_host = 'mpirun -np 1 --hostfile hosts'
-        ExecCMDMPI13_host = 'mpirun -np 13 --hostfile hosts'
     elif launcher == 'mpiexec':
-        hostfile = os.getenv('PBS_NODEFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'mpiexec -l -n ' + str(nFH)
         tasks = int(os.getenv('ntasks_calcanl', 1))
-        print('nhosts,tasks=', nhosts, tasks)
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'mpiexec -l -n ' + str(tasks)
-            ExecCMDMPILevs_nohost = 'mpiexec -l -n ' + str(tasks)
-        else:
-            ExecCMDMPILevs_host = 'mpiexec -l -n ' + str(levs)
-            ExecCMDMPILevs_nohost = 'mpiexec -l -n ' + str(levs)
-        ExecCMDMPI1_host = 'mpiexec -l -n 1 --cpu-bind depth --depth ' + str(NThreads)
-        ExecCMDMPI13_host = 'mpiexec -l -n 13 --cpu-bind depth --depth ' + str(NThreads)
     elif launcher == 'srun':
-        nodes = os.getenv('SLURM_JOB_NODELIST', '')
-        hosts_tmp = subprocess.check_output('scontrol show hostnames ' + nodes, shell=True)
-        if (sys.version_info > (3, 0)):
-            hosts_tmp = hosts_tmp.decode('utf-8')
-            hosts_tmp = str(hosts_tmp).splitlines()
-            hosts_tmp = [x.strip() for x in hosts_tmp]
-        else:
-            hosts_tmp = hosts_tmp.strip()
-            hosts_tmp = str(hosts_tmp).splitlines()
-            hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'srun -n ' + str(nFH) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-        # need to account for when fewer than LEVS tasks are available
         tasks = int(os.getenv('SLURM_NPROCS', 1))
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'srun -n ' + str(tasks) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-            ExecCMDMPILevs_nohost = 'srun -n ' + str(tasks) + ' --verbose --export=ALL'
-        else:
-            ExecCMDMPILevs_host = 'srun -n ' + str(levs) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-            ExecCMDMPILevs_nohost = 'srun -n ' + str(levs) + ' --verbose --export=ALL'
-        ExecCMDMPI1_host = 'srun -n 1 --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-        ExecCMDMPI13_host = 'srun -n 13 --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-    elif launcher == 'aprun':
-        hostfile = os.getenv('LSB_DJOB_HOSTFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n ' + str(nFH)
-        ExecCMDMPILevs_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n ' + str(levs)
-        ExecCMDMPILevs_nohost = 'aprun -d ' + str(NThreads) + ' -n ' + str(levs)
-        ExecCMDMPI1_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n 1'
-        ExecCMDMPI13_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n 13'
     else:
-        print('unknown MPI launcher. Failure.')
-        sys.exit(1)
+        tasks = levs
+    levtasks = min(levs, tasks)
+    print('nhosts,tasks=', nhosts, tasks)
 
-    # generate the full resolution analysis
-    ihost = 0
-    # interpolate increment to full background resolution
+    # interpolate increment to full background resolution for all IAU hours at once
+    # each instance of chgres_inc is pinned to its own host(s)
+    # for xjet, each instance of chgres_inc must run on two nodes each
+    chgres_nhosts = 2 if launcher == 'srun' and os.getenv('SLURM_JOB_PARTITION', '') == 'xjet' else 1
+    chgres_jobs = []
     for fh in IAUHH:
         # first check to see if increment file exists
         CalcAnlDir = RunDir + '/calcanl_' + format(fh, '02')
@@ -236,36 +174,16 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                                  "outfile": "'inc.fullres." + format(fh, '02') + "'",
                                  }
             gsi_utils.write_nml(namelist, CalcAnlDir + '/fort.43')
-
-            if ihost >= nhosts:
-                ihost = 0
-            with open(CalcAnlDir + '/hosts', 'w') as hostfile:
-                hostfile.write(hosts[ihost] + '\n')
-                if launcher == 'srun':  # need to write host per task not per node for slurm
-                    # For xjet, each instance of chgres_inc must run on two nodes each
-                    if os.getenv('SLURM_JOB_PARTITION', '') == 'xjet':
-                        for a in range(0, 4):
-                            hostfile.write(hosts[ihost] + '\n')
-                        ihost += 1
-                        for a in range(0, 5):
-                            hostfile.write(hosts[ihost] + '\n')
-                    for a in range(0, 12):  # need 12 more of the same host for the 13 tasks for chgres_inc
-                        hostfile.write(hosts[ihost] + '\n')
-            if launcher == 'srun':
-                os.environ['SLURM_HOSTFILE'] = CalcAnlDir + '/hosts'
             print('interp_inc', fh, namelist)
-            job = subprocess.Popen(ExecCMDMPI13_host + ' ' + CalcAnlDir + '/chgres_inc.x', shell=True, cwd=CalcAnlDir)
-            print(ExecCMDMPI13_host + ' ' + CalcAnlDir + '/chgres_inc.x submitted on ' + hosts[ihost])
-            sys.stdout.flush()
-            ec = job.wait()
-            if ec != 0:
-                print('Error with chgres_inc.x at forecast hour: f' + format(fh, '03'))
-                print('Error with chgres_inc.x, exit code=' + str(ec))
-                print(locals())
-                sys.exit(ec)
-            ihost += 1
+            chgres_jobs.append({'name': 'chgres_inc f' + format(fh, '03'),
+                                'exe': CalcAnlDir + '/chgres_inc.x',
+                                'cwd': CalcAnlDir,
+                                'ntasks': 13,
+                                'nhosts': min(chgres_nhosts, nhosts),
+                                })
         else:
             print('f' + format(fh, '03') + ' is in $IAUFHRS but increment file is missing. Skipping.')
+    run_jobs(chgres_jobs, launcher, hosts, NThreads, DryRun)
 
     # generate analysis from interpolated increment
     CalcAnlDir6 = RunDir + '/calcanl_' + format(6, '02')
@@ -280,30 +198,23 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                          }
 
     gsi_utils.write_nml(namelist, CalcAnlDir6 + '/calc_analysis.nml')
-
-    # run the executable
-    if ihost >= nhosts - 1:
-        ihost = 0
-    if launcher == 'srun':
-        del os.environ['SLURM_HOSTFILE']
     print('fullres_calc_anl', namelist)
-    fullres_anl_job = subprocess.Popen(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x', shell=True, cwd=CalcAnlDir6)
-    print(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x submitted')
 
-    sys.stdout.flush()
-    exit_fullres = fullres_anl_job.wait()
-    sys.stdout.flush()
-    if exit_fullres != 0:
-        print('Error with calc_analysis.x for deterministic resolution, exit code=' + str(exit_fullres))
-        print(locals())
-        sys.exit(exit_fullres)
+    # the analysis is computed by levs tasks placed by the launcher across the whole allocation
+    run_jobs([{'name': 'calc_anl fullres',
+               'exe': CalcAnlDir6 + '/calc_anl.x',
+               'cwd': CalcAnlDir6,
+               'ntasks': levtasks,
+               'nhosts': 0,
+               }], launcher, hosts, NThreads, DryRun)
 
     # compute determinstic analysis on ensemble resolution
+    # each hour gets its own run directory so that the namelists do not collide
     if Run in ["gdas", "gfs"]:
-        chgres_jobs = []
+        ensres_jobs = []
+        CalcAnlDir6 = RunDir + '/calcanl_ensres_06'
         for fh in IAUHH:
             # first check to see if guess file exists
-            CalcAnlDir6 = RunDir + '/calcanl_ensres_06'
             print(CalcAnlDir6 + '/ges.ensres.' + format(fh, '02'))
             if (os.path.isfile(CalcAnlDir6 + '/ges.ensres.' + format(fh, '02'))):
                 print('Calculating analysis on ensemble resolution for f' + format(fh, '03'))
@@ -317,30 +228,178 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                                      "fhr": fh,
                                      "jedi": python2fortran_bool[JEDI],
                                      }
-
-                gsi_utils.write_nml(namelist, CalcAnlDir6 + '/calc_analysis.nml')
-
-                # run the executable
-                if ihost > nhosts - 1:
-                    ihost = 0
+                CalcAnlDirFH = CalcAnlDir6 + '/f' + format(fh, '03')
+                if not os.path.exists(CalcAnlDirFH):
+                    gsi_utils.make_dir(CalcAnlDirFH)
+                for fname in os.listdir(CalcAnlDir6):
+                    if not os.path.isdir(CalcAnlDir6 + '/' + fname) and fname != 'calc_analysis.nml':
+                        gsi_utils.link_file(CalcAnlDir6 + '/' + fname, CalcAnlDirFH + '/' + fname)
+                gsi_utils.write_nml(namelist, CalcAnlDirFH + '/calc_analysis.nml')
                 print('ensres_calc_anl', namelist)
-                ensres_anl_job = subprocess.Popen(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x', shell=True, cwd=CalcAnlDir6)
-                print(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x submitted')
-
-                sys.stdout.flush()
-                # check on analysis steps
-                exit_ensres = ensres_anl_job.wait()
-                if exit_ensres != 0:
-                    print('Error with calc_analysis.x for ensemble resolution, exit code=' + str(exit_ensres))
-                    print(locals())
-                    sys.exit(exit_ensres)
+                ensres_jobs.append({'name': 'calc_anl ensres f' + format(fh, '03'),
+                                    'exe': CalcAnlDir6 + '/calc_anl.x',
+                                    'cwd': CalcAnlDirFH,
+                                    'ntasks': levtasks,
+                                    'nhosts': 0,
+                                    })
             else:
                 print('f' + format(fh, '03') + ' is in $IAUFHRS but ensemble resolution guess file is missing. Skipping.')
+        run_jobs(ensres_jobs, launcher, hosts, NThreads, DryRun, total_tasks=tasks)
 
     print('calcanl_gfs successfully completed at: ', datetime.datetime.utcnow())
     print(locals())
 
 
+mpi_launchers = ['mpirun', 'mpiexec', 'srun', 'aprun']
+
+
+def get_hosts(launcher):
+    """ get_hosts(launcher)
+    - function to return the unique hosts of the allocation, in order
+    input: launcher - name of the MPI launcher
+    returns: hosts - list of host names
+    """
+    if launcher == 'srun':
+        nodes = os.getenv('SLURM_JOB_NODELIST', '')
+        hosts_tmp = subprocess.check_output(['scontrol', 'show', 'hostnames', nodes]).decode('utf-8').splitlines()
+    else:
+        hostfile = os.getenv('PBS_NODEFILE' if launcher == 'mpiexec' else 'LSB_DJOB_HOSTFILE', '')
+        with open(hostfile) as f:
+            hosts_tmp = f.readlines()
+    hosts = []
+    [hosts.append(x) for x in (h.strip() for h in hosts_tmp) if x and x not in hosts]
+    return hosts
+
+
+def mpi_command(launcher, ntasks, nthreads, pinned):
+    """ mpi_command(launcher, ntasks, nthreads, pinned)
+    - function to build the argument list of an MPI launch
+    input: launcher - name of the MPI launcher
+           ntasks   - number of MPI tasks
+           nthreads - number of threads per task
+           pinned   - True if the tasks are placed on the hosts in the 'hosts'
+                      file of the run directory (or $SLURM_HOSTFILE)
+    returns: argv - list of launcher arguments, without the executable
+    """
+    if launcher == 'mpirun':
+        argv = ['mpirun', '-np', str(ntasks)]
+        if pinned:
+            argv += ['--hostfile', 'hosts']
+    elif launcher == 'mpiexec':
+        argv = ['mpiexec', '-l', '-n', str(ntasks)]
+        if pinned:
+            argv += ['--hostfile', 'hosts', '--cpu-bind', 'depth', '--depth', str(nthreads)]
+    elif launcher == 'srun':
+        argv = ['srun', '-n', str(ntasks), '--verbose', '--export=ALL']
+        if pinned:
+            argv += ['-c', '1', '--distribution=arbitrary', '--cpu-bind=cores']
+    elif launcher == 'aprun':
+        argv = ['aprun'] + (['-l', 'hosts'] if pinned else []) + ['-d', str(nthreads), '-n', str(ntasks)]
+    else:
+        raise ValueError('unknown MPI launcher: ' + launcher)
+    return argv
+
+
+def run_jobs(jobs, launcher, hosts, nthreads, dry_run=False, total_tasks=None):
+    """ run_jobs(jobs, launcher, hosts, nthreads, dry_run, total_tasks)
+    - function to launch independent MPI jobs concurrently within the allocation
+      Jobs needing 'nhosts' > 0 are pinned to that many hosts of their own and
+      run concurrently as long as hosts are free.  Jobs with 'nhosts' == 0 are
+      placed by the launcher; they run concurrently as long as the sum of their
+      tasks does not exceed total_tasks (by default one at a time).
+      Exits with the return code of the first job that fails.
+    input: jobs     - list of dicts with keys name, exe, cwd, ntasks and nhosts
+           launcher - name of the MPI launcher
+           hosts    - list of unique hosts of the allocation
+           nthreads - number of threads per task
+           dry_run  - only print the planned task and host layout
+           total_tasks - number of tasks available to jobs placed by the launcher
+    """
+    pending = list(jobs)
+    running = []
+    free_hosts = list(hosts)
+    free_tasks = total_tasks
+    tstart = time.time()
+
+    while pending or running:
+        # launch every pending job that fits in the free resources
+        for job in list(pending):
+            if job['nhosts'] > 0:
+                if len(free_hosts) < job['nhosts']:
+                    continue
+                job['hosts'] = free_hosts[:job['nhosts']]
+                del free_hosts[:job['nhosts']]
+            else:
+                if running and (free_tasks is None or free_tasks < job['ntasks']):
+                    continue
+                job['hosts'] = []
+                if free_tasks is not None:
+                    free_tasks -= job['ntasks']
+            pending.remove(job)
+
+            argv = mpi_command(launcher, job['ntasks'], nthreads, job['nhosts'] > 0) + [job['exe']]
+            env = dict(os.environ)
+            if job['hosts']:
+                hostlist = write_hostfile(job, launcher)
+                if launcher == 'srun':
+                    env['SLURM_HOSTFILE'] = hostlist
+            else:
+                env.pop('SLURM_HOSTFILE', None)
+
+            print(('[dry-run] ' if dry_run else '') + job['name'] + ': ' + str(job['ntasks']) + ' tasks on ' +
+                  (','.join(job['hosts']) if job['hosts'] else 'launcher placement') +
+                  ' in ' + job['cwd'] + ': ' + ' '.join(shlex.quote(a) for a in argv))
+            sys.stdout.flush()
+            if dry_run:
+                job['proc'] = None
+            else:
+                job['proc'] = subprocess.Popen(argv, cwd=job['cwd'], env=env)
+            job['start'] = time.time()
+            running.append(job)
+
+        # wait for any running job to finish and release its resources
+        time.sleep(0 if dry_run else 1)
+        for job in list(running):
+            ec = 0 if job['proc'] is None else job['proc'].poll()
+            if ec is None:
+                continue
+            running.remove(job)
+            free_hosts.extend(job['hosts'])
+            if job['nhosts'] == 0 and free_tasks is not None:
+                free_tasks += job['ntasks']
+            if ec != 0:
+                print('Error with ' + job['name'] + ', exit code=' + str(ec))
+                for other in running:
+                    other['proc'].terminate()
+                sys.exit(ec)
+            if not dry_run:
+                print(job['name'] + ' completed in ' + format(time.time() - job['start'], '.1f') + 's')
+
+    if jobs and not dry_run:
+        print(str(len(jobs)) + ' jobs completed in ' + format(time.time() - tstart, '.1f') + 's')
+    sys.stdout.flush()
+
+
+def write_hostfile(job, launcher):
+    """ write_hostfile(job, launcher)
+    - function to write the 'hosts' file of a pinned job in its run directory
+      Slurm needs one host per task, other launchers one per host.
+    input: job      - dict with keys cwd, ntasks and hosts
+           launcher - name of the MPI launcher
+    returns: path to the hosts file
+    """
+    hostlist = os.path.join(job['cwd'], 'hosts')
+    with open(hostlist, 'w') as hostfile:
+        if launcher == 'srun':
+            per_host = -(-job['ntasks'] // len(job['hosts']))
+            for i in range(job['ntasks']):
+                hostfile.write(job['hosts'][i // per_host] + '\n')
+        else:
+            for host in job['hosts']:
+                hostfile.write(host + '\n')
+    return hostlist
+
+
 # run the function if this script is called from the command line
 if __name__ == '__main__':
     DoIAU = gsi_utils.isTrue(os.getenv('DOIAU', 'NO'))
@@ -362,10 +421,11 @@ if __name__ == '__main__':
     IAUHrs = cast_as_dtype(os.getenv('IAUFHRS', '6,'))
     Run = os.getenv('RUN', 'gdas')
     JEDI = gsi_utils.isTrue(os.getenv('DO_JEDIATMVAR', 'YES'))
+    DryRun = gsi_utils.isTrue(os.getenv('CALCANL_DRYRUN', 'NO')) or '--dry-run' in sys.argv[1:]
 
     print(locals())
     calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                 ComIn_Ges, GPrefix,
                 FixDir, atmges_ens_mean, RunDir, NThreads, NEMSGet, IAUHrs,
                 ExecCMD, ExecCMDMPI, ExecAnl, ExecChgresInc,
-                Run, JEDI)
+                Run, JEDI, DryRun)
@@ -27,10 +27,8 @@ optional arguments:
 """
 import os
 import sys
-import subprocess
 from typing import List
 from functools import partial
-from shutil import copyfile
 import argparse
 import numpy as np
 import netCDF4
@@ -39,8 +37,21 @@ import netCDF4
 #   print statments may be out-of-order with subprocess output
 print = partial(print, flush=True)
 
+# Number of model levels processed at once, bounds the memory used per tracer
+CHUNK_LEVELS = 16
 
-def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, rest_file_name: str, append_file_name: str, tracers_to_append: List[str]) -> None:
+
+def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, rest_file_name: str, append_file_name: str,
+               tracers_to_append: List[str], out_file_name: str = None, chunk_levels: int = CHUNK_LEVELS) -> None:
+    """
+    Write a copy of base_file_name with the tracers in tracers_to_append added from append_file_name.
+
+    The tracers are rescaled so that their mass is conserved on the IC sigma levels. The output file is
+    written in a single pass: ntracer is defined with its final size and checksum attributes are dropped.
+    Fields are processed chunk_levels levels at a time to bound memory.
+
+    If out_file_name is not given, base_file_name is replaced by the merged file.
+    """
     if not os.path.isfile(base_file_name):
         print("FATAL ERROR: Atmosphere file " + base_file_name + " does not exist!")
         sys.exit(102)
@@ -61,82 +72,129 @@ def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, re
         print("FATAL ERROR: Chemistry file " + append_file_name + " does not exist!")
         sys.exit(106)
 
-    append_file = netCDF4.Dataset(append_file_name, "r")
-    base_file = netCDF4.Dataset(base_file_name, "r+")
-    core_file = netCDF4.Dataset(core_file_name, "r")
-    ctrl_file = netCDF4.Dataset(ctrl_file_name, "r")
-    rest_file = netCDF4.Dataset(rest_file_name, "r")
-
-    # read pressure layer thickness from restart file
-    delp = rest_file["delp"][0, :]
-    # read a, b coefficients to generate sigma levels
-    ak = core_file["ak"][0, :]
-    bk = core_file["bk"][0, :]
-
-    # read surface pressure from initial conditions file
-    psfc = base_file["ps"][:, :]
-    # read sigma-level a, b coefficients from initial conditions control file
-    ai = ctrl_file["vcoord"][0, 1:]
-    bi = ctrl_file["vcoord"][1, 1:]
-
-    # IC sigma levels must match model restart sigma levels
-    if ak.size != ai.size:
-        print("FATAL ERROR: Inconsistent size of A(k) arrays: src=", ak.size, ", dst=", ai.size)
-        sys.exit(107)
-
-    if bk.size != bi.size:
-        print("FATAL ERROR: Inconsistent size of B(k) arrays: src=", bk.size, ", dst=", bi.size)
-        sys.exit(108)
-
-    dp = np.zeros(delp.shape)
-    for k in range(0, dp.shape[0]):
-        dp[k, :, :] = ak[k + 1] - ak[k] + psfc * (bk[k + 1] - bk[k])
-
-    scale_factor = delp / dp
-
-    # print(base_file)
-    # print(base_file.dimensions["ntracer"])
-
-    old_ntracer = base_file.dimensions["ntracer"].size
-    new_ntracer = old_ntracer
-
-    print("Adding the following variables to " + base_file_name + ":\n")
-
-    print(" Name   | Total mass (restart) | Total mass (IC)      | Max column abs. diff.")
-    print("-" * 8 + "+" + "-" * 22 + "+" + "-" * 22 + "+" + "-" * 24)
-    for variable_name in tracers_to_append:
-        variable = append_file[variable_name]
-        if variable_name not in base_file.variables.keys():
-            new_ntracer = new_ntracer + 1
-            base_file.createVariable(variable_name, variable.datatype, base_file["sphum"].dimensions)
-        base_file[variable_name][0, :, :] = 0.
-        base_file[variable_name][1:, :, :] = scale_factor * variable[0, :, :, :]
-        base_file[variable_name].setncatts(variable.__dict__)
-        mass_src = variable * delp
-        mass_dst = base_file[variable_name][1:, :, :] * dp
-        mass_err_max = np.max(np.abs(mass_src - mass_dst))
-        total_mass_src = np.sum(mass_src)
-        total_mass_dst = np.sum(mass_dst)
-        print(f' {variable_name:6}   {total_mass_src:20}   {total_mass_dst:20}    {mass_err_max:22}')
-        # print("Done adding " + variable_name)
-
-    print("-" * 79 + "\n")
-
-    base_file.close()
-
-    if new_ntracer != old_ntracer:
-        print("Updating ntracer")
-
-        # Use ncks to rewrite file without ntracer so we can define it anew
-        subprocess.run(["ncks", "-x", "-v", "ntracer", "-O", base_file_name, base_file_name], check=True)
-
-        base_file = netCDF4.Dataset(base_file_name, "r+")
-        base_file.createDimension("ntracer", new_ntracer)
-        # print(base_file.dimensions["ntracer"])
-        base_file.close()
-
-    # Remove checksum
-    subprocess.run(["ncatted", "-a", "checksum,,d,,", base_file_name], check=True)
+    in_place = out_file_name is None or os.path.abspath(out_file_name) == os.path.abspath(base_file_name)
+    write_file_name = base_file_name + ".merge.tmp" if in_place else out_file_name
+
+    with netCDF4.Dataset(append_file_name, "r") as append_file, \
+            netCDF4.Dataset(base_file_name, "r") as base_file, \
+            netCDF4.Dataset(core_file_name, "r") as core_file, \
+            netCDF4.Dataset(ctrl_file_name, "r") as ctrl_file, \
+            netCDF4.Dataset(rest_file_name, "r") as rest_file:
+
+        # read a, b coefficients to generate sigma levels
+        ak = core_file["ak"][0, :]
+        bk = core_file["bk"][0, :]
+
+        # read surface pressure from initial conditions file
+        psfc = base_file["ps"][:, :]
+        # read sigma-level a, b coefficients from initial conditions control file
+        ai = ctrl_file["vcoord"][0, 1:]
+        bi = ctrl_file["vcoord"][1, 1:]
+
+        # IC sigma levels must match model restart sigma levels
+        if ak.size != ai.size:
+            print("FATAL ERROR: Inconsistent size of A(k) arrays: src=", ak.size, ", dst=", ai.size)
+            sys.exit(107)
+
+        if bk.size != bi.size:
+            print("FATAL ERROR: Inconsistent size of B(k) arrays: src=", bk.size, ", dst=", bi.size)
+            sys.exit(108)
+
+        # pressure thickness of the IC layers, dp[k] = ak[k+1] - ak[k] + psfc * (bk[k+1] - bk[k])
+        dak = np.diff(ak)[:, np.newaxis, np.newaxis]
+        dbk = np.diff(bk)[:, np.newaxis, np.newaxis]
+        nlev = dak.shape[0]
+
+        old_ntracer = base_file.dimensions["ntracer"].size
+        new_tracers = [name for name in tracers_to_append if name not in base_file.variables.keys()]
+        new_ntracer = old_ntracer + len(new_tracers)
+
+        if new_ntracer != old_ntracer:
+            print(f"Updating ntracer from {old_ntracer} to {new_ntracer}")
+
+        with netCDF4.Dataset(write_file_name, "w", format=base_file.data_model) as out_file:
+            _copy_structure(base_file, out_file, {"ntracer": new_ntracer}, skip_variables=tracers_to_append)
+
+            print("Adding the following variables to " + base_file_name + ":\n")
+
+            print(" Name   | Total mass (restart) | Total mass (IC)      | Max column abs. diff.")
+            print("-" * 8 + "+" + "-" * 22 + "+" + "-" * 22 + "+" + "-" * 24)
+            for variable_name in tracers_to_append:
+                variable = append_file[variable_name]
+                template = base_file[variable_name] if variable_name in base_file.variables else base_file["sphum"]
+                datatype = base_file[variable_name].datatype if variable_name in base_file.variables else variable.datatype
+                attrs = _clean_attrs(variable)
+                out_var = out_file.createVariable(variable_name, datatype, template.dimensions,
+                                                  fill_value=attrs.pop("_FillValue", None))
+                out_var.setncatts(attrs)
+
+                out_var[0, :, :] = 0.
+                total_mass_src = 0.
+                total_mass_dst = 0.
+                mass_err_max = 0.
+                for k0 in range(0, nlev, chunk_levels):
+                    k1 = min(k0 + chunk_levels, nlev)
+                    dp = dak[k0:k1] + psfc * dbk[k0:k1]
+                    delp = rest_file["delp"][0, k0:k1]
+                    src = variable[0, k0:k1]
+                    out_var[k0 + 1:k1 + 1] = (delp / dp) * src
+                    mass_src = src * delp
+                    mass_dst = out_var[k0 + 1:k1 + 1] * dp
+                    mass_err_max = max(mass_err_max, np.max(np.abs(mass_src - mass_dst)))
+                    total_mass_src += np.sum(mass_src)
+                    total_mass_dst += np.sum(mass_dst)
+                print(f' {variable_name:6}   {total_mass_src:20}   {total_mass_dst:20}    {mass_err_max:22}')
+
+            print("-" * 79 + "\n")
+
+    if in_place:
+        os.replace(write_file_name, base_file_name)
+
+
+def _clean_attrs(variable) -> dict:
+    """Attributes of a netCDF variable or dataset without checksums"""
+    return {name: variable.getncattr(name) for name in variable.ncattrs() if name != "checksum"}
+
+
+def _copy_structure(src: netCDF4.Dataset, dst: netCDF4.Dataset, dim_sizes: dict, skip_variables: List[str],
+                    chunk_levels: int = CHUNK_LEVELS) -> None:
+    """
+    Copy dimensions, attributes and variables from src to dst, overriding the size of the dimensions in
+    dim_sizes and leaving out checksums and the variables in skip_variables.
+    Variables are copied chunk_levels entries of their leading dimension at a time.
+    """
+    dst.setncatts(_clean_attrs(src))
+
+    for name, dim in src.dimensions.items():
+        dst.createDimension(name, None if dim.isunlimited() else dim_sizes.get(name, dim.size))
+
+    for name, variable in src.variables.items():
+        if name in skip_variables:
+            continue
+        attrs = _clean_attrs(variable)
+        kwargs = {"fill_value": attrs.pop("_FillValue", None)}
+        if dst.data_model.startswith("NETCDF4"):
+            filters = variable.filters() or {}
+            kwargs["zlib"] = filters.get("zlib", False)
+            kwargs["complevel"] = filters.get("complevel", 4)
+            kwargs["shuffle"] = filters.get("shuffle", False)
+            chunking = variable.chunking()
+            if chunking not in (None, "contiguous"):
+                kwargs["chunksizes"] = chunking
+        out_var = dst.createVariable(name, variable.datatype, variable.dimensions, **kwargs)
+        out_var.setncatts(attrs)
+
+        # Copy the raw values so that scaling, masking and fill values round trip unchanged
+        variable.set_auto_maskandscale(False)
+        out_var.set_auto_maskandscale(False)
+        if variable.ndim == 0:
+            out_var.assignValue(variable.getValue())
+        elif variable.ndim == 1 or variable.shape[0] <= chunk_levels:
+            out_var[:] = variable[:]
+        else:
+            for k0 in range(0, variable.shape[0], chunk_levels):
+                k1 = min(k0 + chunk_levels, variable.shape[0])
+                out_var[k0:k1] = variable[k0:k1]
 
 
 def main() -> None:
@@ -162,17 +220,14 @@ def main() -> None:
 
     if out_file_name is None:
         print("INFO: No out_file specified, will edit atm_file in-place")
-        out_file_name = atm_file_name
-    else:
-        if os.path.isfile(out_file_name):
-            print("WARNING: Specified out file " + out_file_name + " exists and will be overwritten")
-        copyfile(atm_file_name, out_file_name)
+    elif os.path.isfile(out_file_name):
+        print("WARNING: Specified out file " + out_file_name + " exists and will be overwritten")
 
     variable_file = open(variable_file)
     variable_names = variable_file.read().splitlines()
     variable_file.close()
 
-    merge_tile(out_file_name, ctrl_file_name, core_file_name, rest_file_name, chem_file_name, variable_names)
+    merge_tile(atm_file_name, ctrl_file_name, core_file_name, rest_file_name, chem_file_name, variable_names, out_file_name)
 
     # print(variable_names)
 
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import pickle
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Union
+
+import jcb
+import jinja2
+from jcb import render
+from jinja2 import meta
+from wxflow import Jinja, mkdir_p, parse_j2yaml
+
+logger = getLogger(__name__.split('.')[-1])
+
+
+class JediConfigCache:
+    """
+    Cache of rendered JEDI configurations shared by the steps of a task
+
+    Rendered configurations are pickled (so they come back with the same types,
+    e.g. datetimes) in cache_dir, typically in DATA which all the steps of an
+    analysis share, under the hash of everything the rendering depends on:
+      - for J2-YAML templates, the content of the template and of the templates
+        it includes, and the values of the task_config variables they reference
+      - for JCB, the filled JCB driving configuration, the JCB version and the
+        files in the application template directories (app_path_*) it points to
+    Later steps of the same cycle then load the configuration instead of rendering it again.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def parse_j2yaml(self, path: str, data: Dict[str, Any], searchpath: Union[str, List] = '/') -> Dict[str, Any]:
+        """Cached equivalent of wxflow.parse_j2yaml(path, data, searchpath=searchpath)
+        """
+
+        key = self._key('j2yaml', _template_fingerprint(path, data, searchpath))
+        return self._get(key, os.path.basename(path), lambda: parse_j2yaml(path, data, searchpath=searchpath))
+
+    def render(self, jcb_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Cached equivalent of jcb.render(jcb_config)
+        """
+
+        app_paths = {name: _tree_fingerprint(value) for name, value in jcb_config.items()
+                     if name.startswith('app_path') and isinstance(value, str)}
+        key = self._key('jcb', [jcb_config, getattr(jcb, '__version__', None), app_paths])
+        return self._get(key, f"jcb-{jcb_config.get('algorithm', 'config')}", lambda: render(jcb_config))
+
+    def _get(self, key: str, label: str, render_fn) -> Dict[str, Any]:
+        """Load the configuration cached under key, or render and cache it
+        """
+
+        cache_file = os.path.join(self.cache_dir, f"{label}.{key[:16]}.pkl")
+        if os.path.isfile(cache_file):
+            self.hits += 1
+            logger.info(f"JEDI config cache hit for {label}: loading {cache_file}")
+            with open(cache_file, 'rb') as fh:
+                return pickle.load(fh)
+
+        self.misses += 1
+        logger.info(f"JEDI config cache miss for {label}: rendering to {cache_file}")
+        config = render_fn()
+
+        # Write through a temporary file so that concurrent steps never read a partial config
+        mkdir_p(self.cache_dir)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as fh:
+            pickle.dump(config, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+
+        return config
+
+    @staticmethod
+    def _key(kind: str, parts: Any) -> str:
+        return hashlib.sha256(json.dumps([kind, parts], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _template_fingerprint(path: str, data: Dict[str, Any], searchpath: Union[str, List]) -> Dict[str, Any]:
+    """Hashes of a J2 template and the templates it includes, and the data variables they reference
+
+    If an include cannot be resolved statically, all of data is part of the fingerprint.
+    """
+
+    searchpaths = ['/'] + (searchpath if isinstance(searchpath, list) else [searchpath]) + [os.path.dirname(path)]
+    # Parse with the wxflow environment so that its filters are known
+    env = Jinja('', data).get_set_env(jinja2.BaseLoader())
+
+    files = {}
+    variables = set()
+    complete = True
+    pending = [os.path.abspath(path)]
+    while pending:
+        template = pending.pop()
+        if template in files:
+            continue
+        with open(template, 'rb') as fh:
+            source = fh.read()
+        files[template] = hashlib.sha256(source).hexdigest()
+
+        ast = env.parse(source.decode())
+        variables.update(meta.find_undeclared_variables(ast))
+        for name in meta.find_referenced_templates(ast):
+            resolved = _resolve_template(name, searchpaths) if name is not None else None
+            if resolved is None:
+                complete = False
+            else:
+                pending.append(resolved)
+
+    if complete:
+        data = {name: data[name] for name in variables if name in data}
+    return {'files': files, 'data': data}
+
+
+def _resolve_template(name: str, searchpaths: List[str]) -> Optional[str]:
+    """Find an included template in the search paths, as jinja2.FileSystemLoader does
+    """
+
+    for searchpath in searchpaths:
+        candidate = os.path.join(searchpath, name)
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+def _tree_fingerprint(path: str) -> List:
+    """Name, size and modification time of the files under path
+    """
+
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [[path, stat.st_size, stat.st_mtime_ns]]
+
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            stat = os.stat(os.path.join(root, filename))
+            entries.append([os.path.relpath(os.path.join(root, filename), path), stat.st_size, stat.st_mtime_ns])
+    return entries
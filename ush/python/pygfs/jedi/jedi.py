@@ -4,7 +4,6 @@ import os
 import tarfile
 from logging import getLogger
 from typing import List, Dict, Any, Optional
-from jcb import render
 from wxflow import (AttrDict,
                     FileHandler,
                     chdir, rm_p,
@@ -13,6 +12,8 @@ from wxflow import (AttrDict,
                     Task,
                     Executable,
                     WorkflowException)
+from pygfs.jedi.config_cache import JediConfigCache
+from pygfs.jedi.jedi_config import JediConfig
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -55,8 +56,20 @@ class Jedi:
         else:
             self.yaml = os.path.join(task_config.DATA, os.path.splitext(_exe_name)[0] + '.yaml')
         self.config = AttrDict()
+        self._config_index = None
         self.j2tmpl_dir = os.path.join(task_config.PARMgfs, 'gdas')
 
+        # Rendered configs are cached in DATA (shared by all steps of the analysis) unless told otherwise
+        self.config_cache = JediConfigCache(task_config.get('JEDI_CONFIG_CACHE_DIR',
+                                                            os.path.join(task_config.DATA, 'jedi_config_cache')))
+
+    @property
+    def config_index(self) -> JediConfig:
+        """Index of the current JEDI configuration, built on first use after it is set"""
+        if self._config_index is None or self._config_index.config is not self.config:
+            self._config_index = JediConfig(self.config)
+        return self._config_index
+
     @logit(logger)
     def set_config(self, task_config: AttrDict, algorithm: Optional[str] = None) -> AttrDict:
         """Compile a JEDI configuration dictionary from a template file and save to a YAML file
@@ -90,11 +103,11 @@ class Jedi:
                 jcb_config.update(jcb_algo_config)
 
             # Step 3: Generate the JEDI YAML using JCB
-            self.config = render(jcb_config)
+            self.config = self.config_cache.render(jcb_config)
         elif 'JEDIYAML' in task_config.keys():
             # Generate JEDI YAML without using JCB
-            self.config = parse_j2yaml(task_config.JEDIYAML, task_config,
-                                       searchpath=self.j2tmpl_dir)
+            self.config = self.config_cache.parse_j2yaml(task_config.JEDIYAML, task_config,
+                                                         searchpath=self.j2tmpl_dir)
         else:
             logger.exception(f"FATAL ERROR: Unable to compile JEDI configuration dictionary, ABORT!")
             raise KeyError(f"FATAL ERROR: Task config must contain JCB_BASE_YAML or JEDIYAML")
@@ -176,11 +189,8 @@ class Jedi:
             a dictionary containing the list of observation files to copy for FileHandler
         """
 
-        observations = find_value_in_nested_dict(self.config, 'observations')
-
         copylist = []
-        for ob in observations['observers']:
-            obfile = ob['obs space']['obsdatain']['engine']['obsfile']
+        for obfile in self.config_index.obs_files:
             basename = os.path.basename(obfile)
             copylist.append([os.path.join(task_config.COM_OBS, basename), obfile])
         obs_dict = {
@@ -210,19 +220,15 @@ class Jedi:
             a dictionary containing the list of observation bias files to copy for FileHandler
         """
 
-        observations = find_value_in_nested_dict(self.config, 'observations')
-
         copylist = []
-        for ob in observations['observers']:
-            if 'obs bias' in ob.keys():
-                obfile = ob['obs bias']['input file']
-                obdir = os.path.dirname(obfile)
-                basename = os.path.basename(obfile)
-                prefix = '.'.join(basename.split('.')[:-3])
-                bfile = f"{prefix}.{bias_file}"
-                tar_file = os.path.join(obdir, bfile)
-                copylist.append([os.path.join(task_config.VarBcDir, bfile), tar_file])
-                break
+        # all observers share the bias correction tar file, so only the first one is needed
+        for obfile in self.config_index.bias_files[:1]:
+            obdir = os.path.dirname(obfile)
+            basename = os.path.basename(obfile)
+            prefix = '.'.join(basename.split('.')[:-3])
+            bfile = f"{prefix}.{bias_file}"
+            tar_file = os.path.join(obdir, bfile)
+            copylist.append([os.path.join(task_config.VarBcDir, bfile), tar_file])
 
         bias_dict = {
             'mkdir': [os.path.join(task_config.DATA, 'bc')],
@@ -263,74 +269,3 @@ class Jedi:
         except tarfile.ExtractError as err:
             logger.exception(f"FATAL ERROR: unable to extract from {tar_file}")
             raise tarfile.ExtractError("FATAL ERROR: unable to extract from {tar_file}")
-
-
-@logit(logger)
-def find_value_in_nested_dict(nested_dict: Dict, target_key: str) -> Any:
-    """
-    Recursively search through a nested dictionary and return the value for the target key.
-    This returns the first target key it finds.  So if a key exists in a subsequent
-    nested dictionary, it will not be found.
-
-    Parameters
-    ----------
-    nested_dict : Dict
-        Dictionary to search
-    target_key : str
-        Key to search for
-
-    Returns
-    -------
-    Any
-        Value of the target key
-
-    Raises
-    ------
-    KeyError
-        If key is not found in dictionary
-
-    TODO: if this gives issues due to landing on an incorrect key in the nested
-    dictionary, we will have to implement a more concrete method to search for a key
-    given a more complete address.  See resolved conversations in PR 2387
-
-    # Example usage:
-    nested_dict = {
-        'a': {
-            'b': {
-                'c': 1,
-                'd': {
-                    'e': 2,
-                    'f': 3
-                }
-            },
-            'g': 4
-        },
-        'h': {
-            'i': 5
-        },
-        'j': {
-            'k': 6
-        }
-    }
-
-    user_key = input("Enter the key to search for: ")
-    result = find_value_in_nested_dict(nested_dict, user_key)
-    """
-
-    if not isinstance(nested_dict, dict):
-        raise TypeError(f"Input is not of type(dict)")
-
-    result = nested_dict.get(target_key)
-    if result is not None:
-        return result
-
-    for value in nested_dict.values():
-        if isinstance(value, dict):
-            try:
-                result = find_value_in_nested_dict(value, target_key)
-                if result is not None:
-                    return result
-            except KeyError:
-                pass
-
-    raise KeyError(f"Key '{target_key}' not found in the nested dictionary")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+from logging import getLogger
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from wxflow import AttrDict, logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+
+class JediConfig:
+    """
+    Index of a rendered JEDI configuration
+
+    The configuration is walked once to record where every key first appears
+    (checking the keys of a dictionary before those of its nested dictionaries,
+    in order) and to extract, for each observer, the files it reads and writes.  Lookups then no longer walk
+    the configuration, which matters for configurations with hundreds of observers.
+
+    The index refers to the configuration dictionary itself; rebuild it after
+    modifying the configuration other than through remove_observers.
+    """
+
+    @logit(logger, name="JediConfig")
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Build the index of a JEDI configuration
+
+        Parameters
+        ----------
+        config : Dict
+            Rendered JEDI configuration
+        """
+
+        if not isinstance(config, dict):
+            raise TypeError("Input is not of type(dict)")
+
+        self.config = config
+
+        # Path (tuple of keys) to the first occurrence of every key
+        self.paths = {}
+        self._index_keys(config, ())
+
+        # Files read and written by each observer
+        self.observers = []
+        if 'observations' in self.paths:
+            for ob in self.find('observations').get('observers') or []:
+                self.observers.append(_observer_files(ob))
+
+    def find(self, key: str) -> Any:
+        """Return the value of the first (non-null) occurrence of key in the configuration
+
+        Raises
+        ------
+        KeyError
+            If key is not found in the configuration
+        """
+
+        try:
+            path = self.paths[key]
+        except KeyError:
+            raise KeyError(f"Key '{key}' not found in the nested dictionary")
+
+        value = self.config
+        for name in path:
+            value = value[name]
+        return value
+
+    @property
+    def obs_files(self) -> List[str]:
+        """Observation files read by the observers"""
+        return [ob.obsfile for ob in self.observers if ob.obsfile]
+
+    @property
+    def obs_out_files(self) -> List[str]:
+        """Observation (diagnostic) files written by the observers"""
+        return [ob.obsoutfile for ob in self.observers if ob.obsoutfile]
+
+    @property
+    def bias_files(self) -> List[str]:
+        """Bias correction coefficient files read by the observers"""
+        return [ob.bias_file for ob in self.observers if ob.bias_file]
+
+    @property
+    def bias_out_files(self) -> List[str]:
+        """Bias correction coefficient files written by the observers"""
+        return [ob.bias_out_file for ob in self.observers if ob.bias_out_file]
+
+    @property
+    def tlapse_files(self) -> List[str]:
+        """Lapse rate (tlapse) files read by the bias correction predictors"""
+        return [tlapse for ob in self.observers for tlapse in ob.tlapse_files]
+
+    @logit(logger)
+    def remove_observers(self, drop: Callable[[AttrDict], bool]) -> List[AttrDict]:
+        """Remove the observers for which drop(entry) is true from the configuration
+
+        Parameters
+        ----------
+        drop : Callable
+            Called with the index entry of each observer (keys name, obsfile, obsoutfile,
+            bias_file, bias_out_file and tlapse_files)
+
+        Returns
+        -------
+        List[AttrDict]
+            Entries of the removed observers
+        """
+
+        observations = self.find('observations')
+        kept, kept_entries, dropped = [], [], []
+        for ob, entry in zip(observations['observers'], self.observers):
+            if drop(entry):
+                dropped.append(entry)
+            else:
+                kept.append(ob)
+                kept_entries.append(entry)
+
+        observations['observers'] = kept
+        self.observers = kept_entries
+
+        return dropped
+
+    def _index_keys(self, node: Dict[str, Any], path: Tuple) -> None:
+        """Record the path of the keys of node, then of its nested dictionaries in order
+        """
+
+        for key, value in node.items():
+            if value is not None and key not in self.paths:
+                self.paths[key] = path + (key,)
+        for key, value in node.items():
+            if isinstance(value, dict):
+                self._index_keys(value, path + (key,))
+
+
+def _observer_files(ob: Dict[str, Any]) -> AttrDict:
+    """Extract the name and the files read and written by an observer
+    """
+
+    obs_space = ob.get('obs space', {})
+    obs_bias = ob.get('obs bias') or {}
+    predictors = (obs_bias.get('variational bc') or {}).get('predictors') or []
+
+    return AttrDict(name=obs_space.get('name'),
+                    obsfile=_get(obs_space, 'obsdatain', 'engine', 'obsfile'),
+                    obsoutfile=_get(obs_space, 'obsdataout', 'engine', 'obsfile'),
+                    bias_file=obs_bias.get('input file'),
+                    bias_out_file=obs_bias.get('output file'),
+                    tlapse_files=[predictor['tlapse'] for predictor in predictors
+                                  if isinstance(predictor, dict) and predictor.get('tlapse')])
+
+
+def _get(node: Dict[str, Any], *keys: str) -> Optional[Any]:
+    """Return node[key0][key1]..., or None if any of the keys is missing
+    """
+
+    for key in keys:
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return node
@@ -2,8 +2,6 @@
 
 import os
 import glob
-import gzip
-import tarfile
 from logging import getLogger
 from typing import Dict, List, Any
 
@@ -17,6 +15,7 @@ from wxflow import (AttrDict,
                     Executable,
                     WorkflowException)
 from pygfs.task.analysis import Analysis
+from pygfs.utils.archive_utils import create_diag_tarball
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -135,12 +134,6 @@ class AerosolAnalysis(Analysis):
         # get list of diag files to put in tarball
         diags = glob.glob(os.path.join(self.task_config['DATA'], 'diags', 'diag*nc4'))
 
-        # gzip the files first
-        for diagfile in diags:
-            logger.info(f'Adding {diagfile} to tar file')
-            with open(diagfile, 'rb') as f_in, gzip.open(f"{diagfile}.gz", 'wb') as f_out:
-                f_out.writelines(f_in)
-
         # ---- add increments to RESTART files
         logger.info('Adding increments to RESTART files')
         self._add_fms_cube_sphere_increments()
@@ -150,11 +143,9 @@ class AerosolAnalysis(Analysis):
         aero_var_final_list = parse_j2yaml(self.task_config.AERO_FINALIZE_VARIATIONAL_TMPL, self.task_config)
         FileHandler(aero_var_final_list).sync()
 
-        # open tar file for writing
-        with tarfile.open(aerostat, "w") as archive:
-            for diagfile in diags:
-                diaggzip = f"{diagfile}.gz"
-                archive.add(diaggzip, arcname=os.path.basename(diaggzip))
+        # gzip the diag files in parallel, streaming them into the tar file
+        create_diag_tarball(aerostat, diags, nworkers=self.task_config.get('DIAG_TAR_NWORKERS', 4),
+                            spool_size=self.task_config.get('DIAG_TAR_SPOOL_MB', 16) * 1024 * 1024)
         logger.info(f'Saved diags to {aerostat}')
 
     def clean(self):
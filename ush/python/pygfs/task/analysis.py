@@ -2,16 +2,21 @@
 
 import os
 import glob
+import math
 import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from logging import getLogger
 from pprint import pformat
 from netCDF4 import Dataset
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Tuple, Callable
 
-from jcb import render
-from wxflow import (parse_j2yaml, FileHandler, rm_p, logit,
+from wxflow import (parse_j2yaml, rm_p, logit,
                     Task, Executable, WorkflowException, to_fv3time, to_YMD,
                     Template, TemplateConstants)
+from pygfs.jedi.config_cache import JediConfigCache
+from pygfs.jedi.jedi_config import JediConfig
+from pygfs.utils.stage_utils import stage_files
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -30,6 +35,9 @@ class Analysis(Task):
         self.gdasapp_j2tmpl_dir = os.path.join(self.task_config.PARMgfs, 'gdas')
         # fix ocnres
         self.task_config.OCNRES = f"{self.task_config.OCNRES :03d}"
+        # Rendered JEDI configs are cached in DATA (shared by all steps of the analysis) unless told otherwise
+        self.jedi_config_cache = JediConfigCache(self.task_config.get('JEDI_CONFIG_CACHE_DIR',
+                                                                      os.path.join(self.task_config.DATA, 'jedi_config_cache')))
 
     def initialize(self) -> None:
         super().initialize()
@@ -39,7 +47,7 @@ class Analysis(Task):
 
         # all analyses need to stage observations
         obs_dict = self.get_obs_dict()
-        FileHandler(obs_dict).sync()
+        stage_files(obs_dict)
 
         # link jedi executable to run directory
         self.link_jediexe()
@@ -77,12 +85,12 @@ class Analysis(Task):
                 jcb_config['algorithm'] = algorithm
 
             # Step 3: generate the JEDI Yaml using JCB driving YAML
-            jedi_config = render(jcb_config)
+            jedi_config = self.jedi_config_cache.render(jcb_config)
         elif 'JEDIYAML' in self.task_config.keys():
             # Generate JEDI YAML file (without using JCB)
             logger.info(f"Generate JEDI YAML config: {self.task_config.jedi_yaml}")
-            jedi_config = parse_j2yaml(self.task_config.JEDIYAML, self.task_config,
-                                       searchpath=self.gdasapp_j2tmpl_dir)
+            jedi_config = self.jedi_config_cache.parse_j2yaml(self.task_config.JEDIYAML, self.task_config,
+                                                              searchpath=self.gdasapp_j2tmpl_dir)
             logger.debug(f"JEDI config:\n{pformat(jedi_config)}")
         else:
             raise KeyError(f"Task config must contain JCB_BASE_YAML or JEDIYAML")
@@ -109,12 +117,11 @@ class Analysis(Task):
         """
 
         logger.info(f"Extracting a list of observation files from Jedi config file")
-        observations = find_value_in_nested_dict(self.task_config.jedi_config, 'observations')
-        logger.debug(f"observations:\n{pformat(observations)}")
+        jedi_config = JediConfig(self.task_config.jedi_config)
+        logger.debug(f"observations:\n{pformat(jedi_config.find('observations'))}")
 
         copylist = []
-        for ob in observations['observers']:
-            obfile = ob['obs space']['obsdatain']['engine']['obsfile']
+        for obfile in jedi_config.obs_files:
             basename = os.path.basename(obfile)
             copylist.append([os.path.join(self.task_config['COM_OBS'], basename), obfile])
         obs_dict = {
@@ -124,9 +131,15 @@ class Analysis(Task):
         return obs_dict
 
     @logit(logger)
-    def add_fv3_increments(self, inc_file_tmpl: str, bkg_file_tmpl: str, incvars: List) -> None:
+    def add_fv3_increments(self, inc_file_tmpl: str, bkg_file_tmpl: str, incvars: List,
+                           max_workers: Optional[int] = None, chunk_bytes: int = 256 * 1024 * 1024) -> None:
         """Add cubed-sphere increments to cubed-sphere backgrounds
 
+        The tiles are processed concurrently in separate processes (INCR_NWORKERS
+        of the task config, default: 1).  Within a tile, each variable is updated
+        in place a few levels at a time so that at most about chunk_bytes of
+        background and increment are held in memory per variable.
+
         Parameters
         ----------
         inc_file_tmpl : str
@@ -135,21 +148,32 @@ class Analysis(Task):
            template of the FV3 background file of the form: 'filetype.tile{tilenum}.nc'
         incvars : List
            List of increment variables to add to the background
+        max_workers : int, optional
+           Number of tiles processed concurrently (default: INCR_NWORKERS, at most ntiles)
+        chunk_bytes : int
+           Approximate size of the background slab read at once for each variable
         """
 
-        for itile in range(1, self.task_config.ntiles + 1):
-            inc_path = inc_file_tmpl.format(tilenum=itile)
-            bkg_path = bkg_file_tmpl.format(tilenum=itile)
-            with Dataset(inc_path, mode='r') as incfile, Dataset(bkg_path, mode='a') as rstfile:
-                for vname in incvars:
-                    increment = incfile.variables[vname][:]
-                    bkg = rstfile.variables[vname][:]
-                    anl = bkg + increment
-                    rstfile.variables[vname][:] = anl[:]
-                    try:
-                        rstfile.variables[vname].delncattr('checksum')  # remove the checksum so fv3 does not complain
-                    except (AttributeError, RuntimeError):
-                        pass  # checksum is missing, move on
+        ntiles = self.task_config.ntiles
+        max_workers = max(1, min(ntiles, max_workers or self.task_config.get('INCR_NWORKERS', 1)))
+
+        paths = [(inc_file_tmpl.format(tilenum=itile), bkg_file_tmpl.format(tilenum=itile))
+                 for itile in range(1, ntiles + 1)]
+
+        start = time.perf_counter()
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(add_tile_increments, inc_path, bkg_path, incvars, chunk_bytes)
+                           for inc_path, bkg_path in paths]
+                nbytes = [future.result() for future in futures]
+        else:
+            nbytes = [add_tile_increments(inc_path, bkg_path, incvars, chunk_bytes) for inc_path, bkg_path in paths]
+        elapsed = time.perf_counter() - start
+
+        total = sum(nbytes)
+        logger.info(f"Added {len(incvars)} increment variables on {ntiles} tiles: "
+                    f"{total / 1024**2:.1f} MiB in {elapsed:.2f}s "
+                    f"({total / 1024**2 / max(elapsed, 1e-9):.1f} MiB/s, {max_workers} workers)")
 
     @logit(logger)
     def link_jediexe(self) -> None:
@@ -203,72 +227,79 @@ class Analysis(Task):
                 tgz.add(diagfile, arcname=os.path.basename(diagfile))
 
 
-@logit(logger)
-def find_value_in_nested_dict(nested_dict: Dict, target_key: str) -> Any:
-    """
-    Recursively search through a nested dictionary and return the value for the target key.
-    This returns the first target key it finds.  So if a key exists in a subsequent
-    nested dictionary, it will not be found.
+def add_tile_increments(inc_path: str, bkg_path: str, incvars: List, chunk_bytes: int) -> int:
+    """Add the increments of one tile to its background in place, in level chunks
+
+    This is a module level function so that it can run in a worker process.
+    An increment may differ from its background only by leading dimensions of
+    size 1 (e.g. Time), any other shape mismatch is an error.
 
     Parameters
     ----------
-    nested_dict : Dict
-        Dictionary to search
-    target_key : str
-        Key to search for
+    inc_path : str
+        FV3 increment file for the tile
+    bkg_path : str
+        FV3 background file for the tile, updated in place
+    incvars : List
+        List of increment variables to add to the background
+    chunk_bytes : int
+        Approximate size of the background slab read at once for each variable
 
     Returns
     -------
-    Any
-        Value of the target key
+    int
+        Number of background bytes updated
 
     Raises
     ------
-    KeyError
-        If key is not found in dictionary
-
-    TODO: if this gives issues due to landing on an incorrect key in the nested
-    dictionary, we will have to implement a more concrete method to search for a key
-    given a more complete address.  See resolved conversations in PR 2387
-
-    # Example usage:
-    nested_dict = {
-        'a': {
-            'b': {
-                'c': 1,
-                'd': {
-                    'e': 2,
-                    'f': 3
-                }
-            },
-            'g': 4
-        },
-        'h': {
-            'i': 5
-        },
-        'j': {
-            'k': 6
-        }
-    }
-
-    user_key = input("Enter the key to search for: ")
-    result = find_value_in_nested_dict(nested_dict, user_key)
+    ValueError
+        If the shape of an increment does not match that of its background
     """
 
-    if not isinstance(nested_dict, dict):
-        raise TypeError(f"Input is not of type(dict)")
+    start = time.perf_counter()
+    nbytes = 0
+    with Dataset(inc_path, mode='r') as incfile, Dataset(bkg_path, mode='a') as rstfile:
+        for vname in incvars:
+            bkgvar = rstfile.variables[vname]
+            incvar = incfile.variables[vname]
+
+            # Chunk along the leading non-time dimension (levels for 3D fields, rows for 2D fields)
+            shape = bkgvar.shape
+            inc_index = _increment_index(shape, incvar.shape)
+            if inc_index is None:
+                raise ValueError(f"FATAL ERROR: increment {vname} of shape {incvar.shape} in {inc_path} "
+                                 f"does not match its background of shape {shape} in {bkg_path}")
+            axis = 1 if len(shape) > 2 else 0
+            slab_bytes = bkgvar.dtype.itemsize * math.prod(shape) // max(shape[axis], 1)
+            step = max(1, chunk_bytes // max(slab_bytes, 1))
+
+            for k in range(0, shape[axis], step):
+                index = [slice(None)] * len(shape)
+                index[axis] = slice(k, min(k + step, shape[axis]))
+                index = tuple(index)
+                bkgvar[index] = bkgvar[index] + incvar[inc_index(index)]
+
+            nbytes += bkgvar.dtype.itemsize * math.prod(shape)
+            try:
+                bkgvar.delncattr('checksum')  # remove the checksum so fv3 does not complain
+            except (AttributeError, RuntimeError):
+                pass  # checksum is missing, move on
+
+    logger.debug(f"Added increments to {bkg_path} in {time.perf_counter() - start:.2f}s")
 
-    result = nested_dict.get(target_key)
-    if result is not None:
-        return result
+    return nbytes
 
-    for value in nested_dict.values():
-        if isinstance(value, dict):
-            try:
-                result = find_value_in_nested_dict(value, target_key)
-                if result is not None:
-                    return result
-            except KeyError:
-                pass
 
-    raise KeyError(f"Key '{target_key}' not found in the nested dictionary")
+def _increment_index(bkg_shape: Tuple, inc_shape: Tuple) -> Optional[Callable]:
+    """Map an index of the background to the same values of an increment
+
+    Returns None unless both shapes are equal once their leading dimensions of size 1 are removed.
+    """
+
+    ndims = len(bkg_shape) - len(inc_shape)
+    if ndims >= 0:
+        if bkg_shape[ndims:] == inc_shape and all(size == 1 for size in bkg_shape[:ndims]):
+            return lambda index: index[ndims:]
+    elif inc_shape[-ndims:] == bkg_shape and all(size == 1 for size in inc_shape[:-ndims]):
+        return lambda index: (0,) * -ndims + index
+    return None
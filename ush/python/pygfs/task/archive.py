@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 
-import glob
+import copy
 import os
 import shutil
-import tarfile
+from functools import partial
 from logging import getLogger
 from typing import Any, Dict, List
 
+from pygfs.utils.archive_utils import (FileIndex, create_tarball, manifest_matches, manifest_path, scan_fileset,
+                                       schedule_datasets, verify_tarball, write_manifest)
+
 from wxflow import (AttrDict, FileHandler, Hsi, Htar, Task,
-                    chgrp, get_gid, logit, mkdir_p, parse_j2yaml, rm_p, strftime,
+                    chgrp, get_gid, logit, parse_j2yaml, rm_p, strftime,
                     to_YMDH)
 
 logger = getLogger(__name__.split('.')[-1])
@@ -74,9 +77,12 @@ class Archive(Task):
         # Collect the dataset to archive locally
         arcdir_j2yaml = os.path.join(archive_parm, f"{arch_dict.NET}_arcdir.yaml.j2")
 
-        # Add the glob.glob function for capturing log filenames
+        # Index of directory listings and file status shared by every dataset of this job
+        index = FileIndex()
+
+        # Add a glob function for capturing log filenames
         # TODO remove this kludge once log filenames are explicit
-        arch_dict['glob'] = glob.glob
+        arch_dict['glob'] = index.glob
 
         # Add the os.path.exists function to the dict for yaml parsing
         arch_dict['path_exists'] = os.path.exists
@@ -106,7 +112,7 @@ class Archive(Task):
             self.chmod_cmd = self.hsi.chmod
         elif arch_dict.LOCALARCH:
             self.tar_cmd = "tar"
-            self.cvf = Archive._create_tarball
+            self.cvf = partial(Archive._create_tarball, checksum=self._checksum(), index=index)
             self.chgrp_cmd = chgrp
             self.chmod_cmd = os.chmod
             self.rm_cmd = rm_p
@@ -124,8 +130,18 @@ class Archive(Task):
 
         for dataset in parsed_sets.datasets.values():
 
-            dataset["fileset"] = Archive._create_fileset(dataset)
-            dataset["has_rstprod"] = Archive._has_rstprod(dataset.fileset)
+            dataset["fileset"] = Archive._create_fileset(dataset, index)
+            dataset["has_rstprod"] = Archive._has_rstprod(dataset.fileset, index)
+
+            # Describe the members of each tarball, used to schedule the largest first
+            members = scan_fileset(dataset.fileset, index)
+            dataset["size"] = sum(size for _, size, _ in members)
+
+            # Keep the member list of the tarballs for their manifests and
+            # determine which tarballs are already up to date
+            dataset["manifest"] = members
+            dataset["up_to_date"] = (self.task_config.get("ARCH_INCREMENTAL", False) and
+                                     self._manifest_matches(dataset))
 
             atardir_sets.append(dataset)
 
@@ -167,10 +183,14 @@ class Archive(Task):
             logger.warning(f"WARNING: skipping would-be empty archive {atardir_set.target}.")
             return
 
+        if atardir_set.get("up_to_date", False):
+            logger.info(f"Skipping {atardir_set.target}, it matches its manifest.")
+            return
+
         if atardir_set.has_rstprod:
 
             try:
-                self.cvf(atardir_set.target, atardir_set.fileset)
+                report = self.cvf(atardir_set.target, atardir_set.fileset)
             # Regardless of exception type, attempt to remove the target
             except Exception:
                 self.rm_cmd(atardir_set.target)
@@ -179,11 +199,115 @@ class Archive(Task):
             self._protect_rstprod(atardir_set)
 
         else:
-            self.cvf(atardir_set.target, atardir_set.fileset)
+            report = self.cvf(atardir_set.target, atardir_set.fileset)
+
+        # Record the contents of the tarball for incremental reruns and verification
+        if "manifest" in atardir_set:
+            checksums = report.get("checksums") if self.tar_cmd == "tar" else None
+            write_manifest(atardir_set.target, atardir_set.manifest, checksums,
+                           self._checksum(), manifest_dir=self._manifest_dir())
+
+            # Check the local tarball against its manifest (ARCH_VERIFY=DEEP also compares the checksums)
+            verify = self.task_config.get("ARCH_VERIFY", True)
+            if self.tar_cmd == "tar" and verify:
+                errors = verify_tarball(atardir_set.target, deep=str(verify).upper() == "DEEP")
+                if errors:
+                    # Do not let a rerun skip the invalid tarball
+                    rm_p(manifest_path(atardir_set.target))
+                    raise RuntimeError(f"FATAL ERROR: {atardir_set.target} does not match its manifest:\n" +
+                                       "\n".join(errors))
+
+    def _checksum(self) -> str:
+        """hashlib algorithm of the member checksums of local tarballs, None if disabled
+
+        Checksums are off by default (ARCH_CHECKSUM=NONE): hashing reads every
+        file through Python instead of copying it in the kernel.
+        """
+
+        checksum = self.task_config.get("ARCH_CHECKSUM", "NONE")
+        return None if checksum in [None, "NONE", False] else checksum
+
+    def _manifest_dir(self) -> str:
+        """Directory of the manifests of the tarballs, if they are not written alongside them
+
+        The manifests of HPSS tarballs are written to ARCH_MANIFEST_DIR (default:
+        ROTDIR/archive_manifests), at the HPSS path of their tarball.
+        """
+
+        if self.tar_cmd != "htar":
+            return None
+        return self.task_config.get("ARCH_MANIFEST_DIR", os.path.join(self.task_config.ROTDIR, "archive_manifests"))
+
+    def _manifest_matches(self, atardir_set: Dict[str, Any]) -> bool:
+        """Whether the tarball of atardir_set exists and holds the files of its manifest
+        """
+
+        if self.tar_cmd == "htar":
+            return manifest_matches(atardir_set.target, atardir_set.manifest, manifest_dir=self._manifest_dir(),
+                                    target_exists=self._session().hsi.exists)
+        return manifest_matches(atardir_set.target, atardir_set.manifest)
+
+    @logit(logger)
+    def execute_backup_datasets(self, atardir_sets: List[Dict[str, Any]]) -> None:
+        """Create all backup tarballs, processing independent datasets concurrently.
+
+        Datasets are started largest first.  Local tarballs are written by
+        ARCH_NWORKERS threads.  With htar, ARCH_HTAR_SESSIONS sessions run at
+        once and each failed dataset is retried up to ARCH_HTAR_RETRIES times,
+        waiting ARCH_HTAR_BACKOFF seconds (doubled on each retry) in between.
+
+        Parameters
+        ----------
+        atardir_sets: List[Dict[str, Any]]
+            List of dicts defining the set of files to backup and the target tarball.
+
+        Return
+        ------
+        None
+        """
+
+        if self.tar_cmd == "htar":
+            nworkers = int(self.task_config.get("ARCH_HTAR_SESSIONS", 1))
+            retries = int(self.task_config.get("ARCH_HTAR_RETRIES", 0))
+            backoff = float(self.task_config.get("ARCH_HTAR_BACKOFF", 60))
+        else:
+            nworkers = int(self.task_config.get("ARCH_NWORKERS", 1))
+            retries = 0
+            backoff = 0.
+
+        logger.info(f"Creating {len(atardir_sets)} tarballs with {nworkers} {self.tar_cmd} worker(s)")
+
+        results = schedule_datasets(lambda atardir_set: self._session().execute_backup_dataset(atardir_set),
+                                    atardir_sets, nworkers=nworkers, retries=retries, backoff=backoff)
+
+        failed = [result.target for result in results if result.error is not None]
+        if failed:
+            raise RuntimeError(f"FATAL ERROR: Failed to create {len(failed)} tarball(s): {', '.join(failed)}")
+
+    def _session(self) -> "Archive":
+        """Return a copy of this task with its own hsi/htar wrappers.
+
+        Each concurrent htar transfer runs through its own Hsi and Htar instances
+        so that no executable wrapper is shared between threads.  The local tar
+        commands are stateless and are shared.
+        """
+
+        if self.tar_cmd != "htar":
+            return self
+
+        session = copy.copy(self)
+        session.hsi = Hsi()
+        session.htar = Htar()
+        session.cvf = session.htar.cvf
+        session.rm_cmd = session.hsi.rm
+        session.chgrp_cmd = session.hsi.chgrp
+        session.chmod_cmd = session.hsi.chmod
+
+        return session
 
     @staticmethod
     @logit(logger)
-    def _create_fileset(atardir_set: Dict[str, Any]) -> List:
+    def _create_fileset(atardir_set: Dict[str, Any], index: FileIndex = None) -> List:
         """
         Collect the list of all available files from the parsed yaml dict.
         Globs are expanded and if required files are missing, an error is
@@ -197,13 +321,17 @@ class Archive(Task):
         ----------
         atardir_set: Dict
             Contains full paths for required and optional files to be archived.
+
+        index: FileIndex
+            Index to expand globs from (default: a new index)
         """
 
+        index = index or FileIndex()
         fileset = []
         if "required" in atardir_set:
             if atardir_set.required is not None:
                 for item in atardir_set.required:
-                    glob_set = glob.glob(item)
+                    glob_set = index.glob(item)
                     if len(glob_set) == 0:
                         raise FileNotFoundError(f"FATAL ERROR: Required file, directory, or glob {item} not found!")
                     for entry in glob_set:
@@ -212,7 +340,7 @@ class Archive(Task):
         if "optional" in atardir_set:
             if atardir_set.optional is not None:
                 for item in atardir_set.optional:
-                    glob_set = glob.glob(item)
+                    glob_set = index.glob(item)
                     if len(glob_set) == 0:
                         logger.warning(f"WARNING: optional file/glob {item} not found!")
                     else:
@@ -223,7 +351,7 @@ class Archive(Task):
 
     @staticmethod
     @logit(logger)
-    def _has_rstprod(fileset: List) -> bool:
+    def _has_rstprod(fileset: List, index: FileIndex = None) -> bool:
         """
         Checks if any files in the input fileset belongs to rstprod.
 
@@ -231,6 +359,9 @@ class Archive(Task):
         ----------
         fileset : List
             List of filenames to check.
+
+        index: FileIndex
+            Index to expand globs and look up file status from (default: a new index)
         """
 
         try:
@@ -239,11 +370,13 @@ class Archive(Task):
             # rstprod does not exist on this machine
             return False
 
+        index = index or FileIndex()
+
         # Expand globs and check each file for group ownership
         for file_or_glob in fileset:
-            glob_set = glob.glob(file_or_glob)
+            glob_set = index.glob(file_or_glob)
             for filename in glob_set:
-                if os.stat(filename).st_gid == rstprod_gid:
+                if index.gid(filename) == rstprod_gid:
                     return True
 
         return False
@@ -272,7 +405,7 @@ class Archive(Task):
 
     @staticmethod
     @logit(logger)
-    def _create_tarball(target: str, fileset: List) -> None:
+    def _create_tarball(target: str, fileset: List, checksum: str = None, index: FileIndex = None) -> Dict[str, Any]:
         """Method to create a local tarball.
 
         Parameters
@@ -282,16 +415,22 @@ class Archive(Task):
 
         file_list : List
             List of files to add to an archive
+
+        checksum : str
+            hashlib algorithm used to checksum each member (default: None)
+
+        index : FileIndex
+            Index the members were scanned with, to size the tarball from (default: a new index)
+
+        Return
+        ------
+        report : Dict[str, Any]
+            Summary of the created tarball (see archive_utils.create_tarball)
         """
 
         # TODO create a set of tar helper functions in wxflow
-        # Attempt to create the parent directory if it does not exist
-        mkdir_p(os.path.dirname(os.path.realpath(target)))
-
-        # Create the archive
-        with tarfile.open(target, "w") as tarball:
-            for filename in fileset:
-                tarball.add(filename)
+        # Create the archive, streaming member data and reporting throughput
+        return create_tarball(target, fileset, checksum=checksum, index=index)
 
     @logit(logger)
     def _gen_relative_paths(self, root_path: str) -> Dict:
@@ -2,7 +2,6 @@
 
 import os
 import glob
-import gzip
 import tarfile
 from logging import getLogger
 from pprint import pformat
@@ -15,6 +14,8 @@ from wxflow import (AttrDict,
                     parse_j2yaml, save_as_yaml,
                     logit)
 from pygfs.jedi import Jedi
+from pygfs.utils.archive_utils import create_diag_tarball
+from pygfs.utils.stage_utils import stage_files
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -134,7 +135,7 @@ class AtmAnalysis(Task):
         # stage observations
         logger.info(f"Staging list of observation files generated from JEDI config")
         obs_dict = self.jedi.get_obs_dict(self.task_config)
-        FileHandler(obs_dict).sync()
+        stage_files(obs_dict)
         logger.debug(f"Observation files:\n{pformat(obs_dict)}")
 
         # stage bias corrections
@@ -142,7 +143,7 @@ class AtmAnalysis(Task):
         self.task_config.VarBcDir = f"{self.task_config.COM_ATMOS_ANALYSIS_PREV}"
         bias_file = f"rad_varbc_params.tar"
         bias_dict = self.jedi.get_bias_dict(self.task_config, bias_file)
-        FileHandler(bias_dict).sync()
+        stage_files(bias_dict)
         logger.debug(f"Bias correction files:\n{pformat(bias_dict)}")
 
         # extract bias corrections
@@ -243,20 +244,10 @@ class AtmAnalysis(Task):
         # get list of diag files to put in tarball
         diags = glob.glob(os.path.join(self.task_config.DATA, 'diags', 'diag*nc'))
 
-        logger.info(f"Compressing {len(diags)} diag files to {atmstat}.gz")
-
-        # gzip the files first
-        logger.debug(f"Gzipping {len(diags)} diag files")
-        for diagfile in diags:
-            with open(diagfile, 'rb') as f_in, gzip.open(f"{diagfile}.gz", 'wb') as f_out:
-                f_out.writelines(f_in)
-
-        # open tar file for writing
-        logger.debug(f"Creating tar file {atmstat} with {len(diags)} gzipped diag files")
-        with tarfile.open(atmstat, "w") as archive:
-            for diagfile in diags:
-                diaggzip = f"{diagfile}.gz"
-                archive.add(diaggzip, arcname=os.path.basename(diaggzip))
+        # gzip the files in parallel, streaming them into the tar file
+        logger.info(f"Compressing {len(diags)} diag files to {atmstat}")
+        create_diag_tarball(atmstat, diags, nworkers=self.task_config.get('DIAG_TAR_NWORKERS', 4),
+                            spool_size=self.task_config.get('DIAG_TAR_SPOOL_MB', 16) * 1024 * 1024)
 
         # get list of yamls to copy to ROTDIR
         yamls = glob.glob(os.path.join(self.task_config.DATA, '*atm*yaml'))
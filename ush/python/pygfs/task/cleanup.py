@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Any, Dict, List
+
+from pygfs.utils.cleanup_utils import prune_trees
+from pygfs.utils.file_utils import fmt_bytes
+from wxflow import (AttrDict, Task, Template, TemplateConstants, logit,
+                    strftime, to_datetime, to_YMD, to_YMDH)
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Tables and columns of the Rocoto database read to find the cycles that succeeded
+ROCOTO_SCHEMA = {
+    'cycles': {'cycle', 'done'},
+    'jobs': {'cycle', 'state'},
+}
+
+# Last line of the Rocoto log of a cycle that completed successfully
+ROCOTO_LOG_SUCCESS = "This cycle is complete: Success"
+
+
+class Cleanup(Task):
+    """Task to remove the data of past cycles from ROTDIR and the working directories
+    """
+
+    @logit(logger, name="Cleanup")
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Constructor for the Cleanup task
+        The constructor is responsible for collecting the settings of the retention
+        policy (RMOLDSTD, RMOLDEND, RMOLDRTOFS and exclude_string).
+
+        Parameters
+        ----------
+        config : Dict[str, Any]
+            Incoming configuration for the task from the environment
+
+        Returns
+        -------
+        None
+        """
+        super().__init__(config)
+
+        # Patterns are separated by commas and/or spaces
+        exclude = self.task_config.get('exclude_string', '')
+        if isinstance(exclude, str):
+            exclude = [exclude]
+        exclude = ' '.join(str(pattern) for pattern in exclude).replace(',', ' ').split()
+
+        # CDATE_MOS is already cast to a datetime from the environment
+        cdate_mos = self.task_config.get('CDATE_MOS', None)
+        if cdate_mos in (None, ''):
+            cdate_mos = None
+        elif not isinstance(cdate_mos, datetime):
+            cdate_mos = to_datetime(str(cdate_mos))
+
+        local_dict = AttrDict(
+            {
+                'cleanup_com': self.task_config.get('CLEANUP_COM', True),
+                'dry_run': self.task_config.get('CLEANUP_DRY_RUN', False),
+                'nthreads': int(self.task_config.get('CLEANUP_NTHREADS', 1)),
+                'exclude': exclude,
+                'first_cycle': self.task_config.current_cycle - timedelta(hours=self.task_config.get('RMOLDSTD', 120)),
+                'last_cycle': self.task_config.current_cycle - timedelta(hours=self.task_config.get('RMOLDEND', 24)),
+                'last_rtofs': self.task_config.current_cycle - timedelta(hours=self.task_config.get('RMOLDRTOFS', 48)),
+                'cdate_mos': cdate_mos,
+                'rocoto_db': os.path.join(self.task_config.EXPDIR, f"{self.task_config.PSLOT}.db"),
+            }
+        )
+
+        # Extend task_config with local_dict
+        self.task_config = AttrDict(**self.task_config, **local_dict)
+
+    @logit(logger)
+    def get_cycle_status(self) -> Dict[datetime, bool]:
+        """Determine which of the cycles to clean up completed successfully.
+
+        The status is read from the Rocoto database of the experiment: a cycle succeeded
+        if it is done and none of its jobs is dead.  Without a readable Rocoto database,
+        the last line of the Rocoto log of each cycle is checked instead.
+
+        Returns
+        -------
+        Dict[datetime, bool]
+            Whether each cycle from first_cycle to last_cycle succeeded
+        """
+
+        cycles = []
+        cycle = self.task_config.first_cycle
+        while cycle <= self.task_config.last_cycle:
+            cycles.append(cycle)
+            cycle += timedelta(hours=self.task_config.assim_freq)
+
+        try:
+            succeeded = self._read_rocoto_db(self.task_config.rocoto_db, cycles[0], cycles[-1]) if cycles else set()
+        except (sqlite3.Error, ValueError) as err:
+            logger.warning(f"WARNING: Unable to read the Rocoto database {self.task_config.rocoto_db} ({err}), "
+                           "reading the status of the cycles from the Rocoto logs")
+            return {cycle: self._rocoto_log_success(os.path.join(self.task_config.EXPDIR, 'logs', f"{to_YMDH(cycle)}.log"))
+                    for cycle in cycles}
+
+        return {cycle: cycle in succeeded for cycle in cycles}
+
+    @staticmethod
+    def _read_rocoto_db(database_file: str, first_cycle: datetime, last_cycle: datetime) -> set:
+        """Cycles between first_cycle and last_cycle that are done without dead jobs
+        """
+
+        if not os.path.isfile(database_file):
+            raise ValueError("no such file")
+
+        with closing(sqlite3.connect(f"file:{os.path.abspath(database_file)}?mode=ro", uri=True, timeout=60)) as connection:
+            missing = []
+            for table, columns in ROCOTO_SCHEMA.items():
+                table_columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                missing.extend(f"{table}.{column}" for column in sorted(columns - table_columns))
+            if missing:
+                raise ValueError(f"unknown Rocoto database schema, missing {', '.join(missing)}")
+
+            # Rocoto stores cycles as seconds since the epoch
+            rows = connection.execute(
+                "SELECT cycle FROM cycles WHERE cycle BETWEEN ? AND ? AND COALESCE(done, 0) > 0 "
+                "AND NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.cycle = cycles.cycle AND jobs.state = 'DEAD')",
+                (int(first_cycle.replace(tzinfo=timezone.utc).timestamp()),
+                 int(last_cycle.replace(tzinfo=timezone.utc).timestamp()))).fetchall()
+
+        return {datetime.fromtimestamp(cycle, tz=timezone.utc).replace(tzinfo=None) for (cycle,) in rows}
+
+    @staticmethod
+    def _rocoto_log_success(logfile: str) -> bool:
+        """Whether the last line of a Rocoto log reports the cycle completed successfully
+        """
+
+        try:
+            with open(logfile, 'rb') as fh:
+                fh.seek(0, os.SEEK_END)
+                fh.seek(max(0, fh.tell() - 4096))
+                lines = fh.read().decode(errors='replace').splitlines()
+        except FileNotFoundError:
+            return False
+        return bool(lines) and ROCOTO_LOG_SUCCESS in lines[-1]
+
+    @logit(logger)
+    def retention_policy(self, cycle_status: Dict[datetime, bool]) -> List[AttrDict]:
+        """Build the list of directories to prune.
+
+        Each target has the `path` to prune, the file name patterns to `exclude` from
+        the removal (none removes the path entirely) and the `reason` of the removal.
+
+        Parameters
+        ----------
+        cycle_status : Dict[datetime, bool]
+            Whether each of the cycles to clean up succeeded
+
+        Returns
+        -------
+        List[AttrDict]
+            Targets to prune
+        """
+
+        config = self.task_config
+        cycle = config.current_cycle
+
+        # Output of the forecast model runs of this cycle
+        targets = [AttrDict(path=path, exclude=[], reason="forecast run directory")
+                   for path in [os.path.join(config.DATAROOT, f"{config.RUN}fcst.{to_YMDH(cycle)}")] +
+                   sorted(glob.glob(os.path.join(config.DATAROOT, f"{config.RUN}efcs*{to_YMDH(cycle)}")))]
+
+        if not config.cleanup_com:
+            return targets
+
+        # COM directories of the successful cycles, except for the files kept for Fit2Obs
+        for past_cycle, succeeded in cycle_status.items():
+            if succeeded:
+                tmpl_dict = {'ROTDIR': config.ROTDIR, 'RUN': config.RUN,
+                             'YMD': to_YMD(past_cycle), 'HH': strftime(past_cycle, '%H')}
+                com_top = Template.substitute_structure(config.COM_TOP_TMPL, TemplateConstants.DOLLAR_CURLY_BRACE, tmpl_dict.get)
+                targets.append(AttrDict(path=com_top, exclude=config.exclude, reason=f"cycle {to_YMDH(past_cycle)} succeeded"))
+                if past_cycle < config.last_rtofs:
+                    targets.append(AttrDict(path=os.path.join(config.ROTDIR, f"rtofs.{to_YMD(past_cycle)}"), exclude=[],
+                                            reason=f"RTOFS older than {to_YMDH(config.last_rtofs)}"))
+
+            if config.RUN == 'gfs' and config.cdate_mos is not None and past_cycle < config.cdate_mos:
+                targets.append(AttrDict(path=os.path.join(config.ROTDIR, f"gfsmos.{to_YMD(past_cycle)}"), exclude=[],
+                                        reason=f"MOS older than {to_YMDH(config.cdate_mos)}"))
+
+        # Archived gaussian files used for Fit2Obs, FHMAX_FITS plus a delta before this cycle
+        if config.RUN == 'gfs':
+            verify_cycle = cycle - timedelta(hours=config.FHMAX_FITS + 36)
+            targets.append(AttrDict(path=os.path.join(config.ROTDIR, 'vrfyarch', f"{config.RUN}.{to_YMD(verify_cycle)}"),
+                                    exclude=[], reason="Fit2Obs files no longer needed"))
+
+        # RUN directory of the older of RMOLDSTD and FHMAX_GFS hours before this cycle
+        run_cycle = min(config.first_cycle, cycle - timedelta(hours=config.FHMAX_GFS))
+        targets.append(AttrDict(path=os.path.join(config.ROTDIR, f"{config.RUN}.{to_YMD(run_cycle)}"), exclude=[],
+                                reason=f"older than {to_YMDH(run_cycle)}"))
+
+        # DATAROOT, which holds the working directory of this job, is removed last.
+        # Cleanup only runs after the entire cycle completed, so nothing else needs it.
+        targets.append(AttrDict(path=config.DATAROOT, exclude=[], reason="working directory of this cycle"))
+
+        # Removing a directory entirely covers the targets below it
+        removed = [target.path for target in targets if not target.exclude]
+        unique_targets = []
+        for target in targets:
+            if target.path in [unique.path for unique in unique_targets]:
+                continue
+            if any(target.path != path and os.path.commonpath([target.path, path]) == path for path in removed):
+                continue
+            unique_targets.append(target)
+
+        return unique_targets
+
+    @logit(logger)
+    def touch_fits_files(self) -> None:
+        """Touch the archived gaussian files still needed by Fit2Obs.
+
+        This prevents the automatic scrubbers present on some machines from removing them.
+
+        Returns
+        -------
+        None
+        """
+
+        cycle = self.task_config.current_cycle - timedelta(hours=self.task_config.FHMAX_FITS)
+        while cycle < self.task_config.current_cycle:
+            touch_dir = os.path.join(self.task_config.ROTDIR, 'vrfyarch', f"{self.task_config.RUN}.{to_YMD(cycle)}",
+                                     strftime(cycle, '%H'))
+            for path in glob.glob(os.path.join(touch_dir, '*')):
+                os.utime(path)
+            cycle += timedelta(hours=6)
+
+    @logit(logger)
+    def execute(self) -> None:
+        """Clean up the past cycles, then the working directory of this cycle.
+
+        With CLEANUP_DRY_RUN, nothing is removed and the files, inodes and bytes that
+        would be freed are only reported.
+
+        Returns
+        -------
+        None
+        """
+
+        dry_run = self.task_config.dry_run
+
+        cycle_status = self.get_cycle_status() if self.task_config.cleanup_com else {}
+        targets = self.retention_policy(cycle_status)
+        final_targets = [target for target in targets if target.path == self.task_config.DATAROOT]
+        targets = [target for target in targets if target.path != self.task_config.DATAROOT]
+        stats = prune_trees(targets, dry_run=dry_run, nworkers=self.task_config.nthreads)
+
+        if self.task_config.RUN == 'gfs' and self.task_config.cleanup_com and not dry_run:
+            self.touch_fits_files()
+
+        if final_targets:
+            # sync and wait to avoid filesystem synchronization issues
+            if not dry_run:
+                os.sync()
+                time.sleep(1)
+            targets.extend(final_targets)
+            stats.extend(prune_trees(final_targets, dry_run=dry_run, nworkers=self.task_config.nthreads))
+
+        self.report(targets, stats, dry_run=dry_run)
+
+    @logit(logger)
+    def report(self, targets: List[Dict[str, Any]], stats: List[Dict[str, Any]], dry_run: bool = False) -> None:
+        """Log the files, inodes and bytes freed (or that would be freed) for each target
+
+        Parameters
+        ----------
+        targets : List[Dict[str, Any]]
+            Pruned targets
+        stats : List[Dict[str, Any]]
+            Statistics of each target as returned by prune_trees
+        dry_run : bool
+            Whether nothing was actually removed
+
+        Returns
+        -------
+        None
+        """
+
+        verb = "Would free" if dry_run else "Freed"
+        for target, stat in zip(targets, stats):
+            if stat.inodes > 0:
+                logger.info(f"{verb} {stat.inodes} inodes ({stat.files} files, {stat.dirs} directories), "
+                            f"{fmt_bytes(stat.nbytes)} in {target.path} ({target.reason})")
+        logger.info(f"{verb} a total of {sum(stat.inodes for stat in stats)} inodes and "
+                    f"{fmt_bytes(sum(stat.nbytes for stat in stats))} from {len(targets)} targets")
@@ -17,6 +17,7 @@ from wxflow import (AttrDict,
                     Executable,
                     WorkflowException)
 from pygfs.task.analysis import Analysis
+from pygfs.utils.tile_utils import run_tile_tasks
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -441,20 +442,13 @@ class SnowAnalysis(Analysis):
         sign = [1, -1]
         ens_dirs = ['mem001', 'mem002']
 
+        # perturb every member and tile concurrently
+        tasks = {}
         for (memchar, value) in zip(ens_dirs, sign):
-            logger.debug(f"creating ensemble member {memchar} with sign {value}")
             for tt in range(1, config.ntiles + 1):
-                logger.debug(f"perturbing tile {tt}")
-                # open file
                 out_netcdf = os.path.join(workdir, memchar, 'RESTART', f"{to_fv3time(config.current_cycle)}.sfc_data.tile{tt}.nc")
-                logger.debug(f"creating member {out_netcdf}")
-                with Dataset(out_netcdf, "r+") as ncOut:
-                    slmsk_array = ncOut.variables['slmsk'][:]
-                    vtype_array = ncOut.variables['vtype'][:]
-                    slmsk_array[vtype_array == 15] = 0  # remove glacier locations
-                    var_array = ncOut.variables[vname][:]
-                    var_array[slmsk_array == 1] = var_array[slmsk_array == 1] + value * offset
-                    ncOut.variables[vname][0, :, :] = var_array[:]
+                tasks[f"{memchar} tile{tt}"] = (out_netcdf, vname, value * offset)
+        run_tile_tasks(perturb_tile, tasks)
 
     @staticmethod
     @logit(logger)
@@ -553,3 +547,25 @@ class SnowAnalysis(Analysis):
                 raise OSError(f"Failed to execute {exe}")
             except Exception:
                 raise WorkflowException(f"An error occured during execution of {exe}")
+
+
+def perturb_tile(out_netcdf: str, vname: str, delta: float) -> None:
+    """Offset the snow depth of one ensemble member tile over land, excluding glaciers
+
+    Parameters
+    ----------
+    out_netcdf : str
+        sfc_data tile file of the member (a copy in DATA), updated in place
+    vname : str
+        snow depth variable to perturb
+    delta : float
+        offset added to vname over non-glacier land points
+    """
+
+    with Dataset(out_netcdf, "r+") as ncOut:
+        slmsk_array = ncOut.variables['slmsk'][:]
+        vtype_array = ncOut.variables['vtype'][:]
+        slmsk_array[vtype_array == 15] = 0  # remove glacier locations
+        var_array = ncOut.variables[vname][:]
+        var_array[slmsk_array == 1] = var_array[slmsk_array == 1] + delta
+        ncOut.variables[vname][0, :, :] = var_array[:]
@@ -16,6 +16,7 @@ from wxflow import (AttrDict,
                     Executable,
                     WorkflowException)
 from pygfs.task.analysis import Analysis
+from pygfs.utils.tile_utils import atomic_output, run_tile_tasks
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -109,28 +110,15 @@ class SnowEnsAnalysis(Analysis):
 
         chdir(self.task_config.DATA)
 
-        # loop through tiles
+        # process all tiles concurrently
+        case_int = int(self.task_config.CASE[1:])
+        tasks = {}
         for tile in range(1, self.task_config.ntiles + 1):
-            # open the restart and get the vegetation type
-            rst = nc.Dataset(f"./bkg/det/{to_fv3time(self.task_config.bkg_time)}.sfc_data.tile{tile}.nc")
-            vtype = rst.variables['vtype'][:]
-            rst.close()
-            # open the oro data and get the land fraction
-            oro = nc.Dataset(f"./orog/det/{self.task_config.CASE}.mx{self.task_config.OCNRES}_oro_data.tile{tile}.nc")
-            land_frac = oro.variables['land_frac'][:]
-            oro.close()
-            # create an output file
-            ncfile = nc.Dataset(f"./orog/det/{self.task_config.CASE}.mx{self.task_config.OCNRES}_interp_weight.tile{tile}.nc", mode='w', format='NETCDF4')
-            case_int = int(self.task_config.CASE[1:])
-            lon = ncfile.createDimension('lon', case_int)
-            lat = ncfile.createDimension('lat', case_int)
-            lsm_frac_out = ncfile.createVariable('lsm_frac', np.float32, ('lon', 'lat'))
-            # set the land fraction to 0 on glaciers to not interpolate that snow
-            glacier = 15
-            land_frac[np.where(vtype[0, ...] == glacier)] = 0
-            lsm_frac_out[:] = land_frac
-            # write out and close the file
-            ncfile.close()
+            rst_path = f"./bkg/det/{to_fv3time(self.task_config.bkg_time)}.sfc_data.tile{tile}.nc"
+            oro_path = f"./orog/det/{self.task_config.CASE}.mx{self.task_config.OCNRES}_oro_data.tile{tile}.nc"
+            out_path = f"./orog/det/{self.task_config.CASE}.mx{self.task_config.OCNRES}_interp_weight.tile{tile}.nc"
+            tasks[f"tile{tile}"] = (rst_path, oro_path, out_path, case_int)
+        run_tile_tasks(gen_weights_tile, tasks)
 
     @logit(logger)
     def genMask(self) -> None:
@@ -145,19 +133,10 @@ class SnowEnsAnalysis(Analysis):
 
         chdir(self.task_config.DATA)
 
-        # loop through tiles
-        for tile in range(1, self.task_config.ntiles + 1):
-            # open the restart and get the vegetation type
-            rst = nc.Dataset(f"./bkg/mem001/{to_fv3time(self.task_config.bkg_time)}.sfc_data.tile{tile}.nc", mode="r+")
-            vtype = rst.variables['vtype'][:]
-            slmsk = rst.variables['slmsk'][:]
-            # slmsk(Time, yaxis_1, xaxis_1)
-            # set the mask to 3 on glaciers
-            glacier = 15
-            slmsk[np.where(vtype == glacier)] = 3
-            # write out and close the file
-            rst.variables['slmsk'][:] = slmsk
-            rst.close()
+        # process all tiles concurrently
+        tasks = {f"tile{tile}": (f"./bkg/mem001/{to_fv3time(self.task_config.bkg_time)}.sfc_data.tile{tile}.nc",)
+                 for tile in range(1, self.task_config.ntiles + 1)}
+        run_tile_tasks(gen_mask_tile, tasks)
 
     @logit(logger)
     def regridDetBkg(self) -> None:
@@ -428,3 +407,55 @@ class SnowEnsAnalysis(Analysis):
             'copy': [],
         }
         return bias_dict
+
+
+def gen_weights_tile(rst_path: str, oro_path: str, out_path: str, case_int: int) -> None:
+    """Write the fregrid land fraction weights of one tile, with glaciers removed
+
+    Parameters
+    ----------
+    rst_path : str
+        sfc_data tile file to read the vegetation type from
+    oro_path : str
+        orography tile file to read the land fraction from
+    out_path : str
+        interpolation weight file to create
+    case_int : int
+        number of grid points along each tile edge
+    """
+
+    # get the vegetation type and the land fraction
+    with nc.Dataset(rst_path) as rst:
+        vtype = rst.variables['vtype'][0, ...]
+    with nc.Dataset(oro_path) as oro:
+        land_frac = oro.variables['land_frac'][:]
+
+    # set the land fraction to 0 on glaciers to not interpolate that snow
+    glacier = 15
+    land_frac[np.where(vtype == glacier)] = 0
+
+    # create the output file
+    with atomic_output(out_path) as tmp_path, nc.Dataset(tmp_path, mode='w', format='NETCDF4') as ncfile:
+        ncfile.createDimension('lon', case_int)
+        ncfile.createDimension('lat', case_int)
+        lsm_frac_out = ncfile.createVariable('lsm_frac', np.float32, ('lon', 'lat'))
+        lsm_frac_out[:] = land_frac
+
+
+def gen_mask_tile(rst_path: str) -> None:
+    """Set the land-sea mask of one tile to 3 on glaciers
+
+    Parameters
+    ----------
+    rst_path : str
+        sfc_data tile file (a copy in DATA), updated in place
+    """
+
+    with nc.Dataset(rst_path, mode="r+") as rst:
+        vtype = rst.variables['vtype'][:]
+        slmsk = rst.variables['slmsk'][:]
+        # slmsk(Time, yaxis_1, xaxis_1)
+        # set the mask to 3 on glaciers
+        glacier = 15
+        slmsk[np.where(vtype == glacier)] = 3
+        rst.variables['slmsk'][:] = slmsk
@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+
+import fnmatch
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from stat import S_ISDIR, S_ISLNK, S_ISREG
+from typing import Any, Callable, Dict, List
+
+from pygfs.utils.file_utils import copy_fd, fmt_bytes
+from wxflow import AttrDict, logit, mkdir_p
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Size of each kernel-side copy when streaming file contents into a tarball.
+# Kept a multiple of the tar block size and of typical parallel filesystem stripes.
+ARCHIVE_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Minimum number of seconds between progress reports for a single tarball
+ARCHIVE_REPORT_INTERVAL = 60.
+
+# Checksum algorithm (from hashlib) recorded in tarball manifests
+MANIFEST_CHECKSUM = "sha256"
+
+# Version of the manifest layout, bumped on incompatible changes
+MANIFEST_VERSION = 1
+
+# Default number of threads compressing diag files for a stat tarball
+DIAG_NWORKERS = 4
+
+# Compressed diag files up to this size are held in memory before being added
+# to a stat tarball; larger ones spill to a temporary file
+DIAG_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+@logit(logger)
+def create_tarball(target: str, fileset: List, chunk_size: int = ARCHIVE_CHUNK_SIZE,
+                   report_interval: float = ARCHIVE_REPORT_INTERVAL, checksum: str = None,
+                   index: "FileIndex" = None) -> AttrDict:
+    """Create a local (uncompressed) tarball, streaming member contents in large chunks.
+
+    The members written are identical to those produced by adding each entry
+    of the fileset with `tarfile.TarFile.add`: directories are recursed into in
+    sorted order, hard links are stored as links and leading slashes are removed
+    from the member names.  File contents are copied in the kernel with
+    copy_file_range or sendfile where the platform allows it.  When a checksum
+    is requested, contents are instead read once through Python so that each
+    member can be hashed while it is written.
+
+    Parameters
+    ----------
+    target : str
+        Tarball to create
+    fileset : List
+        List of files and directories to add to the archive
+    chunk_size : int
+        Number of bytes to copy per system call
+    report_interval : float
+        Minimum number of seconds between progress messages
+    checksum : str
+        Name of a hashlib algorithm used to checksum each regular file (default: None)
+    index : FileIndex
+        Index the total size of fileset (for progress reports) is taken from (default: a new index)
+
+    Returns
+    -------
+    report : AttrDict
+        Summary of the tarball with keys target, members, bytes, elapsed and rate (bytes/s).
+        If a checksum was requested, the key checksums maps member names to hex digests.
+    """
+
+    # Attempt to create the parent directory if it does not exist
+    mkdir_p(os.path.dirname(os.path.realpath(target)))
+
+    progress = AttrDict(target=target,
+                        total=sum(size for _, size, _ in scan_fileset(fileset, index)),
+                        done=0,
+                        start=time.monotonic(),
+                        last=time.monotonic(),
+                        interval=report_interval,
+                        checksum=checksum,
+                        checksums={})
+
+    with tarfile.open(target, "w") as tarball:
+        for filename in fileset:
+            _add_member(tarball, filename, chunk_size, progress)
+        nmembers = len(tarball.members)
+
+    elapsed = time.monotonic() - progress.start
+    report = AttrDict(target=target,
+                      members=nmembers,
+                      bytes=progress.done,
+                      elapsed=elapsed,
+                      rate=progress.done / elapsed if elapsed > 0 else 0.)
+    if checksum is not None:
+        report.checksums = progress.checksums
+
+    logger.info(f"Created {target}: {nmembers} members, {fmt_bytes(report.bytes)} "
+                f"in {elapsed:.1f}s ({fmt_bytes(report.rate)}/s)")
+
+    return report
+
+
+def _add_member(tarball: tarfile.TarFile, name: str, chunk_size: int, progress: AttrDict) -> None:
+    """Add a file or directory tree to an open tarball, mirroring `TarFile.add`
+    """
+
+    # Never add the tarball to itself
+    if tarball.name is not None and os.path.abspath(name) == tarball.name:
+        logger.debug(f"Skipping tarball {name} in its own member list")
+        return
+
+    tarinfo = tarball.gettarinfo(name)
+    if tarinfo is None:
+        logger.warning(f"WARNING: unsupported file type {name}, not archiving")
+        return
+
+    if tarinfo.isreg():
+        hasher = hashlib.new(progress.checksum) if progress.checksum else None
+        with open(name, "rb") as fh:
+            _add_regular(tarball, tarinfo, fh.fileno(), chunk_size, hasher)
+        if hasher is not None:
+            progress.checksums[tarinfo.name] = hasher.hexdigest()
+        progress.done += tarinfo.size
+        _report_progress(progress)
+    elif tarinfo.isdir():
+        tarball.addfile(tarinfo)
+        for child in sorted(os.listdir(name)):
+            _add_member(tarball, os.path.join(name, child), chunk_size, progress)
+    else:
+        tarball.addfile(tarinfo)
+
+
+def _add_regular(tarball: tarfile.TarFile, tarinfo: tarfile.TarInfo, src_fd: int, chunk_size: int,
+                 hasher: Any = None) -> None:
+    """Write the header and contents of a regular file into the tarball
+
+    This is the equivalent of `TarFile.addfile(tarinfo, fileobj)` except that the
+    data is copied between file descriptors instead of through Python buffers.
+    """
+
+    if tarball.closed or tarball.mode not in ("a", "w", "x"):
+        raise OSError(f"FATAL ERROR: {tarball.name} is not open for writing")
+
+    buf = tarinfo.tobuf(tarball.format, tarball.encoding, tarball.errors)
+    tarball.fileobj.write(buf)
+    tarball.offset += len(buf)
+
+    # Hand the remaining data over to the kernel from the current position
+    tarball.fileobj.flush()
+    dst_fd = tarball.fileobj.fileno()
+    os.lseek(dst_fd, tarball.offset, os.SEEK_SET)
+    if hasher is None:
+        copy_fd(src_fd, dst_fd, tarinfo.size, chunk_size)
+    else:
+        _copy_fd_hashed(src_fd, dst_fd, tarinfo.size, chunk_size, hasher)
+    tarball.fileobj.seek(0, os.SEEK_END)
+
+    blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+    if remainder > 0:
+        tarball.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        blocks += 1
+    tarball.offset += blocks * tarfile.BLOCKSIZE
+
+    tarball.members.append(tarinfo)
+
+
+def _copy_fd_hashed(src_fd: int, dst_fd: int, nbytes: int, chunk_size: int, hasher: Any) -> None:
+    """Copy exactly nbytes from src_fd to dst_fd, updating hasher with the data
+    """
+
+    buf = bytearray(min(chunk_size, max(nbytes, 1)))
+    view = memoryview(buf)
+    remaining = nbytes
+    with open(src_fd, "rb", buffering=0, closefd=False) as src:
+        while remaining > 0:
+            count = src.readinto(view[:min(len(buf), remaining)])
+            if not count:
+                raise OSError(f"FATAL ERROR: unexpected end of data, {remaining} bytes missing")
+            hasher.update(view[:count])
+            written = 0
+            while written < count:
+                written += os.write(dst_fd, view[written:count])
+            remaining -= count
+
+
+class FileIndex:
+    """Cache of directory listings and file status for the files being archived.
+
+    Each directory is listed at most once and each path is lstat'ed at most
+    once per index, so that glob expansion, rstprod detection, manifest
+    generation and tarball sizes for every dataset of an archive job share
+    the same metadata requests.  Paths are interpreted like `glob.glob` and
+    `os.lstat` would, i.e. relative paths are relative to the current working
+    directory.
+    """
+
+    def __init__(self) -> None:
+        self._listings = {}
+        self._entries = {}
+
+    def listdir(self, path: str) -> Dict[str, bool]:
+        """Names in directory path mapped to whether they are (or link to) directories
+        """
+
+        path = path or os.curdir
+        if path not in self._listings:
+            listing = {}
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            listing[entry.name] = entry.is_dir()
+                        except OSError:
+                            listing[entry.name] = False
+            except OSError:
+                listing = None
+            self._listings[path] = listing
+        return self._listings[path] or {}
+
+    def lexists(self, path: str) -> bool:
+        """Whether path exists (including broken symbolic links)
+        """
+
+        parent, name = os.path.split(path.rstrip(os.sep) or path)
+        if name in ("", os.curdir, os.pardir):
+            return os.path.lexists(path)
+        return name in self.listdir(parent)
+
+    def isdir(self, path: str) -> bool:
+        """Whether path is a directory or a link to one
+        """
+
+        parent, name = os.path.split(path.rstrip(os.sep) or path)
+        if name in ("", os.curdir, os.pardir):
+            return os.path.isdir(path)
+        return self.listdir(parent).get(name, False)
+
+    def entry(self, path: str) -> AttrDict:
+        """Mode, size, gid and mtime of path from os.lstat (symbolic links are not followed), cached
+        """
+
+        if path not in self._entries:
+            stat = os.lstat(path)
+            self._entries[path] = AttrDict(mode=stat.st_mode, size=stat.st_size,
+                                           gid=stat.st_gid, mtime=stat.st_mtime)
+        return self._entries[path]
+
+    def gid(self, path: str) -> int:
+        """Group of path, following symbolic links as os.stat(path).st_gid
+        """
+
+        entry = self.entry(path)
+        if S_ISLNK(entry.mode):
+            return self.entry(os.path.realpath(path)).gid
+        return entry.gid
+
+    def glob(self, pattern: str) -> List[str]:
+        """Expand a glob pattern from the cached listings, like `glob.glob(pattern)`
+        """
+
+        if not glob.has_magic(pattern):
+            if pattern.endswith(os.sep):
+                return [pattern] if self.isdir(pattern) else []
+            return [pattern] if self.lexists(pattern) else []
+
+        dirname, basename = os.path.split(pattern)
+        if not dirname:
+            dirs = [""]
+        elif dirname != pattern and glob.has_magic(dirname):
+            dirs = [d for d in self.glob(dirname) if self.isdir(d)]
+        else:
+            dirs = [dirname] if self.isdir(dirname) else []
+
+        matches = []
+        for directory in dirs:
+            if glob.has_magic(basename):
+                names = fnmatch.filter(self.listdir(directory), basename)
+                # As with glob.glob, wildcards do not match hidden files
+                if not basename.startswith("."):
+                    names = [name for name in names if not name.startswith(".")]
+            elif basename == "":
+                names = [""]
+            else:
+                names = [basename] if basename in self.listdir(directory) else []
+            matches.extend(os.path.join(directory, name) for name in sorted(names))
+
+        return matches
+
+
+def _report_progress(progress: AttrDict) -> None:
+    """Log the throughput and estimated time remaining for a tarball in progress
+    """
+
+    now = time.monotonic()
+    if now - progress.last < progress.interval:
+        return
+    progress.last = now
+
+    elapsed = now - progress.start
+    rate = progress.done / elapsed if elapsed > 0 else 0.
+    percent = 100. * progress.done / progress.total if progress.total > 0 else 100.
+    eta = (progress.total - progress.done) / rate if rate > 0 else float("inf")
+
+    logger.info(f"{progress.target}: {fmt_bytes(progress.done)} of {fmt_bytes(progress.total)} "
+                f"({percent:.1f}%), {fmt_bytes(rate)}/s, ETA {eta:.0f}s")
+
+
+@logit(logger)
+def scan_fileset(fileset: List, index: FileIndex = None) -> List[List]:
+    """Describe the members a tarball of fileset would contain without creating it.
+
+    Parameters
+    ----------
+    fileset : List
+        List of files and directories to be archived
+    index : FileIndex
+        Index to answer listing and status requests from (default: a new index)
+
+    Returns
+    -------
+    entries : List[List]
+        [name, size, mtime] for each member, in archive order.  Names follow the
+        tar member naming (no leading slash), size is 0 for non-regular files.
+    """
+
+    index = index or FileIndex()
+    entries = []
+
+    def _scan(name):
+        entry = index.entry(name)
+        arcname = name.replace(os.sep, "/").lstrip("/")
+        if S_ISDIR(entry.mode):
+            entries.append([arcname, 0, int(entry.mtime)])
+            for child in sorted(index.listdir(name)):
+                _scan(os.path.join(name, child))
+        else:
+            size = entry.size if S_ISREG(entry.mode) else 0
+            entries.append([arcname, size, int(entry.mtime)])
+
+    for filename in fileset:
+        _scan(filename)
+
+    return entries
+
+
+def manifest_path(target: str, manifest_dir: str = None) -> str:
+    """Path of the manifest of a tarball
+
+    The manifest of a local tarball is written alongside it.  The manifest of a
+    remote (HPSS) tarball is written below manifest_dir, at the path of the tarball.
+    """
+    if manifest_dir is None:
+        return f"{target}.manifest.json"
+    return os.path.join(manifest_dir, f"{target.lstrip(os.sep)}.manifest.json")
+
+
+@logit(logger)
+def write_manifest(target: str, entries: List[List], checksums: Dict[str, str] = None,
+                   checksum: str = MANIFEST_CHECKSUM, manifest_dir: str = None) -> str:
+    """Write the manifest of a tarball.
+
+    Parameters
+    ----------
+    target : str
+        Tarball the manifest describes
+    entries : List[List]
+        [name, size, mtime] of each member, as returned by scan_fileset
+    checksums : Dict[str, str]
+        Hex digest of each regular member keyed by member name (default: None)
+    checksum : str
+        hashlib algorithm used to produce the checksums
+    manifest_dir : str
+        Directory of the manifests of remote (HPSS) tarballs, whose size is not
+        recorded (default: None, a local tarball with its manifest alongside)
+
+    Returns
+    -------
+    manifest : str
+        Path to the manifest file
+    """
+
+    checksums = checksums or {}
+    manifest = {"version": MANIFEST_VERSION,
+                "target": os.path.basename(target),
+                "tarball_size": os.path.getsize(target) if manifest_dir is None else None,
+                "checksum": checksum,
+                "members": [{"name": name, "size": size, "mtime": mtime,
+                             "hash": checksums.get(name)} for name, size, mtime in entries]}
+
+    # Write to a temporary file first so that a partial manifest is never left behind
+    path = manifest_path(target, manifest_dir)
+    mkdir_p(os.path.dirname(path))
+    with open(f"{path}.tmp", "w") as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+    return path
+
+
+def read_manifest(target: str, manifest_dir: str = None) -> Dict[str, Any]:
+    """Read the manifest of a tarball, returning None if it is missing or unreadable
+    """
+
+    try:
+        with open(manifest_path(target, manifest_dir)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+
+@logit(logger)
+def manifest_matches(target: str, entries: List[List], manifest_dir: str = None,
+                     target_exists: Callable = None) -> bool:
+    """Determine whether an existing tarball already holds the current fileset.
+
+    The tarball is up to date when its manifest lists exactly the same members
+    with the same sizes and modification times as entries, and it exists: a
+    local tarball with the size recorded in its manifest, a remote one as
+    reported by target_exists.
+
+    Parameters
+    ----------
+    target : str
+        Tarball to check
+    entries : List[List]
+        [name, size, mtime] of each member of the current fileset
+    manifest_dir : str
+        Directory of the manifests of remote tarballs (default: None, a local tarball)
+    target_exists : Callable
+        Function telling whether a remote tarball exists (e.g. Hsi.exists)
+
+    Returns
+    -------
+    bool
+        True if the tarball does not need to be recreated
+    """
+
+    manifest = read_manifest(target, manifest_dir)
+    if manifest is None:
+        return False
+
+    recorded = [[member["name"], member["size"], member["mtime"]] for member in manifest["members"]]
+    if recorded != [list(entry) for entry in entries]:
+        return False
+
+    if manifest_dir is not None:
+        return target_exists is not None and target_exists(target)
+
+    try:
+        return os.path.getsize(target) == manifest["tarball_size"]
+    except OSError:
+        return False
+
+
+@logit(logger)
+def verify_tarball(target: str, deep: bool = False) -> List[str]:
+    """Verify a local tarball against its manifest.
+
+    Member names, types and sizes are checked from the tar headers.  With
+    deep=True, the data of each regular member is also read back and compared
+    with the recorded checksum.
+
+    Parameters
+    ----------
+    target : str
+        Tarball to verify
+    deep : bool
+        Also verify member checksums (default: False)
+
+    Returns
+    -------
+    errors : List[str]
+        Description of each discrepancy; empty if the tarball is valid
+    """
+
+    manifest = read_manifest(target)
+    if manifest is None:
+        return [f"no readable manifest for {target}"]
+
+    errors = []
+    expected = {member["name"]: member for member in manifest["members"]}
+
+    with tarfile.open(target, "r") as tarball:
+        seen = set()
+        for tarinfo in tarball:
+            name = tarinfo.name
+            seen.add(name)
+            member = expected.get(name)
+            if member is None:
+                errors.append(f"{name}: not in manifest")
+                continue
+            if tarinfo.isreg() and tarinfo.size != member["size"]:
+                errors.append(f"{name}: size {tarinfo.size} != {member['size']}")
+                continue
+            if deep and tarinfo.isreg() and member["hash"] is not None:
+                hasher = hashlib.new(manifest["checksum"])
+                with tarball.extractfile(tarinfo) as fh:
+                    for chunk in iter(lambda: fh.read(ARCHIVE_CHUNK_SIZE), b""):
+                        hasher.update(chunk)
+                if hasher.hexdigest() != member["hash"]:
+                    errors.append(f"{name}: checksum mismatch")
+
+    errors.extend(f"{name}: missing from tarball" for name in expected if name not in seen)
+
+    return errors
+
+
+@logit(logger)
+def schedule_datasets(action: Callable, datasets: List[Dict[str, Any]], nworkers: int = 1,
+                      retries: int = 0, backoff: float = 60.) -> List[AttrDict]:
+    """Apply action to every dataset with a bounded pool of workers.
+
+    Datasets are started largest first (by their "size" key) so that the
+    longest transfers do not end up running alone at the end.  Failed
+    attempts are retried with exponential backoff; a dataset that still
+    fails does not stop the others.
+
+    Parameters
+    ----------
+    action : Callable
+        Function called with a single dataset; any exception counts as a failed attempt
+    datasets : List[Dict[str, Any]]
+        Datasets to process, each with at least a "target" key
+    nworkers : int
+        Number of datasets processed concurrently
+    retries : int
+        Number of times a failed dataset is retried
+    backoff : float
+        Seconds to wait before the first retry; doubled for every further retry
+
+    Returns
+    -------
+    results : List[AttrDict]
+        target, size, attempts, elapsed (s) and error (None on success) for each dataset, in start order
+    """
+
+    ordered = sorted(datasets, key=lambda dataset: dataset.get("size", 0), reverse=True)
+
+    def _run(dataset):
+        result = AttrDict(target=dataset["target"], size=dataset.get("size", 0),
+                          attempts=0, elapsed=0., error=None)
+        start = time.monotonic()
+        while True:
+            result.attempts += 1
+            try:
+                action(dataset)
+                result.error = None
+                break
+            except Exception as err:
+                result.error = err
+                if result.attempts > retries:
+                    logger.error(f"FATAL ERROR: {result.target} failed after {result.attempts} attempt(s): {err}")
+                    break
+                delay = backoff * 2 ** (result.attempts - 1)
+                logger.warning(f"WARNING: attempt {result.attempts} for {result.target} failed ({err}), "
+                               f"retrying in {delay:.0f}s")
+                time.sleep(delay)
+        result.elapsed = time.monotonic() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(nworkers, len(ordered) or 1))) as executor:
+        results = list(executor.map(_run, ordered))
+
+    for result in results:
+        rate = result.size / result.elapsed if result.elapsed > 0 else 0.
+        status = "OK" if result.error is None else "FAILED"
+        logger.info(f"{status:>6} {result.target}: {fmt_bytes(result.size)} in {result.elapsed:.1f}s "
+                    f"({fmt_bytes(rate)}/s, {result.attempts} attempt(s))")
+
+    return results
+
+
+@logit(logger)
+def create_diag_tarball(target: str, diags: List[str], nworkers: int = DIAG_NWORKERS, compresslevel: int = 9,
+                        chunk_size: int = ARCHIVE_CHUNK_SIZE // 4, spool_size: int = DIAG_SPOOL_SIZE) -> AttrDict:
+    """Gzip diag files in parallel and stream them into an (uncompressed) stat tarball.
+
+    Each diag file is added as the member `<basename>.gz`, the same content and
+    name as gzipping it with `gzip.open` and adding the result with
+    `TarFile.add`, but without writing the .gz files next to the diags.
+    Compression runs in a pool of threads (zlib releases the GIL) while the
+    members are written to the tarball in the order given.  At most nworkers
+    compressed members are held at any time, each in memory up to spool_size
+    bytes and in a temporary file beyond, so the memory used is bounded by
+    nworkers * spool_size.
+
+    Parameters
+    ----------
+    target : str
+        Tarball to create (e.g. atmstat)
+    diags : List[str]
+        Diag files to compress and archive
+    nworkers : int
+        Number of compression threads, at most the number of diags and of CPUs
+    compresslevel : int
+        gzip compression level
+    chunk_size : int
+        Number of bytes compressed per call
+    spool_size : int
+        Size in bytes up to which a compressed member is held in memory
+
+    Returns
+    -------
+    report : AttrDict
+        Summary of the tarball with keys target, members, bytes (uncompressed),
+        compressed, elapsed and rate (uncompressed bytes/s).
+    """
+
+    nworkers = max(1, min(nworkers or 1, len(diags), os.cpu_count() or 1))
+
+    mkdir_p(os.path.dirname(os.path.realpath(target)))
+
+    start = time.monotonic()
+    nbytes = compressed = 0
+    with tarfile.open(target, "w") as tarball, ThreadPoolExecutor(max_workers=nworkers) as executor:
+        pending = deque()
+        for ii, diagfile in enumerate(diags):
+            pending.append((diagfile, executor.submit(_gzip_to_spool, diagfile, compresslevel, chunk_size, spool_size)))
+            # Write completed members in order, keeping the pool busy but bounding the spooled data
+            while pending and (len(pending) >= nworkers or ii == len(diags) - 1):
+                done_diag, future = pending.popleft()
+                spool, size = future.result()
+                with spool:
+                    tarinfo = tarball.gettarinfo(os.path.realpath(done_diag),
+                                                 arcname=f"{os.path.basename(done_diag)}.gz")
+                    nbytes += tarinfo.size
+                    tarinfo.size = size
+                    tarball.addfile(tarinfo, spool)
+                compressed += size
+
+    elapsed = time.monotonic() - start
+    report = AttrDict(target=target,
+                      members=len(diags),
+                      bytes=nbytes,
+                      compressed=compressed,
+                      elapsed=elapsed,
+                      rate=nbytes / elapsed if elapsed > 0 else 0.)
+
+    logger.info(f"Created {target}: {len(diags)} diag files, {fmt_bytes(nbytes)} compressed to "
+                f"{fmt_bytes(compressed)} on {nworkers} threads in {elapsed:.1f}s ({fmt_bytes(report.rate)}/s)")
+
+    return report
+
+
+def _gzip_to_spool(diagfile: str, compresslevel: int, chunk_size: int, spool_size: int) -> Any:
+    """Gzip a file into a spooled temporary file and return it, rewound, with its size
+    """
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    try:
+        # the gzip header records the diag file name, as gzip.open(f"{diagfile}.gz") does
+        with open(diagfile, "rb") as f_in, \
+                gzip.GzipFile(filename=os.path.basename(diagfile), mode="wb",
+                              compresslevel=compresslevel, fileobj=spool) as f_out:
+            shutil.copyfileobj(f_in, f_out, chunk_size)
+        size = spool.tell()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool, size
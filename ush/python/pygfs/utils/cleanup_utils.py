@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatchcase
+from logging import getLogger
+from typing import Any, Dict, List
+
+from wxflow import AttrDict, logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Size of a filesystem block as counted by st_blocks
+STAT_BLOCK_SIZE = 512
+
+
+def _scan_dir(path: str, exclude: List[str], dry_run: bool) -> AttrDict:
+    """List a directory and remove the files and symbolic links in it not matching exclude
+
+    Without exclude, all the entries that are not directories are removed, including
+    special files (FIFOs, sockets, devices).
+
+    Subdirectories are returned to be scanned in turn.  Entries that disappear while
+    the directory is processed (e.g. removed by another job) are ignored.
+    """
+
+    result = AttrDict(subdirs=[], kept=False, files=0, nbytes=0)
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return result
+
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    result.subdirs.append(entry.path)
+                    continue
+                # As find -type f/-type l: other special files are left in place, unless
+                # the whole tree is removed (as rm -rf)
+                if exclude and (not (entry.is_file(follow_symlinks=False) or entry.is_symlink()) or
+                                any(fnmatchcase(entry.name, pattern) for pattern in exclude)):
+                    result.kept = True
+                    continue
+                nbytes = entry.stat(follow_symlinks=False).st_blocks * STAT_BLOCK_SIZE
+                if not dry_run:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            result.files += 1
+            result.nbytes += nbytes
+
+    return result
+
+
+@logit(logger)
+def prune_trees(targets: List[Dict[str, Any]], dry_run: bool = False, nworkers: int = 1) -> List[AttrDict]:
+    """Remove the files of directory trees, keeping those matching exclusion patterns.
+
+    Each target is a dictionary with the `path` of a file or directory and an optional
+    list of `exclude` patterns matched against file names (as `find -name`).  Regular
+    files and symbolic links not excluded are removed, then the directories left empty,
+    including the top directory.  Other special files (FIFOs, sockets, devices) are kept,
+    as with `find -type f -o -type l`, except in a target without exclusions, which is
+    removed entirely (as `rm -rf`).
+
+    The directories of all the targets are listed and emptied concurrently by nworkers
+    threads, which keeps many metadata requests in flight on parallel filesystems.
+
+    Parameters
+    ----------
+    targets : List[Dict[str, Any]]
+        Targets to prune, with keys `path` and optionally `exclude`
+    dry_run : bool
+        Only count what would be removed
+    nworkers : int
+        Number of threads scanning and removing
+
+    Returns
+    -------
+    List[AttrDict]
+        For each target (in order): the number of `files` and `dirs` removed, the total
+        of freed `inodes` and the `nbytes` allocated to the removed files
+    """
+
+    stats = [AttrDict(files=0, dirs=0, inodes=0, nbytes=0) for _ in targets]
+    # Directories scanned for each target, with whether they keep files and their subdirectories
+    scanned = [dict() for _ in targets]
+
+    with ThreadPoolExecutor(max_workers=max(1, nworkers)) as executor:
+        pending = dict()
+        for itarget, target in enumerate(targets):
+            path = target['path']
+            exclude = list(target.get('exclude', []))
+            if os.path.isdir(path) and not os.path.islink(path):
+                pending[executor.submit(_scan_dir, path, exclude, dry_run)] = (itarget, path, exclude)
+            elif os.path.lexists(path) and not any(fnmatchcase(os.path.basename(path), pattern) for pattern in exclude):
+                stats[itarget].files += 1
+                stats[itarget].nbytes += os.lstat(path).st_blocks * STAT_BLOCK_SIZE
+                if not dry_run:
+                    os.unlink(path)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                itarget, path, exclude = pending.pop(future)
+                result = future.result()
+                stats[itarget].files += result.files
+                stats[itarget].nbytes += result.nbytes
+                scanned[itarget][path] = result
+                for subdir in result.subdirs:
+                    pending[executor.submit(_scan_dir, subdir, exclude, dry_run)] = (itarget, subdir, exclude)
+
+    # Remove the directories left empty, deepest first (as find -type d -empty -delete)
+    for itarget, directories in enumerate(scanned):
+        removed = set()
+        for path in sorted(directories, key=lambda path: path.count(os.sep), reverse=True):
+            result = directories[path]
+            if result.kept or not all(subdir in removed for subdir in result.subdirs):
+                continue
+            if not dry_run:
+                try:
+                    os.rmdir(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as err:
+                    # Something was added while pruning; keep the directory
+                    logger.warning(f"WARNING: Unable to remove directory {path}: {err}")
+                    continue
+            removed.add(path)
+        stats[itarget].dirs = len(removed)
+        stats[itarget].inodes = stats[itarget].files + stats[itarget].dirs
+
+    return stats
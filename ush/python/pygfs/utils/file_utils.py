@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import errno
+import os
+
+
+def copy_fd(src_fd: int, dst_fd: int, nbytes: int, chunk_size: int) -> None:
+    """Copy exactly nbytes from src_fd to dst_fd using the fastest available method
+    """
+
+    remaining = nbytes
+    method = "copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"
+
+    while remaining > 0:
+        count = min(chunk_size, remaining)
+        try:
+            if method == "copy_file_range":
+                copied = os.copy_file_range(src_fd, dst_fd, count)
+            elif method == "sendfile":
+                copied = os.sendfile(dst_fd, src_fd, None, count)
+            else:
+                data = memoryview(os.read(src_fd, count))
+                copied = 0
+                while copied < len(data):
+                    copied += os.write(dst_fd, data[copied:])
+        except OSError as err:
+            if method != "read" and err.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                                  errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF):
+                # Fall back to the next slower method for this file
+                method = "sendfile" if method == "copy_file_range" else "read"
+                continue
+            raise
+
+        if copied == 0:
+            raise OSError(f"FATAL ERROR: unexpected end of data, {remaining} bytes missing")
+        remaining -= copied
+
+
+def fmt_bytes(nbytes: float) -> str:
+    """Format a byte count with a binary unit suffix
+    """
+
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(nbytes) < 1024.:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024.
+    return f"{nbytes:.1f} TiB"
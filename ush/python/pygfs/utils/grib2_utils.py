@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import os
+import re
+from logging import getLogger
+from typing import List
+
+from pygfs.utils.archive_utils import ARCHIVE_CHUNK_SIZE
+from pygfs.utils.file_utils import copy_fd
+from wxflow import AttrDict, logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Length of section 0 (indicator section) of a GRIB2 message
+GRIB2_SECTION0_SIZE = 16
+
+# Records (from their wgrib2 inventory) that must stay in the same chunk as the next one:
+# u-components of vectors, interpolated with their v-component, and land, used for icec
+GRIB2_PAIRED_RECORDS = re.compile(r'ugrd|ustm|uflx|u-gwd|land', re.IGNORECASE)
+
+
+@logit(logger)
+def scan_messages(gribfile: str) -> List[AttrDict]:
+    """Offsets and lengths of the GRIB2 messages of a file
+
+    Only section 0 of each message is read; the lengths it holds are used to skip
+    to the next message.
+
+    Parameters
+    ----------
+    gribfile : str
+        GRIB2 file
+
+    Returns
+    -------
+    List[AttrDict]
+        `offset` and `length` in bytes of each message
+
+    Raises
+    ------
+    ValueError
+        If the file is not a sequence of GRIB2 messages
+    """
+
+    messages = []
+    filesize = os.path.getsize(gribfile)
+    with open(gribfile, 'rb') as fh:
+        offset = 0
+        while offset < filesize:
+            fh.seek(offset)
+            section0 = fh.read(GRIB2_SECTION0_SIZE)
+            if len(section0) < GRIB2_SECTION0_SIZE or section0[:4] != b'GRIB' or section0[7] != 2:
+                raise ValueError(f"FATAL ERROR: {gribfile} has no GRIB2 message at byte {offset}")
+            length = int.from_bytes(section0[8:16], 'big')
+            if offset + length > filesize:
+                raise ValueError(f"FATAL ERROR: {gribfile} is truncated, message at byte {offset} has {length} bytes")
+            messages.append(AttrDict(offset=offset, length=length))
+            offset += length
+
+    return messages
+
+
+@logit(logger)
+def read_inventory(inventory: str) -> List[AttrDict]:
+    """Read a wgrib2 inventory (the output of `wgrib2 -s`, as in the .idx files)
+
+    Submessages (numbered e.g. 3.1, 3.2) are merged into their message.
+
+    Parameters
+    ----------
+    inventory : str
+        Inventory file
+
+    Returns
+    -------
+    List[AttrDict]
+        `number`, `offset` and `description` (the inventory line) of each message
+    """
+
+    records = []
+    with open(inventory, 'r') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            number, offset = line.split(':')[:2]
+            number = int(number.split('.')[0])
+            if records and records[-1].number == number:
+                records[-1].description += f"\n{line}"
+                continue
+            records.append(AttrDict(number=number, offset=int(offset), description=line))
+
+    return records
+
+
+@logit(logger)
+def message_table(gribfile: str, inventory: str = None) -> List[AttrDict]:
+    """Messages of a GRIB2 file with their inventory
+
+    Parameters
+    ----------
+    gribfile : str
+        GRIB2 file
+    inventory : str, optional
+        wgrib2 inventory of gribfile, needed to keep paired records in the same chunk
+
+    Returns
+    -------
+    List[AttrDict]
+        `offset`, `length` and `description` (empty without inventory) of each message
+
+    Raises
+    ------
+    ValueError
+        If the inventory does not describe the messages of gribfile
+    """
+
+    messages = scan_messages(gribfile)
+    for message in messages:
+        message.description = ''
+
+    if inventory is not None:
+        records = read_inventory(inventory)
+        if [record.offset for record in records] != [message.offset for message in messages]:
+            raise ValueError(f"FATAL ERROR: {inventory} ({len(records)} messages) is not the inventory "
+                             f"of {gribfile} ({len(messages)} messages)")
+        for message, record in zip(messages, records):
+            message.description = record.description
+
+    return messages
+
+
+def partition_messages(messages: List[AttrDict], nchunks: int, record_cost: int = None) -> List[range]:
+    """Split messages into contiguous chunks of balanced cost
+
+    The cost of a message is its length plus record_cost.  Processing a record
+    has a part proportional to its packed size (decoding and encoding) and a part
+    that is not (e.g. interpolating it from the grid shared by all the records),
+    represented by record_cost (default: the mean length of the messages).
+
+    The chunks keep the messages in order, so the outputs of the chunks can simply
+    be concatenated, and a message matching GRIB2_PAIRED_RECORDS is kept with the
+    next one.  The largest chunk cost is minimized, and there are as many chunks as
+    possible up to nchunks.
+
+    Parameters
+    ----------
+    messages : List[AttrDict]
+        Messages, as returned by message_table
+    nchunks : int
+        Maximum number of chunks
+    record_cost : int, optional
+        Cost of a message in addition to its length in bytes
+
+    Returns
+    -------
+    List[range]
+        Indices of the messages of each chunk
+    """
+
+    if not messages:
+        return []
+    if record_cost is None:
+        record_cost = sum(message.length for message in messages) // len(messages)
+
+    # Units that cannot be split, as ranges of messages
+    units = []
+    first = 0
+    for index, message in enumerate(messages):
+        if index == len(messages) - 1 or not GRIB2_PAIRED_RECORDS.search(message.description):
+            units.append(range(first, index + 1))
+            first = index + 1
+    costs = [sum(messages[index].length + record_cost for index in unit) for unit in units]
+    nchunks = max(1, min(nchunks, len(units)))
+
+    # Smallest largest chunk cost with which the units fit in nchunks chunks
+    low, high = max(costs), sum(costs)
+    while low < high:
+        limit = (low + high) // 2
+        if _count_chunks(costs, limit) <= nchunks:
+            high = limit
+        else:
+            low = limit + 1
+
+    # Fill the chunks up to that cost, leaving at least one unit for each remaining chunk
+    chunks = []
+    first = 0
+    while first < len(units):
+        last, cost = first, costs[first]
+        remaining_chunks = nchunks - len(chunks) - 1
+        while last + 1 < len(units) - remaining_chunks and cost + costs[last + 1] <= low:
+            last += 1
+            cost += costs[last]
+        chunks.append(range(units[first].start, units[last].stop))
+        first = last + 1
+
+    return chunks
+
+
+def _count_chunks(costs: List[int], limit: int) -> int:
+    """Number of chunks filled up to limit needed for costs
+    """
+
+    count, cost = 1, 0
+    for unit_cost in costs:
+        if cost + unit_cost > limit:
+            count += 1
+            cost = 0
+        cost += unit_cost
+    return count
+
+
+@logit(logger)
+def write_chunks(gribfile: str, messages: List[AttrDict], chunks: List[range], prefix: str) -> List[str]:
+    """Write each chunk of messages of a GRIB2 file to its own file
+
+    The messages of a chunk are contiguous in gribfile, so each chunk is a single
+    byte range copied as is (as `wgrib2 -for first:last -grib` would write it).
+
+    Parameters
+    ----------
+    gribfile : str
+        GRIB2 file
+    messages : List[AttrDict]
+        Messages of gribfile, as returned by message_table
+    chunks : List[range]
+        Indices of the messages of each chunk, as returned by partition_messages
+    prefix : str
+        The chunk files are named {prefix}1, {prefix}2, ...
+
+    Returns
+    -------
+    List[str]
+        Chunk files
+    """
+
+    chunk_files = []
+    src_fd = os.open(gribfile, os.O_RDONLY)
+    try:
+        for ichunk, chunk in enumerate(chunks, start=1):
+            offset = messages[chunk.start].offset
+            nbytes = messages[chunk.stop - 1].offset + messages[chunk.stop - 1].length - offset
+            chunk_file = f"{prefix}{ichunk}"
+            dst_fd = os.open(chunk_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.lseek(src_fd, offset, os.SEEK_SET)
+                copy_fd(src_fd, dst_fd, nbytes, ARCHIVE_CHUNK_SIZE)
+            finally:
+                os.close(dst_fd)
+            logger.debug(f"{chunk_file}: messages {chunk.start + 1} to {chunk.stop}, {nbytes} bytes")
+            chunk_files.append(chunk_file)
+    finally:
+        os.close(src_fd)
+
+    return chunk_files
@@ -13,6 +13,7 @@ from wxflow import (FileHandler,
                     Executable,
                     save_as_yaml,
                     jinja)
+from pygfs.jedi.jedi_config import JediConfig
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -147,22 +148,14 @@ def clean_empty_obsspaces(config, target, app='var'):
     """
 
     # obs space dictionary depth is dependent on the application
-    if app == 'var':
-        obs_spaces = config['cost function']['observations']['observers']
-    else:
+    if app != 'var':
         raise ValueError(f"FATAL ERROR: obs space cleaning not implemented for {app}")
+    jedi_config = JediConfig(config)
 
     # remove obs spaces that point to a non existant file
-    cleaned_obs_spaces = []
-    for obs_space in obs_spaces:
-        fname = obs_space['obs space']['obsdatain']['engine']['obsfile']
-        if os.path.isfile(fname):
-            cleaned_obs_spaces.append(obs_space)
-        else:
-            logger.info(f"WARNING: {fname} does not exist, removing obs space")
-
-    # update obs spaces
-    config['cost function']['observations']['observers'] = cleaned_obs_spaces
+    existing = {fname: os.path.isfile(fname) for fname in set(jedi_config.obs_files)}
+    for entry in jedi_config.remove_observers(lambda entry: not existing.get(entry.obsfile, False)):
+        logger.info(f"WARNING: {entry.obsfile} does not exist, removing obs space")
 
     # save cleaned yaml
     save_as_yaml(config, target)
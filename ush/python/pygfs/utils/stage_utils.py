@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import fcntl
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Any, Dict, List, Tuple
+
+from wxflow import AttrDict, FileHandler, logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Default number of files staged concurrently
+STAGE_NWORKERS = 8
+
+# Ways a file can be staged, in the order they are tried:
+#   reflink:  copy-on-write clone (FICLONE), falls back to a copy
+#   hardlink: hard link to the source, falls back to a copy.  Only safe when
+#             the staged file is never modified in place.
+#   copy:     regular copy (shutil.copy2, as wxflow.cp)
+STAGE_METHODS = ("reflink", "hardlink", "copy")
+
+# ioctl request number of FICLONE (linux/fs.h)
+_FICLONE = 0x40049409
+
+
+@logit(logger)
+def stage_files(stage_dict: Dict[str, Any], nworkers: int = STAGE_NWORKERS, method: str = "reflink",
+                required: bool = True) -> AttrDict:
+    """Stage the files of a FileHandler style dictionary concurrently
+
+    Directories in 'mkdir' are created first.  The [src, dest] pairs in 'copy'
+    are then de-duplicated: repeated pairs are dropped, and a source requested
+    under several destinations is read once, the other destinations being
+    staged from the first one.  All sources are checked before anything is
+    staged so that missing files are reported together.
+
+    Parameters
+    ----------
+    stage_dict : Dict[str, Any]
+        Dictionary with optional 'mkdir' (list of directories) and 'copy' (list of [src, dest]) keys
+    nworkers : int
+        Number of files staged concurrently
+    method : str
+        One of STAGE_METHODS; reflink and hardlink are only attempted when the
+        source and destination are on the same filesystem
+    required : bool
+        Raise FileNotFoundError if any source is missing; otherwise missing sources are skipped
+
+    Returns
+    -------
+    report : AttrDict
+        Summary with keys staged, duplicates, missing (list of sources), bytes, elapsed
+        and methods (number of files staged with each method)
+    """
+
+    if method not in STAGE_METHODS:
+        raise ValueError(f"Unknown staging method '{method}', must be one of {STAGE_METHODS}")
+
+    if stage_dict.get('mkdir'):
+        FileHandler({'mkdir': stage_dict['mkdir']}).sync()
+
+    groups, nduplicates = _group_copies(stage_dict.get('copy', []))
+
+    missing = [src for src in groups if not os.path.exists(src)]
+    if missing:
+        summary = "\n  ".join(missing)
+        if required:
+            logger.error(f"FATAL ERROR: {len(missing)} of {len(groups)} required source files do not exist:\n  {summary}")
+            raise FileNotFoundError(f"{len(missing)} required source files do not exist, first is '{missing[0]}'")
+        logger.warning(f"WARNING: {len(missing)} of {len(groups)} source files do not exist, skipping:\n  {summary}")
+        for src in missing:
+            del groups[src]
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(nworkers, len(groups) or 1))) as executor:
+        staged = list(executor.map(lambda item: _stage_group(item[0], item[1], method), groups.items()))
+
+    report = AttrDict(staged=sum(len(dests) for dests in groups.values()),
+                      duplicates=nduplicates,
+                      missing=missing,
+                      bytes=sum(nbytes for nbytes, _ in staged),
+                      elapsed=time.monotonic() - start,
+                      methods={})
+    for _, methods in staged:
+        for used in methods:
+            report.methods[used] = report.methods.get(used, 0) + 1
+
+    logger.info(f"Staged {report.staged} files ({report.bytes / 1024**2:.1f} MiB) from {len(groups)} sources "
+                f"in {report.elapsed:.2f}s on {nworkers} threads; {nduplicates} duplicates skipped; "
+                f"methods: {report.methods}")
+
+    return report
+
+
+def _group_copies(copylist: List[List[str]]) -> Tuple[Dict[str, List[str]], int]:
+    """Group [src, dest] pairs by source, dropping repeated destinations
+
+    Returns the destinations of each source (in order of first appearance) and
+    the number of pairs dropped.
+    """
+
+    groups = {}
+    sources = {}
+    nduplicates = 0
+    for pair in copylist:
+        if len(pair) != 2:
+            raise IndexError(f"List must be of the form ['src', 'dest'], not {pair}")
+        src, dest = pair
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, os.path.basename(src))
+        dest = os.path.abspath(dest)
+
+        if dest in sources:
+            if sources[dest] != src:
+                raise ValueError(f"Conflicting sources for {dest}: '{sources[dest]}' and '{src}'")
+            nduplicates += 1
+            continue
+        sources[dest] = src
+        groups.setdefault(src, []).append(dest)
+
+    return groups, nduplicates
+
+
+def _stage_group(src: str, dests: List[str], method: str) -> Tuple[int, List[str]]:
+    """Stage src to its first destination, and that one to the other destinations
+
+    Returns the number of bytes staged and the method used for each destination.
+    """
+
+    methods = [_stage_file(src, dests[0], method)]
+    for dest in dests[1:]:
+        methods.append(_stage_file(dests[0], dest, method))
+    logger.debug(f"Staged {src} to {', '.join(dests)} ({', '.join(methods)})")
+    return os.path.getsize(dests[0]) * len(dests), methods
+
+
+def _stage_file(src: str, dest: str, method: str) -> str:
+    """Stage a single file with method, falling back to a copy; return the method used
+    """
+
+    same_fs = os.stat(src).st_dev == os.stat(os.path.dirname(dest)).st_dev
+
+    # Replace rather than overwrite an existing destination: it may be a
+    # symbolic or hard link to a file (e.g. in COM) that must not be written through
+    if os.path.lexists(dest):
+        if method == "hardlink" and not os.path.islink(dest) and os.path.samefile(src, dest):
+            return "hardlink"
+        os.remove(dest)
+
+    if method == "hardlink" and same_fs:
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError as err:
+            logger.debug(f"Unable to hard link {src} to {dest} ({err}), copying instead")
+    elif method == "reflink" and same_fs:
+        try:
+            with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+                fcntl.ioctl(fdest.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copystat(src, dest)
+            return "reflink"
+        except OSError as err:
+            logger.debug(f"Unable to reflink {src} to {dest} ({err}), copying instead")
+
+    try:
+        shutil.copy2(src, dest)
+    except OSError:
+        raise OSError(f"Unable to copy {src} to {dest}")
+    return "copy"
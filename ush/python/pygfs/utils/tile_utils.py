@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Any, Callable, Dict, Generator, Optional, Tuple
+
+from wxflow import logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+
+@logit(logger)
+def run_tile_tasks(func: Callable, tasks: Dict[str, Tuple], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Run an independent function call per tile (or per member and tile) in a process pool
+
+    Parameters
+    ----------
+    func : Callable
+        Module level function to call; it must be picklable
+    tasks : Dict[str, Tuple]
+        Positional arguments of each call, keyed by a label used in the timing report (e.g. "mem001 tile1")
+    max_workers : int, optional
+        Number of worker processes (default: min(number of tasks, number of CPUs))
+
+    Returns
+    -------
+    results : Dict[str, Any]
+        Return value of each call, keyed by label
+    """
+
+    if not tasks:
+        return {}
+
+    max_workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {label: executor.submit(_timed_call, func, args) for label, args in tasks.items()}
+        outcomes = {label: future.result() for label, future in futures.items()}
+    elapsed = time.perf_counter() - start
+
+    for label, (_, task_elapsed) in outcomes.items():
+        logger.info(f"{func.__name__} {label}: {task_elapsed:.2f}s")
+    total = sum(task_elapsed for _, task_elapsed in outcomes.values())
+    logger.info(f"{func.__name__}: {len(tasks)} tasks on {max_workers} workers in {elapsed:.2f}s "
+                f"(speedup {total / max(elapsed, 1e-9):.1f}x)")
+
+    return {label: result for label, (result, _) in outcomes.items()}
+
+
+def _timed_call(func: Callable, args: Tuple) -> Tuple[Any, float]:
+    """Call func(*args) and return its result with the elapsed wall time
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+@contextmanager
+def atomic_output(path: str) -> Generator[str, None, None]:
+    """Create a file atomically through a temporary file in the same directory
+
+    The temporary file replaces path only if the block completes without an
+    exception, so readers never see a partially written file.  This is meant
+    for files written from scratch; modifying a few variables of an existing
+    (large) file through a full copy of it is not worth the I/O.
+
+    Parameters
+    ----------
+    path : str
+        File to create
+
+    Yields
+    ------
+    str
+        Path of the temporary file to write to
+    """
+
+    tmp_path = f"{path}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
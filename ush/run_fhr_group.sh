@@ -0,0 +1,111 @@
+#! /usr/bin/env bash
+
+source "${HOMEgfs}/ush/preamble.sh"
+
+###############################################################
+## Run a per forecast hour JJOB for each forecast hour of FHRLST
+##
+## Usage: run_fhr_group.sh JJOB
+##
+## Each hour of FHRLST (e.g. f000_f001_f002) is started as soon as its
+## input files are available and at least FHR_INPUT_AGE seconds old (as the
+## rocoto data dependencies).  FHR_INPUTS lists the input files of an hour,
+## where {fhr3} and {fhr3_next} stand for the hour and for the matching hour
+## of FHRLST_NEXT (inputs of a next hour of "-", past the end of the forecast,
+## are not waited for).  If the inputs of an hour are not available within
+## FHR_INPUT_TIMEOUT seconds, no other hour is started and the job fails once
+## the running hours complete.  Up to NFHRS_CONCURRENT hours run at the same time, each
+## with its own FHR3, FORECAST_HOUR and jobid (and so DATA).  The output of
+## an hour is added to the job output when it completes.
+###############################################################
+
+jjob=${1:?}
+
+read -ra fhrs <<< "${FHRLST//_/ }"
+fhrlst_next=${FHRLST_NEXT:-}
+read -ra fhrs_next <<< "${fhrlst_next//_/ }"
+nconcurrent=${NFHRS_CONCURRENT:-1}
+input_age=${FHR_INPUT_AGE:-120}
+poll_interval=${FHR_INPUT_POLL:-30}
+input_timeout=${FHR_INPUT_TIMEOUT:-3600}
+
+mkdir -p "${DATAROOT}"
+
+inputs_ready() {
+  local fhr3=$1 fhr3_next=$2 template path
+  for template in ${FHR_INPUTS:-}; do
+    if [[ "${template}" == *"{fhr3_next}"* && ( -z "${fhr3_next}" || "${fhr3_next}" == "-" ) ]]; then
+      continue
+    fi
+    path=${template//\{fhr3\}/${fhr3}}
+    path=${path//\{fhr3_next\}/${fhr3_next}}
+    if [[ ! -f "${path}" ]]; then
+      return 1
+    fi
+    if (( $(date +%s) - $(stat -c %Y "${path}") < input_age )); then
+      return 1
+    fi
+  done
+  return 0
+}
+
+declare -A running=()
+err=0
+
+reap_finished() {
+  # Collect the hours that completed; returns 1 if none did
+  local pid rc reaped=1
+  local alive
+  alive=" $(jobs -pr | tr '\n' ' ') "
+  for pid in "${!running[@]}"; do
+    if [[ "${alive}" != *" ${pid} "* ]]; then
+      rc=0
+      wait "${pid}" || rc=$?
+      cat "${DATAROOT}/${job}.f${running[${pid}]}.$$.out"
+      rm -f "${DATAROOT}/${job}.f${running[${pid}]}.$$.out"
+      if (( rc != 0 )); then
+        echo "FATAL ERROR: ${jjob} failed for forecast hour ${running[${pid}]} with error code ${rc}"
+        err=${rc}
+      fi
+      unset "running[${pid}]"
+      reaped=0
+    fi
+  done
+  return "${reaped}"
+}
+
+for i in "${!fhrs[@]}"; do
+  fhr3=${fhrs[i]#f}
+  fhr3_next=${fhrs_next[i]:-}
+  fhr3_next=${fhr3_next#f}
+
+  # Wait for a free slot, then for the inputs of the hour
+  while (( ${#running[@]} >= nconcurrent )); do
+    reap_finished || sleep 5
+  done
+  wait_start=$(date +%s)
+  until inputs_ready "${fhr3}" "${fhr3_next}"; do
+    if (( $(date +%s) - wait_start >= input_timeout )); then
+      echo "FATAL ERROR: inputs of forecast hour ${fhr3} not available after ${input_timeout} seconds"
+      err=1
+      break 2
+    fi
+    reap_finished || true
+    sleep "${poll_interval}"
+  done
+
+  echo "Starting forecast hour ${fhr3} at $(date -u)"
+  (
+    export FHR3=${fhr3}
+    export FORECAST_HOUR=$(( 10#${fhr3} ))
+    export jobid="${job}.f${fhr3}.$$"
+    "${jjob}"
+  ) > "${DATAROOT}/${job}.f${fhr3}.$$.out" 2>&1 &
+  running[$!]=${fhr3}
+done
+
+while (( ${#running[@]} > 0 )); do
+  reap_finished || sleep 5
+done
+
+exit "${err}"
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+"""
+Split a GRIB2 file into chunks of balanced cost for MPMD processing
+
+The messages are partitioned into contiguous chunks (keeping u and v components
+together) that balance their bytes and number of records, and each chunk is
+copied as a byte range of the file to {prefix}1, {prefix}2, ...  The names of the
+chunk files are printed, one per line.
+
+    split_grib2.py [--inventory tmpfile.idx] [--prefix tmpfile_] tmpfile nchunks
+"""
+
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from pygfs.utils.grib2_utils import message_table, partition_messages, write_chunks
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Split a GRIB2 file into chunks of balanced cost",
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('gribfile', type=str, help="GRIB2 file to split")
+    parser.add_argument('nchunks', type=int, help="Maximum number of chunks")
+    parser.add_argument('-i', '--inventory', type=str, required=False,
+                        help="wgrib2 inventory (wgrib2 -s) of the GRIB2 file, to keep paired records together")
+    parser.add_argument('-p', '--prefix', type=str, required=False,
+                        help="Prefix of the chunk files (default: GRIB2 file followed by _)")
+    parser.add_argument('-c', '--record-cost', type=int, required=False,
+                        help="Cost of a record in addition to its size in bytes (default: mean record size)")
+    args = parser.parse_args()
+
+    messages = message_table(args.gribfile, args.inventory)
+    chunks = partition_messages(messages, args.nchunks, args.record_cost)
+    for chunk_file in write_chunks(args.gribfile, messages, chunks, args.prefix or f"{args.gribfile}_"):
+        print(chunk_file)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import copy
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from wxflow import Configuration, cast_strdict_as_dtypedict
+
+__all__ = ['CachedConfiguration']
+
+
+class CachedConfiguration(Configuration):
+    """
+    Configuration that avoids re-sourcing the same config files through bash.
+
+    Every `parse_config` call on a plain Configuration starts two bash processes,
+    one to collect the default environment and one to source the requested configs.
+    This class
+      - collects the default environment only once,
+      - memoizes the result of each (files, environment variables) combination,
+        sourcing the files together in one shell exactly as Configuration does,
+      - optionally persists those results to `cache_file`, keyed on a hash of the
+        content of every config file and of the environment variables they reference,
+        and on the content of the files the configs source from outside config_dir.
+    """
+
+    # Files sourced by a config (`source file` or `. file`)
+    SOURCE_PATTERN = re.compile(r'^\s*(?:source|\.)\s+"?([^"\s;]+)', re.MULTILINE)
+
+    def __init__(self, config_dir: Union[str, Path], cache_file: Union[str, Path] = None):
+        super().__init__(config_dir)
+
+        self.cache_file = cache_file
+        self._sourced_paths = {}
+        self.fingerprint = self._get_fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+        self._default_env = None
+        # Files sourced from outside config_dir, with the hash of their content
+        self._external_files = {}
+        self._cache = self._load_cache()
+
+    def parse_config(self, files: Union[str, bytes, list], **envvars) -> Dict[str, Any]:
+        """
+        Given the name of config file(s), key-value pair of all variables in the config file(s)
+        are returned as a dictionary.  Same signature and result as Configuration.parse_config.
+        """
+        if isinstance(files, (str, bytes)):
+            files = [files]
+        files = [os.path.basename(self.find_config(file)) for file in files]
+
+        key = json.dumps([files, sorted((name, str(value)) for name, value in envvars.items())])
+        if key in self._cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._cache[key] = self._source(files, **envvars)
+
+        return cast_strdict_as_dtypedict(copy.deepcopy(self._cache[key]))
+
+    def save(self) -> None:
+        """
+        Write the sourced configurations to cache_file (if any) for reuse by later invocations
+        """
+        if self.cache_file is None:
+            return
+
+        tmp_file = f'{self.cache_file}.tmp'
+        with open(tmp_file, 'w') as fh:
+            json.dump({'fingerprint': self.fingerprint, 'external_files': self._external_files,
+                       'configs': self._cache}, fh)
+        os.replace(tmp_file, self.cache_file)
+
+    def _source(self, files: List[str], **envvars) -> Dict[str, str]:
+        """
+        Source files and return the variables they define (as strings)
+        """
+        if self._default_env is None:
+            self._default_env = self._get_shell_env([])
+
+        script_env = self._get_shell_env([self.find_config(file) for file in files], **envvars)
+        self._add_external_files(files, script_env)
+
+        return {name: value for name, value in script_env.items() if name not in self._default_env}
+
+    def _add_external_files(self, files: List[str], script_env: Dict[str, str]) -> None:
+        """
+        Record the files sourced by files from outside config_dir, resolved with script_env
+        """
+        config_dir = os.path.realpath(self.config_dir)
+        for file in files:
+            for path in self._sourced_paths.get(file, []):
+                path = re.sub(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)\}?', lambda match: script_env.get(match.group(1), ''), path)
+                if os.path.isfile(path) and os.path.dirname(os.path.realpath(path)) != config_dir:
+                    self._external_files[path] = self._hash_file(path)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """
+        Hash of the content of a file (None if it cannot be read)
+        """
+        try:
+            with open(path, 'rb') as fh:
+                return hashlib.sha256(fh.read()).hexdigest()
+        except OSError:
+            return None
+
+    def _get_fingerprint(self) -> str:
+        """
+        Hash of the content of all config files and of the environment variables they reference
+
+        Files sourced from outside config_dir are only known once the configs are sourced;
+        they are stored with their own hashes in cache_file and checked by _load_cache.
+        """
+        sha = hashlib.sha256()
+        referenced = set()
+        for config in sorted(self.config_files):
+            with open(config, 'rb') as fh:
+                content = fh.read()
+            sha.update(os.path.basename(config).encode() + b'\0' + content + b'\0')
+            self._sourced_paths[os.path.basename(config)] = self.SOURCE_PATTERN.findall(content.decode(errors='replace'))
+            referenced.update(re.findall(rb'\$\{?([A-Za-z_][A-Za-z0-9_]*)', content))
+        for name in sorted(referenced):
+            value = os.environ.get(name.decode())
+            if value is not None:
+                sha.update(name + b'=' + value.encode() + b'\0')
+        return sha.hexdigest()
+
+    def _load_cache(self) -> Dict[str, Dict[str, str]]:
+        """
+        Read previously sourced configurations from cache_file if it matches the current fingerprint
+        """
+        if self.cache_file is None or not os.path.isfile(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as fh:
+                cache = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        external_files = cache.get('external_files', {})
+        if cache.get('fingerprint') != self.fingerprint or \
+                any(self._hash_file(path) != digest for path, digest in external_files.items()):
+            print(f'config cache {self.cache_file} is out of date, ignoring it')
+            return {}
+        self._external_files.update(external_files)
+        return cache.get('configs', {})
@@ -30,6 +30,8 @@ import sys
 import os
 import re
 import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 try:
     import ecflow
@@ -165,7 +167,7 @@ class Ecflowsuite:
         add_trigger method.
     """
 
-    def __init__(self, ecfsuite, ecfhome, build_tree=True):
+    def __init__(self, ecfsuite, ecfhome, build_tree=True, script_index=None):
         """
         Parameters
         ----------
@@ -181,6 +183,11 @@ class Ecflowsuite:
             in place.
         ecfsuite : str
             The name of the suite.
+        script_index : EcfScriptIndex
+            Index of the script repository shared by all the suites. If it is
+            set, the task scripts are only registered with the index and are
+            copied when its copy_scripts method is called. If not, the
+            repository is indexed and the script copied for each task.
         """
 
         # Initialize environment
@@ -188,6 +195,7 @@ class Ecflowsuite:
         self.ecf_nodes = {}
         self.ecfhome = ecfhome
         self.build_tree = build_tree
+        self.script_index = script_index
 
         # Create initial suite
         self.ecfsuite = self.add_suite(ecfsuite)
@@ -634,7 +642,8 @@ class Ecflowsuite:
                 if self.build_tree:
                     self.ecf_nodes[task_name].generate_ecflow_task(self.ecfhome,
                                                                    self.get_suite_name(),
-                                                                   parents)
+                                                                   parents,
+                                                                   self.script_index)
                 self.ecf_nodes[parents] += self.ecf_nodes[task_name]
 
     def add_task_edits(self, task, edit_dict, parent_node=None, index=None):
@@ -1917,7 +1926,7 @@ class EcfTask(ecflow.Task, EcfRoot):
         script repo that isn't the default and template if that is also
         defined for a task.
 
-    generate_ecflow_task(ecfhome,suite,parents)
+    generate_ecflow_task(ecfhome,suite,parents,script_index=None)
         Uses the parameters passed in to define the folder path and then
         looks in the script repository for the task name with a .ecf suffix or
         template name with a .ecf suffix and then copies that script content
@@ -1945,7 +1954,7 @@ class EcfTask(ecflow.Task, EcfRoot):
         self.scriptrepo = repopath
         self.template = template
 
-    def generate_ecflow_task(self, ecfhome, suite, parents):
+    def generate_ecflow_task(self, ecfhome, suite, parents, script_index=None):
         """
         Uses the parameters passed in to define the folder path and then
         looks in the script repository for the task name with a .ecf suffix or
@@ -1962,6 +1971,11 @@ class EcfTask(ecflow.Task, EcfRoot):
         parents: str
             Any parent folders that are appended to the ecfhome and suite
             folders.
+        script_index : EcfScriptIndex
+            Index of the script repository. If it is passed in, the copy is
+            registered with the index and done by its copy_scripts method,
+            otherwise the script repo is indexed and the script is copied
+            right away.
 
         Returns
         -------
@@ -1970,27 +1984,179 @@ class EcfTask(ecflow.Task, EcfRoot):
         if self.template == "skip":
             return
         script_name = f"{self.name()}.ecf"
-        ecfscript = None
         search_script = f"{self.template}.ecf" if self.template is not \
             None else script_name
         if parents:
             script_path = f"{ecfhome}/{suite}/{parents.replace('>','/')}/{script_name}"
         else:
             script_path = f"{ecfhome}/{suite}/{script_name}"
-        for root, dirs, files in os.walk(self.scriptrepo):
-            if search_script in files and ecfscript is None:
-                ecfscript = os.path.join(root, search_script)
-            elif script_name in files:
-                print(f"More than one script named {script_name}. "
-                      "Using the first one found.")
+        copy_now = script_index is None
+        if copy_now:
+            script_index = EcfScriptIndex(self.scriptrepo)
         try:
-            if ecfscript is not None:
-                shutil.copyfile(ecfscript, script_path, follow_symlinks=True)
-            else:
+            ecfscript = script_index.find(search_script)
+            if ecfscript is None:
                 raise ConfigurationError
         except ConfigurationError:
             print(f"Could not find the script {search_script}. Exiting build")
             sys.exit(1)
+        script_index.add_copy(ecfscript, script_path)
+        if copy_now:
+            script_index.copy_scripts(max_workers=1)
+
+
+class EcfScriptIndex:
+    """
+    Index of the .ecf scripts of a script repository, built with a single
+    walk of the repository and shared by all the tasks of the suites. The
+    tasks register the copy of their script with the index and all of the
+    copies are then done at once, in parallel. A destination that already
+    has the same content as its script is left untouched so that
+    regenerating the suites only rewrites the scripts that changed.
+
+    Methods
+    -------
+    find(script_name)
+        Returns the path of the script in the repository, or None if there is
+        no script with that name. If there are several, the first one found
+        is used.
+
+    duplicates()
+        Returns the script names that are found more than once in the
+        repository with all of their paths.
+
+    add_copy(ecfscript, script_path)
+        Registers the copy of a repository script to its destination.
+
+    copy_scripts(max_workers=None)
+        Copies all of the registered scripts whose destination is missing or
+        differs from the script.
+    """
+
+    def __init__(self, scriptrepo):
+        """
+        Parameters
+        ----------
+        scriptrepo : str
+            Path to the script repository.
+        """
+
+        self.scriptrepo = scriptrepo
+        self.scripts = {}
+        self.copies = {}
+        self.reported = set()
+        self._hashes = {}
+        for root, dirs, files in os.walk(scriptrepo):
+            for file_name in files:
+                self.scripts.setdefault(file_name, []).append(os.path.join(root, file_name))
+
+    def find(self, script_name):
+        """
+        Returns the path of the script in the repository, or None if there is
+        no script with that name. If there are several, the first one found
+        is used and this is reported once.
+
+        Parameters
+        ----------
+        script_name : str
+            File name of the script, with its .ecf suffix.
+
+        Returns
+        -------
+        str
+            Path to the script, None if it is not in the repository.
+        """
+
+        paths = self.scripts.get(script_name)
+        if not paths:
+            return None
+        if len(paths) > 1 and script_name not in self.reported:
+            self.reported.add(script_name)
+            print(f"More than one script named {script_name}. "
+                  "Using the first one found.")
+        return paths[0]
+
+    def duplicates(self):
+        """
+        Returns the script names that are found more than once in the
+        repository with all of their paths.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            The paths of each duplicated script name.
+        """
+
+        return {name: paths for name, paths in self.scripts.items()
+                if len(paths) > 1}
+
+    def add_copy(self, ecfscript, script_path):
+        """
+        Registers the copy of a repository script to its destination. The
+        copy is done by the copy_scripts method.
+
+        Parameters
+        ----------
+        ecfscript : str
+            Path to the script in the repository.
+        script_path : str
+            Path to the destination of the script.
+
+        Returns
+        -------
+        None
+        """
+
+        self.copies[script_path] = ecfscript
+
+    def copy_scripts(self, max_workers=None):
+        """
+        Copies all of the registered scripts whose destination is missing or
+        differs from the script, using a pool of threads. The destination
+        folders are expected to exist.
+
+        Parameters
+        ----------
+        max_workers : int
+            Number of copies done at the same time. Defaults to the
+            ThreadPoolExecutor default.
+
+        Returns
+        -------
+        tuple
+            The number of scripts copied and the number of unchanged
+            destinations that were skipped.
+        """
+
+        copies = list(self.copies.items())
+        self.copies = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            copied = list(executor.map(lambda copy: self._copy_script(*copy),
+                                       copies))
+        return copied.count(True), copied.count(False)
+
+    def _copy_script(self, script_path, ecfscript):
+        if os.path.isfile(script_path) and \
+                os.path.getsize(script_path) == os.path.getsize(ecfscript) and \
+                self._file_hash(script_path) == self._script_hash(ecfscript):
+            return False
+        shutil.copyfile(ecfscript, script_path, follow_symlinks=True)
+        return True
+
+    def _script_hash(self, ecfscript):
+        # Templates are shared by many tasks, so their hashes are kept
+        if ecfscript not in self._hashes:
+            self._hashes[ecfscript] = self._file_hash(ecfscript)
+        return self._hashes[ecfscript]
+
+    @staticmethod
+    def _file_hash(path):
+        with open(path, 'rb') as file_handle:
+            return hashlib.sha256(file_handle.read()).hexdigest()
 
 # define Python user-defined exceptions
 
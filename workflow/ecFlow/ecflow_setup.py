@@ -21,7 +21,7 @@ import os
 import re
 import sys
 import datetime
-from ecFlow.ecflow_definitions import Ecflowsuite, EcfFamilyNode
+from ecFlow.ecflow_definitions import Ecflowsuite, EcfFamilyNode, EcfScriptIndex
 
 try:
     from ecflow import Defs
@@ -47,6 +47,9 @@ class Ecflowsetup:
     DEFS : ecflow.Defs
         A definition object provided by the ecflow module that holds all of the
         suites.
+    script_index : EcfScriptIndex
+        The index of the script repository, built once and shared by all of
+        the suites to look up and copy the task scripts.
 
     Methods
     -------
@@ -129,6 +132,7 @@ class Ecflowsetup:
         elif 'scriptrepo' not in self.env_configs['base'].keys():
             self.env_configs['base']['scriptrepo'] = f"{self.ecfhome}/scripts"
         self.scriptrepo = self.env_configs['base']['scriptrepo']
+        self.script_index = EcfScriptIndex(self.scriptrepo)
 
         # Setup the default edits from the environment
         self.environment_edits = [
@@ -207,7 +211,8 @@ class Ecflowsetup:
                     # tasks. Triggers and edits cannot be added until the tasks
                     # and families are parsed.
                     if suite_name not in self.suite_array.keys():
-                        new_suite = Ecflowsuite(suite_name, self.env_configs['base']['ECFgfs'])
+                        new_suite = Ecflowsuite(suite_name, self.env_configs['base']['ECFgfs'],
+                                                script_index=self.script_index)
                     else:
                         new_suite = self.suite_array[suite_name]
                     if new_suite.get_suite_name() not in self.suite_array.keys():
@@ -218,6 +223,11 @@ class Ecflowsetup:
                         self.add_tasks_and_edits(new_suite, self.ecfconf['suites'][suite]['nodes'])
                     self.suite_array[new_suite.get_suite_name()] = new_suite
 
+        # Copy the task scripts registered by all of the suites at once,
+        # skipping the ones that are already up to date.
+        copied, unchanged = self.script_index.copy_scripts()
+        print(f"Copied {copied} task scripts, {unchanged} already up to date")
+
         # Now that the families and tasks are setup, run through the triggers
         # and events and add them to the respective tasks/family objects.
         for suite in self.ecfconf['suites'].keys():
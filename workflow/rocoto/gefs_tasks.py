@@ -165,7 +165,7 @@ class GEFSTasks(Tasks):
 
             tasks.append(rocoto.create_task(seg_metatask_dict))
 
-        return '\n'.join(tasks)
+        return tasks
 
         # Keeping this in hopes the kludge is no longer necessary at some point
         #
@@ -227,17 +227,6 @@ class GEFSTasks(Tasks):
         for key, value in postenvar_dict.items():
             postenvars.append(rocoto.create_envar(name=key, value=str(value)))
 
-        task_name = f'gefs_{component}_prod_mem#member#_f#fhr#'
-        task_dict = {'task_name': task_name,
-                     'resources': resources,
-                     'dependency': dependencies,
-                     'envars': postenvars,
-                     'cycledef': 'gefs',
-                     'command': f'{self.HOMEgfs}/jobs/rocoto/{config}.sh',
-                     'job_name': f'{self.pslot}_{task_name}_@H',
-                     'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
-                     'maxtries': '&MAXTRIES;'}
-
         fhrs = self._get_forecast_hours('gefs', self._configs[config], component)
 
         # when replaying, atmos component does not have fhr 0, therefore remove 0 from fhrs
@@ -249,10 +238,22 @@ class GEFSTasks(Tasks):
         if component in ['ocean', 'ice'] and 0 in fhrs:
             fhrs.remove(0)
 
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+        fhrs_next = None
         if component in ['ocean']:
             fhrs_next = fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]
-            fhr_var_dict['fhr_next'] = ' '.join([f"{fhr:03d}" for fhr in fhrs_next])
+        fhr_var_dict = self._get_fhr_var_dict(fhrs, self._configs[config], fhrs_next)
+
+        task_name = f'gefs_{component}_prod_mem#member#{self._get_fhr_task_suffix(fhr_var_dict)}'
+        task_dict = {'task_name': task_name,
+                     'resources': resources,
+                     'dependency': dependencies,
+                     'envars': postenvars,
+                     'cycledef': 'gefs',
+                     'command': f'{self.HOMEgfs}/jobs/rocoto/{config}.sh',
+                     'job_name': f'{self.pslot}_{task_name}_@H',
+                     'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
+                     'maxtries': '&MAXTRIES;'}
+        self._set_fhr_group_task(task_dict, fhr_var_dict, self._configs[config], [data])
 
         fhr_metatask_dict = {'task_name': f'gefs_{component}_prod_#member#',
                              'task_dict': task_dict,
@@ -271,9 +272,29 @@ class GEFSTasks(Tasks):
 
         resources = self.get_resource('atmos_ensstat')
 
+        fhrs = self._get_forecast_hours('gefs', self._configs['atmos_ensstat'])
+
+        # when replaying, atmos component does not have fhr 0, therefore remove 0 from fhrs
+        is_replay = self._configs['atmos_ensstat']['REPLAY_ICS']
+        if is_replay and 0 in fhrs:
+            fhrs.remove(0)
+
+        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+
+        # The atmos_prod job of each hour, when they process several hours
+        prod_fhrs = self._get_forecast_hours('gefs', self._configs['atmos_products'])
+        if self._configs['atmos_products']['REPLAY_ICS'] and 0 in prod_fhrs:
+            prod_fhrs.remove(0)
+        prod_var_dict = self._get_fhr_var_dict(prod_fhrs, self._configs['atmos_products'])
+        prod_suffix = '_f#fhr#'
+        if 'grp' in prod_var_dict:
+            prod_grps = self._get_fhr_group_names(prod_var_dict)
+            fhr_var_dict['prod_grp'] = ' '.join([prod_grps.get(f"{fhr:03d}", f"_f{fhr:03d}") for fhr in fhrs])
+            prod_suffix = '#prod_grp#'
+
         deps = []
         for member in range(0, self.nmem + 1):
-            task = f'gefs_atmos_prod_mem{member:03d}_f#fhr#'
+            task = f'gefs_atmos_prod_mem{member:03d}{prod_suffix}'
             dep_dict = {'type': 'task', 'name': task}
             deps.append(rocoto.add_dependency(dep_dict))
 
@@ -295,15 +316,6 @@ class GEFSTasks(Tasks):
                      'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
                      'maxtries': '&MAXTRIES;'}
 
-        fhrs = self._get_forecast_hours('gefs', self._configs['atmos_ensstat'])
-
-        # when replaying, atmos component does not have fhr 0, therefore remove 0 from fhrs
-        is_replay = self._configs['atmos_ensstat']['REPLAY_ICS']
-        if is_replay and 0 in fhrs:
-            fhrs.remove(0)
-
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
-
         fhr_metatask_dict = {'task_name': f'gefs_atmos_ensstat',
                              'task_dict': task_dict,
                              'var_dict': fhr_var_dict}
@@ -1075,21 +1075,21 @@ class GFSTasks(Tasks):
             postenvars.append(rocoto.create_envar(name=key, value=str(value)))
 
         atm_hist_path = self._template_to_rocoto_cycstring(self._base["COM_ATMOS_HISTORY_TMPL"])
+        inputs = [f'{atm_hist_path}/{self.run}.t@Hz.atmf#fhr#.nc',
+                  f'{atm_hist_path}/{self.run}.t@Hz.sfcf#fhr#.nc',
+                  f'{atm_hist_path}/{self.run}.t@Hz.atm.logf#fhr#.txt']
         deps = []
-        data = f'{atm_hist_path}/{self.run}.t@Hz.atmf#fhr#.nc'
-        dep_dict = {'type': 'data', 'data': data, 'age': 120}
-        deps.append(rocoto.add_dependency(dep_dict))
-        data = f'{atm_hist_path}/{self.run}.t@Hz.sfcf#fhr#.nc'
-        dep_dict = {'type': 'data', 'data': data, 'age': 120}
-        deps.append(rocoto.add_dependency(dep_dict))
-        data = f'{atm_hist_path}/{self.run}.t@Hz.atm.logf#fhr#.txt'
-        dep_dict = {'type': 'data', 'data': data, 'age': 60}
-        deps.append(rocoto.add_dependency(dep_dict))
+        for data, age in zip(inputs, [120, 120, 60]):
+            dep_dict = {'type': 'data', 'data': data, 'age': age}
+            deps.append(rocoto.add_dependency(dep_dict))
         dependencies = rocoto.create_dependency(dep=deps, dep_condition='and')
         cycledef = 'gdas_half,gdas' if self.run in ['gdas'] else self.run
         resources = self.get_resource('upp')
 
-        task_name = f'{self.run}_{task_id}_f#fhr#'
+        fhrs = self._get_forecast_hours(self.run, self._configs['upp'])
+        fhr_var_dict = self._get_fhr_var_dict(fhrs, self._configs['upp'])
+
+        task_name = f'{self.run}_{task_id}{self._get_fhr_task_suffix(fhr_var_dict)}'
         task_dict = {'task_name': task_name,
                      'resources': resources,
                      'dependency': dependencies,
@@ -1100,9 +1100,7 @@ class GFSTasks(Tasks):
                      'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
                      'maxtries': '&MAXTRIES;'
                      }
-
-        fhrs = self._get_forecast_hours(self.run, self._configs['upp'])
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+        self._set_fhr_group_task(task_dict, fhr_var_dict, self._configs['upp'], inputs)
 
         metatask_dict = {'task_name': f'{self.run}_{task_id}',
                          'task_dict': task_dict,
@@ -1156,7 +1154,18 @@ class GFSTasks(Tasks):
         cycledef = 'gdas_half,gdas' if self.run in ['gdas'] else self.run
         resources = self.get_resource(component_dict['config'])
 
-        task_name = f'{self.run}_{component}_prod_f#fhr#'
+        fhrs = self._get_forecast_hours(self.run, self._configs[config], component)
+
+        # ocean/ice components do not have fhr 0 as they are averaged output
+        if component in ['ocean', 'ice'] and 0 in fhrs:
+            fhrs.remove(0)
+
+        fhrs_next = None
+        if component in ['ocean']:
+            fhrs_next = fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]
+        fhr_var_dict = self._get_fhr_var_dict(fhrs, self._configs[config], fhrs_next)
+
+        task_name = f'{self.run}_{component}_prod{self._get_fhr_task_suffix(fhr_var_dict)}'
         task_dict = {'task_name': task_name,
                      'resources': resources,
                      'dependency': dependencies,
@@ -1167,17 +1176,8 @@ class GFSTasks(Tasks):
                      'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
                      'maxtries': '&MAXTRIES;'
                      }
+        self._set_fhr_group_task(task_dict, fhr_var_dict, self._configs[config], [data])
 
-        fhrs = self._get_forecast_hours(self.run, self._configs[config], component)
-
-        # ocean/ice components do not have fhr 0 as they are averaged output
-        if component in ['ocean', 'ice'] and 0 in fhrs:
-            fhrs.remove(0)
-
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
-        if component in ['ocean']:
-            fhrs_next = fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]
-            fhr_var_dict['fhr_next'] = ' '.join([f"{fhr:03d}" for fhr in fhrs_next])
         metatask_dict = {'task_name': f'{self.run}_{component}_prod',
                          'task_dict': task_dict,
                          'var_dict': fhr_var_dict}
@@ -1497,8 +1497,20 @@ class GFSTasks(Tasks):
 
     def gempak(self):
 
+        fhrs = self._get_forecast_hours(self.run, self._configs['gempak'])
+        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+
+        # The atmos_prod job of each hour, when they process several hours
+        prod_fhrs = self._get_forecast_hours(self.run, self._configs['atmos_products'])
+        prod_var_dict = self._get_fhr_var_dict(prod_fhrs, self._configs['atmos_products'])
+        prod_dep = f'{self.run}_atmos_prod_f#fhr#'
+        if 'grp' in prod_var_dict:
+            prod_grps = self._get_fhr_group_names(prod_var_dict)
+            fhr_var_dict['prod_grp'] = ' '.join([prod_grps.get(f"{fhr:03d}", f"_f{fhr:03d}") for fhr in fhrs])
+            prod_dep = f'{self.run}_atmos_prod#prod_grp#'
+
         deps = []
-        dep_dict = {'type': 'task', 'name': f'{self.run}_atmos_prod_f#fhr#'}
+        dep_dict = {'type': 'task', 'name': prod_dep}
         deps.append(rocoto.add_dependency(dep_dict))
         dependencies = rocoto.create_dependency(dep=deps)
 
@@ -1520,9 +1532,6 @@ class GFSTasks(Tasks):
                      'maxtries': '&MAXTRIES;'
                      }
 
-        fhrs = self._get_forecast_hours(self.run, self._configs['gempak'])
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
-
         fhr_metatask_dict = {'task_name': f'{self.run}_gempak',
                              'task_dict': task_dict,
                              'var_dict': fhr_var_dict}
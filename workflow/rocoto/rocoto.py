@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Iterator
 
 '''
     MODULE:
@@ -11,20 +11,69 @@ from typing import Union, List, Dict, Any
         Rocoto documentation is available at https://christopherwharrop.github.io/rocoto
 '''
 
-__all__ = ['create_task',
+__all__ = ['RocotoTask', 'RocotoMetatask', 'create_task',
            'add_dependency', 'create_dependency',
            'create_envar', 'create_entity', 'create_cycledef']
 
 
-def create_task(task_dict: Dict[str, Any]) -> List[str]:
+class RocotoTask:
+    """
+    A regular Rocoto task: its XML lines, without indentation
     """
-    Create XML for a rocoto task or metatask
 
-    Creates the XML required to define a task and returns the lines
-    as a list of strings. Tasks can be nested to create metatasks by
-    defining a key 'task_dict' within the task_dict. When including
-    a nested task, you also need to provide a 'var_dict' key that
-    contains a dictionary of variables to loop over.
+    def __init__(self, name: str, lines: List[str]) -> None:
+        self.name = name
+        self.lines = lines
+
+    def iter_lines(self, indent: str = '') -> Iterator[str]:
+        """
+        Yield the XML lines of the task, indented by indent (blank lines are not indented)
+        """
+        for line in self.lines:
+            yield line if line == '\n' else f'{indent}{line}'
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
+
+
+class RocotoMetatask:
+    """
+    A Rocoto metatask: the variables it loops over and the task (or metatask) it repeats
+    """
+
+    def __init__(self, name: str, mode: str, var_dict: Dict[str, Any], task: Union[RocotoTask, 'RocotoMetatask']) -> None:
+        self.name = name
+        self.mode = mode
+        self.var_dict = var_dict
+        self.task = task
+
+    def iter_lines(self, indent: str = '') -> Iterator[str]:
+        """
+        Yield the XML lines of the metatask, indented by indent (blank lines are not indented)
+        """
+        yield f'{indent}<metatask name="{self.name}" mode="{self.mode}">\n'
+        yield '\n'
+        for key, value in self.var_dict.items():
+            yield f'{indent}\t<var name="{key}">{value}</var>\n'
+        yield '\n'
+        yield from self.task.iter_lines(f'{indent}\t')
+        yield '\n'
+        yield f'{indent}</metatask>\n'
+
+    def __str__(self) -> str:
+        return ''.join(self.iter_lines())
+
+
+def create_task(task_dict: Dict[str, Any]) -> Union[RocotoTask, RocotoMetatask]:
+    """
+    Create a rocoto task or metatask
+
+    Creates the structure defining a task; its XML is obtained with
+    str() or streamed line by line with iter_lines(). Tasks can be
+    nested to create metatasks by defining a key 'task_dict' within
+    the task_dict. When including a nested task, you also need to
+    provide a 'var_dict' key that contains a dictionary of variables
+    to loop over.
 
     All task dicts must include a 'task_name'.
 
@@ -38,8 +87,8 @@ def create_task(task_dict: Dict[str, Any]) -> List[str]:
 
     Returns
     -------
-    str
-        Strings containing the XML code defining the task
+    RocotoTask or RocotoMetatask
+        Task or metatask (with its nested tasks)
 
     Raises
     ------
@@ -51,34 +100,23 @@ def create_task(task_dict: Dict[str, Any]) -> List[str]:
     inner_task_dict = task_dict.pop('task_dict', None)
 
     if inner_task_dict is None:
-        strings = _create_innermost_task(task_dict)
-
-    else:
-        # There is a nested task_dict, so this is a metatask
-        metataskname = f"{task_dict.get('task_name', 'demometatask')}"
-        metataskmode = 'serial' if task_dict.get('is_serial', False) else 'parallel'
-        var_dict = task_dict.get('var_dict', None)
-
-        strings = [f'<metatask name="{metataskname}" mode="{metataskmode}">\n',
-                   '\n']
+        # Split once so that nesting the task in metatasks only prefixes its lines
+        lines = ''.join(_create_innermost_task(task_dict)).splitlines(True)
+        return RocotoTask(task_dict.get('task_name', 'demotask'), lines)
 
-        if var_dict is None:
-            msg = f'Task {metataskname} has a nested task dict, but has no var_dict'
-            raise KeyError(msg)
+    # There is a nested task_dict, so this is a metatask
+    metataskname = f"{task_dict.get('task_name', 'demometatask')}"
+    metataskmode = 'serial' if task_dict.get('is_serial', False) else 'parallel'
+    var_dict = task_dict.get('var_dict', None)
 
-        for key in var_dict.keys():
-            value = str(var_dict[key])
-            strings.append(f'\t<var name="{key}">{value}</var>\n')
+    if var_dict is None:
+        msg = f'Task {metataskname} has a nested task dict, but has no var_dict'
+        raise KeyError(msg)
 
-        strings.append('\n')
-        task_dict.update(inner_task_dict)
-        tasklines = create_task(task_dict).splitlines(True)
-        for tl in tasklines:
-            strings.append(f'{tl}') if tl == '\n' else strings.append(f'\t{tl}')
-        strings.append('\n')
-        strings.append('</metatask>\n')
+    var_dict = {key: str(value) for key, value in var_dict.items()}
 
-    return ''.join(strings)
+    task_dict.update(inner_task_dict)
+    return RocotoMetatask(metataskname, metataskmode, var_dict, create_task(task_dict))
 
 
 def _create_innermost_task(task_dict: Dict[str, Any]) -> List[str]:
@@ -3,7 +3,7 @@
 import numpy as np
 from applications.applications import AppConfig
 import rocoto.rocoto as rocoto
-from wxflow import Template, TemplateConstants, to_timedelta
+from wxflow import Template, TemplateConstants, to_timedelta, timedelta_to_HMS
 from typing import List
 
 __all__ = ['Tasks']
@@ -166,6 +166,113 @@ class Tasks:
 
         return fhrs
 
+    @staticmethod
+    def _get_fhr_groups(fhrs: List[int], nfhrs_per_group: int = 1) -> List[List[int]]:
+        """
+        Pack consecutive forecast hours into the groups processed by a single job
+
+        The cost of an hour is its output interval in units of the finest output interval
+        of fhrs, i.e. how long a job that already processed the previous hour waits for it.
+        Hours are added to a group while its cost stays within nfhrs_per_group, so a group
+        holds nfhrs_per_group hours at the highest output frequency and fewer hours (down
+        to one) where the output is less frequent.
+        """
+        if nfhrs_per_group <= 1 or len(fhrs) <= 1:
+            return [[fhr] for fhr in fhrs]
+
+        intervals = [0] + [fhr - prev for prev, fhr in zip(fhrs[:-1], fhrs[1:])]
+        finest = min([interval for interval in intervals if interval > 0], default=1)
+
+        groups = []
+        cost = 0
+        for fhr, interval in zip(fhrs, intervals):
+            hour_cost = max(1, interval // finest)
+            if groups and cost + hour_cost <= nfhrs_per_group:
+                groups[-1].append(fhr)
+                cost += hour_cost
+            else:
+                groups.append([fhr])
+                cost = 1
+        return groups
+
+    def _get_fhr_var_dict(self, fhrs: List[int], config: dict, fhrs_next: List[int] = None) -> dict:
+        """
+        Metatask variables of the per forecast hour tasks of fhrs
+
+        'fhr' (and 'fhr_next' for fhrs_next) holds the (first) hour of each job.  When the
+        config sets NFHRS_PER_GROUP > 1, the hours are grouped (see _get_fhr_groups) and
+        'grp' (the task name suffix, e.g. _f000-f002) and 'lst' (the hours of the job,
+        e.g. f000_f001_f002, and 'lst_next') are added.  The next hour of the last hour of
+        fhrs is past the end of the forecast and never written, so it is '-' in 'lst_next'.
+        """
+        groups = self._get_fhr_groups(fhrs, int(config.get('NFHRS_PER_GROUP', 1)))
+
+        var_dict = {'fhr': ' '.join([f"{grp[0]:03d}" for grp in groups])}
+        next_fhr = dict(zip(fhrs, fhrs_next)) if fhrs_next is not None else None
+        if next_fhr is not None:
+            var_dict['fhr_next'] = ' '.join([f"{next_fhr[grp[0]]:03d}" for grp in groups])
+
+        if any(len(grp) > 1 for grp in groups):
+            var_dict['grp'] = ' '.join([f"_f{grp[0]:03d}" + (f"-f{grp[-1]:03d}" if len(grp) > 1 else '') for grp in groups])
+            var_dict['lst'] = ' '.join(['_'.join([f"f{fhr:03d}" for fhr in grp]) for grp in groups])
+            if next_fhr is not None:
+                var_dict['lst_next'] = ' '.join(['_'.join([f"f{next_fhr[fhr]:03d}" if next_fhr[fhr] <= fhrs[-1] else '-'
+                                                           for fhr in grp]) for grp in groups])
+
+        return var_dict
+
+    @staticmethod
+    def _get_fhr_task_suffix(var_dict: dict) -> str:
+        """
+        Task name suffix of the jobs of a _get_fhr_var_dict metatask
+        """
+        return '#grp#' if 'grp' in var_dict else '_f#fhr#'
+
+    @staticmethod
+    def _get_fhr_group_names(var_dict: dict) -> dict:
+        """
+        Task name suffix of the job processing each forecast hour (as 'fhr' 3-digit strings)
+        of a _get_fhr_var_dict metatask
+        """
+        if 'grp' not in var_dict:
+            return {fhr: f'_f{fhr}' for fhr in var_dict['fhr'].split()}
+        return {fhr[1:]: grp for grp, lst in zip(var_dict['grp'].split(), var_dict['lst'].split())
+                for fhr in lst.split('_')}
+
+    def _set_fhr_group_task(self, task_dict: dict, var_dict: dict, config: dict, inputs: List[str]) -> None:
+        """
+        Set up a per forecast hour task to process the groups of hours of var_dict
+
+        Nothing changes if the hours are not grouped.  Otherwise the job gets the list of its
+        hours (FHRLST) and the templates of the input files of an hour (FHR_INPUTS, where
+        {fhr3} and {fhr3_next} stand for the hour), so it can start each hour as soon as its
+        inputs are available.  The job fails if the inputs of an hour are not available
+        within FHR_INPUT_TIMEOUT seconds (default: 3600).  Up to NFHRS_CONCURRENT (default:
+        NFHRS_PER_GROUP) hours run at the same time: the job has the resources of as many
+        hours, and the walltime of a single hour times the largest group.
+        """
+        if 'grp' not in var_dict:
+            return
+
+        max_group = max(len(lst.split('_')) for lst in var_dict['lst'].split())
+        nconcurrent = max(1, min(max_group, int(config.get('NFHRS_CONCURRENT', config.get('NFHRS_PER_GROUP', 1)))))
+
+        resources = task_dict['resources'].copy()
+        resources['ntasks'] = int(resources['ntasks']) * nconcurrent
+        resources['nodes'] = int(np.ceil(float(resources['ntasks']) / float(resources['ppn'])))
+        walltime = to_timedelta(resources['walltime']) * max_group
+        resources['walltime'] = timedelta_to_HMS(walltime)
+        task_dict['resources'] = resources
+
+        fhr_inputs = ' '.join(inputs).replace('#fhr#', '{fhr3}').replace('#fhr_next#', '{fhr3_next}')
+        fhr_envar_dict = {'FHRLST': '#lst#',
+                          'FHR_INPUTS': f'<cyclestr>{fhr_inputs}</cyclestr>',
+                          'NFHRS_CONCURRENT': nconcurrent,
+                          'FHR_INPUT_TIMEOUT': int(config.get('FHR_INPUT_TIMEOUT', 3600))}
+        if 'lst_next' in var_dict:
+            fhr_envar_dict['FHRLST_NEXT'] = '#lst_next#'
+        task_dict['envars'] = task_dict['envars'] + self._set_envars(fhr_envar_dict)
+
     def get_resource(self, task_name):
         """
         Given a task name (task_name) and its configuration (task_names),
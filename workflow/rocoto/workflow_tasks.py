@@ -18,6 +18,8 @@ def get_wf_tasks(app_config: AppConfig) -> List:
     for run, run_tasks in app_config.task_names.items():
         task_obj = tasks_factory.create(app_config.net, app_config, run)  # create Task object based on run
         for task_name in run_tasks:
-            tasks.append(task_obj.get_task(task_name))
+            task = task_obj.get_task(task_name)
+            # Some task methods create several tasks at once
+            tasks.extend(task if isinstance(task, list) else [task])
 
     return tasks
@@ -4,7 +4,7 @@ import os
 from distutils.spawn import find_executable
 from datetime import datetime
 from collections import OrderedDict
-from typing import Dict
+from typing import Dict, Iterator
 from applications.applications import AppConfig
 from rocoto.workflow_tasks import get_wf_tasks
 import rocoto.rocoto as rocoto
@@ -25,12 +25,9 @@ class RocotoXML(ABC):
         self.definitions = self._get_definitions()
         self.header = self._get_workflow_header()
         self.cycledefs = self.get_cycledefs()
-        task_list = get_wf_tasks(app_config)
-        self.tasks = '\n'.join(task_list)
+        self.tasks = get_wf_tasks(app_config)
         self.footer = self._get_workflow_footer()
 
-        self.xml = self._assemble_xml()
-
     @staticmethod
     def _get_preamble():
         """
@@ -108,16 +105,24 @@ class RocotoXML(ABC):
 
         return '\n</workflow>\n'
 
-    def _assemble_xml(self) -> str:
+    def _iter_xml(self) -> Iterator[str]:
+        """
+        Yield the XML of the workflow piece by piece, task line by task line
+        """
 
-        strings = [self.preamble,
-                   self.definitions,
-                   self.header,
-                   self.cycledefs,
-                   self.tasks,
-                   self.footer]
+        yield self.preamble
+        yield self.definitions
+        yield self.header
+        yield self.cycledefs
+        for ii, task in enumerate(self.tasks):
+            if ii > 0:
+                yield '\n'
+            yield from task.iter_lines()
+        yield self.footer
 
-        return ''.join(strings)
+    @property
+    def xml(self) -> str:
+        return ''.join(self._iter_xml())
 
     def write(self, xml_file: str = None, crontab_file: str = None):
         self._write_xml(xml_file=xml_file)
@@ -132,7 +137,7 @@ class RocotoXML(ABC):
             xml_file = f"{expdir}/{pslot}.xml"
 
         with open(xml_file, 'w') as fh:
-            fh.write(self.xml)
+            fh.writelines(self._iter_xml())
 
     def _write_crontab(self, crontab_file: str = None, cronint: int = 5) -> None:
         """
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+Scheduler accounting backends for the Rocoto viewers
+
+Each backend queries its scheduler for the queue time, CPU time, run time and
+slots of a set of jobs and caches the result per job ID: jobs that finished are
+never queried again, and only the unfinished jobs are passed to the scheduler
+command.  Jobs that Rocoto considers finished but the scheduler no longer
+reports (e.g. purged from its history) are cached as finished without
+accounting.  update_database stores the results in a jobs_accounting table of the
+Rocoto database with a single parameterized executemany.  The jobs_augment view
+(the jobs table plus the accounting columns) read by rocoto_viewer joins the two.
+
+The command runner can be replaced (run argument), e.g. by a function
+returning canned scheduler output in tests.
+"""
+
+import collections
+import json
+import shutil
+import subprocess
+from datetime import datetime
+
+__all__ = ['JobAccounting', 'FINAL_STATES', 'AccountingBackend', 'SlurmAccounting', 'PBSAccounting', 'LSFAccounting',
+           'ACCOUNTING_BACKENDS', 'augment_database', 'get_accounting_backend']
+
+JobAccounting = collections.namedtuple('JobAccounting', ['qtime', 'cputime', 'runtime', 'slots', 'finished'])
+
+# Rocoto states of the jobs that will not change any more
+FINAL_STATES = ('SUCCEEDED', 'FAILED', 'DEAD', 'LOST', 'EXPIRED')
+
+
+def _run(args):
+    # Schedulers exit with an error when some of the jobs are unknown, but still report the others
+    return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8').stdout
+
+
+def _seconds(duration):
+    """
+    Seconds of a [DD-][HH:]MM:SS[.sss] duration, or None
+    """
+    try:
+        days, _, clock = duration.strip().rpartition('-')
+        seconds = 0.0
+        for part in clock.split(':'):
+            seconds = seconds * 60 + float(part)
+        return int(seconds + int(days or 0) * 86400)
+    except ValueError:
+        return None
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _queue_time(submit_time, start_time, now=None):
+    """
+    Seconds between submission and start (or now, for a job that has not started)
+    """
+    if submit_time is None:
+        return None
+    end = start_time or now or datetime.now()
+    return max(0, int((end - submit_time).total_seconds()))
+
+
+class AccountingBackend:
+    """
+    Accounting records of the jobs of a scheduler, cached per job ID
+
+    Subclasses define the scheduler command (command_args) and parse its output (parse).
+    """
+
+    name = None
+    command = None
+    # Number of job IDs passed to a single scheduler command
+    max_jobs_per_query = 500
+
+    def __init__(self, run=None):
+        self.run = run or _run
+        self.records = dict()
+        self.queries = 0
+
+    @classmethod
+    def available(cls):
+        return shutil.which(cls.command) is not None
+
+    def update(self, jobids, final_jobids=()):
+        """
+        Accounting records of jobids, querying the scheduler only for jobs not known to have finished
+
+        Jobs of final_jobids (finished according to Rocoto) that the scheduler does not report are
+        recorded as finished, so that they are not queried again.
+        """
+        final_jobids = {str(jobid) for jobid in final_jobids}
+        jobids = [str(jobid) for jobid in dict.fromkeys(jobids) if jobid not in (None, '', '-')]
+        pending = [jobid for jobid in jobids if jobid not in self.records or not self.records[jobid].finished]
+        for i in range(0, len(pending), self.max_jobs_per_query):
+            chunk = pending[i:i + self.max_jobs_per_query]
+            self.queries += 1
+            try:
+                output = self.run(self.command_args(chunk))
+            except OSError:
+                continue
+            records = self.parse(output)
+            self.records.update(records)
+            for jobid in final_jobids.intersection(chunk).difference(records):
+                self.records[jobid] = self.records.get(jobid, JobAccounting(None, None, None, None, True))._replace(finished=True)
+        return {jobid: self.records[jobid] for jobid in jobids if jobid in self.records}
+
+    def update_database(self, connection):
+        """
+        Update the accounting of the jobs of a Rocoto database that have not finished
+
+        All the records are written in one transaction.
+        """
+        augment_database(connection)
+
+        rows = connection.execute(
+            'SELECT jobs.jobid, jobs.state FROM jobs LEFT JOIN jobs_accounting AS a ON a.jobid = jobs.jobid '
+            'WHERE jobs.jobid IS NOT NULL AND (a.finished IS NULL OR a.finished = 0)').fetchall()
+        records = self.update([jobid for jobid, _ in rows],
+                              final_jobids=[jobid for jobid, state in rows if state in FINAL_STATES])
+
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO jobs_accounting VALUES (?, ?, ?, ?, ?, ?)',
+                                   [(jobid, record.qtime, record.cputime, record.runtime, record.slots,
+                                     int(record.finished)) for jobid, record in records.items()])
+        return records
+
+    def command_args(self, jobids):
+        raise NotImplementedError
+
+    def parse(self, output):
+        raise NotImplementedError
+
+
+class SlurmAccounting(AccountingBackend):
+    """
+    Accounting from sacct
+    """
+
+    name = 'slurm'
+    command = 'sacct'
+    active_states = ('PENDING', 'RUNNING', 'REQUEUED', 'RESIZING', 'SUSPENDED', 'CONFIGURING', 'COMPLETING')
+    fields = 'JobID,State,Submit,Start,ElapsedRaw,TotalCPU,AllocCPUS'
+
+    def command_args(self, jobids):
+        return [self.command, '--noheader', '--parsable2', '--allocations', '--format', self.fields,
+                '--jobs', ','.join(jobids)]
+
+    def parse(self, output):
+        records = dict()
+        for line in output.splitlines():
+            values = line.split('|')
+            if len(values) != len(self.fields.split(',')):
+                continue
+            jobid, state, submit, start, elapsed, cputime, slots = values
+            records[jobid] = JobAccounting(qtime=_queue_time(self._time(submit), self._time(start)),
+                                           cputime=_seconds(cputime),
+                                           runtime=_int(elapsed),
+                                           slots=_int(slots),
+                                           finished=(state.split() or [''])[0] not in self.active_states)
+        return records
+
+    @staticmethod
+    def _time(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            return None
+
+
+class PBSAccounting(AccountingBackend):
+    """
+    Accounting from qstat (PBS Pro, JSON output, including finished jobs)
+    """
+
+    name = 'pbs'
+    command = 'qstat'
+    finished_states = ('F', 'X')
+
+    def command_args(self, jobids):
+        return [self.command, '-x', '-f', '-F', 'json'] + jobids
+
+    def parse(self, output):
+        records = dict()
+        for jobid, job in json.loads(output or '{}').get('Jobs', {}).items():
+            resources_used = job.get('resources_used', {})
+            record = JobAccounting(qtime=_queue_time(self._time(job.get('qtime')), self._time(job.get('stime'))),
+                                   cputime=_seconds(resources_used.get('cput', '')),
+                                   runtime=_seconds(resources_used.get('walltime', '')),
+                                   slots=_int(job.get('Resource_List', {}).get('ncpus')),
+                                   finished=job.get('job_state') in self.finished_states)
+            # Rocoto may record the job ID with or without the server name
+            records[jobid] = record
+            records[jobid.split('.')[0]] = record
+        return records
+
+    @staticmethod
+    def _time(value):
+        try:
+            return datetime.strptime(value, '%a %b %d %H:%M:%S %Y')
+        except (TypeError, ValueError):
+            return None
+
+
+class LSFAccounting(AccountingBackend):
+    """
+    Accounting from bjobs
+    """
+
+    name = 'lsf'
+    command = 'bjobs'
+    finished_states = ('DONE', 'EXIT')
+    format_string = "jobid stat slots submit_time start_time cpu_used run_time delimiter=';'"
+
+    def command_args(self, jobids):
+        return [self.command, '-a', '-noheader', '-o', self.format_string] + jobids
+
+    def parse(self, output):
+        records = dict()
+        for line in output.splitlines():
+            values = [value.strip() for value in line.split(';')]
+            if len(values) != 7:
+                continue
+            jobid, state, slots, submit, start, cputime, runtime = values
+            records[jobid] = JobAccounting(qtime=_queue_time(self._time(submit), self._time(start)),
+                                           cputime=_int(cputime.split()[0]) if cputime.strip() else None,
+                                           runtime=_int(runtime.split()[0]) if runtime.strip() else None,
+                                           slots=_int(slots),
+                                           finished=state in self.finished_states)
+        return records
+
+    @staticmethod
+    def _time(value):
+        # bjobs omits the year (and may append a status letter, e.g. " L")
+        try:
+            return datetime.strptime(f'{datetime.now().year} {" ".join(value.split()[:3])}', '%Y %b %d %H:%M')
+        except ValueError:
+            return None
+
+
+def augment_database(connection):
+    """
+    Create the jobs_accounting table and the jobs_augment view of a Rocoto database if needed
+
+    A jobs_augment table made by earlier versions of rocoto_viewer is replaced by the view.
+    """
+    with connection:
+        (kind,) = connection.execute("SELECT COALESCE(MAX(type), '') FROM sqlite_master WHERE name = 'jobs_augment'").fetchone()
+        if kind == 'table':
+            connection.execute('DROP TABLE jobs_augment')
+        connection.execute('CREATE TABLE IF NOT EXISTS jobs_accounting (jobid TEXT PRIMARY KEY, qtime INTEGER, '
+                           'cputime INTEGER, runtime INTEGER, slots INTEGER, finished INTEGER)')
+        connection.execute('CREATE VIEW IF NOT EXISTS jobs_augment AS '
+                           'SELECT jobs.*, a.qtime, a.cputime, a.runtime, a.slots '
+                           'FROM jobs LEFT JOIN jobs_accounting AS a ON a.jobid = jobs.jobid')
+
+
+ACCOUNTING_BACKENDS = {backend.name: backend for backend in (SlurmAccounting, PBSAccounting, LSFAccounting)}
+
+
+def get_accounting_backend(name=None, run=None):
+    """
+    Accounting backend of the named scheduler, or of the first scheduler whose command is available
+
+    Returns None if no scheduler command is found.
+    """
+    if name is not None:
+        return ACCOUNTING_BACKENDS[name.lower()](run=run)
+    for backend in ACCOUNTING_BACKENDS.values():
+        if backend.available():
+            return backend(run=run)
+    return None
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+Headless status service for many Rocoto experiments
+
+Watches any number of (workflow XML, database) pairs from a single process and
+publishes a JSON and an HTML snapshot of each experiment, plus an index of all
+of them, in an output directory:
+
+    rocoto_status.py -o /path/to/www EXPDIR1 EXPDIR2 my.xml:my.db ...
+
+An experiment is given either as its EXPDIR (holding <PSLOT>.xml and <PSLOT>.db)
+or as XML:DB.  Reading the database and building the task model reuses the
+rocoto_viewer code (RocotoStatModel and the cached compiled task list), so each
+refresh only reads the job rows that changed.  The databases are polled with
+asyncio: an experiment is only refreshed when its database changed (the database
+file or, for a database in WAL mode, its -wal file), and
+refreshes run one at a time in a worker thread, so the load grows with the
+number of changes rather than with the number of experiments.  Scheduler
+statistics (--scheduler-stats) come from the rocoto_accounting backend of the
+host's scheduler, queried once per interval for the unfinished jobs of all
+experiments together.
+"""
+
+import asyncio
+import html
+import json
+import os
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import monotonic
+
+import rocoto_viewer
+from rocoto_accounting import get_accounting_backend
+
+STATE_COLORS = {'SUCCEEDED': 'green', 'QUEUED': 'yellow', 'DEAD': 'red', 'FAILED': 'red', 'RUNNING': 'blue'}
+
+
+class Experiment:
+    """
+    Task model and latest status of one Rocoto experiment
+    """
+
+    def __init__(self, workflow_file, database_file):
+        self.workflow_file = os.path.abspath(workflow_file)
+        self.database_file = os.path.abspath(database_file)
+        self.entity_values = rocoto_viewer.get_entity_values(self.workflow_file)
+        self.name = self.entity_values.get('PSLOT') or os.path.splitext(os.path.basename(self.workflow_file))[0]
+        self.package = self.entity_values.get('PACKAGE') or 'none'
+
+        self.stat_model = rocoto_viewer.RocotoStatModel(self.database_file)
+        self.tasklist = None
+        self.workflow_signature = None
+        self.database_signature = None
+        self.rocoto_stat = []
+        self.updated = None
+
+    def changed(self):
+        """
+        Whether the workflow or the database changed since the last refresh (a few stat calls)
+        """
+        return (self._signature(self.workflow_file) != self.workflow_signature or
+                self._database_signature(self.database_file) != self.database_signature)
+
+    def refresh(self):
+        """
+        Bring the task model and status up to date with the workflow and the database
+        """
+        workflow_signature = self._signature(self.workflow_file)
+        database_signature = self._database_signature(self.database_file)
+
+        if self.tasklist is None or workflow_signature != self.workflow_signature:
+            # get_tasklist reads these rocoto_viewer globals; refreshes are never concurrent
+            rocoto_viewer.PACKAGE = self.package
+            rocoto_viewer.entity_values = self.entity_values
+            self.tasklist = rocoto_viewer.get_tasklist(self.workflow_file)
+        tasks_ordered, _, cycledef_group_cycles = self.tasklist
+
+        connection = sqlite3.connect(f'file:{self.database_file}?mode=ro', uri=True)
+        try:
+            self.stat_model.poll(connection.cursor())
+        finally:
+            connection.close()
+        self.rocoto_stat = self.stat_model.rocoto_stat(tasks_ordered, cycledef_group_cycles)
+
+        self.workflow_signature = workflow_signature
+        self.database_signature = database_signature
+        self.updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def jobids(self, ncycles):
+        """
+        Job IDs of the tasks of the last ncycles cycles
+        """
+        return [line.split()[2] for lines in self.rocoto_stat[-ncycles:] for line in lines if line.split()[2] != '-']
+
+    def snapshot(self, ncycles, perf=None):
+        """
+        Status of the experiment: state counts of every cycle and the tasks of the last ncycles cycles
+        """
+        cycles = []
+        for index, lines in enumerate(self.rocoto_stat):
+            tasks = []
+            for line in lines:
+                cycle, taskname, jobid, state, exit_status, tries, duration = line.split()[:7]
+                task = {'task': taskname, 'jobid': jobid, 'state': state, 'exit_status': exit_status,
+                        'tries': tries, 'duration': duration}
+                if perf and jobid in perf:
+                    task.update({name: value for name, value in perf[jobid]._asdict().items() if name != 'finished'})
+                tasks.append(task)
+            entry = {'cycle': cycle, 'states': dict(Counter(task['state'] for task in tasks))}
+            if index >= len(self.rocoto_stat) - ncycles:
+                entry['tasks'] = tasks
+            cycles.append(entry)
+
+        return {'experiment': self.name,
+                'workflow': self.workflow_file,
+                'database': self.database_file,
+                'updated': self.updated,
+                'cycles': cycles}
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def _database_signature(cls, path):
+        # In WAL mode, commits only append to the -wal file until it is checkpointed into the database
+        return (cls._signature(path), cls._signature(f'{path}-wal'))
+
+
+class StatusService:
+    """
+    Polls a set of experiments and publishes their snapshots in output_dir
+    """
+
+    def __init__(self, experiments, output_dir, interval=60, ncycles=3, scheduler_stats=False):
+        self.experiments = experiments
+        self.output_dir = output_dir
+        self.interval = interval
+        self.ncycles = ncycles
+
+        # A single worker: refreshes and scheduler queries are serialized (refreshes share
+        # rocoto_viewer globals) and use one core at most
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.accounting = get_accounting_backend() if scheduler_stats else None
+        self.snapshots = dict()
+        self.refreshes = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    async def run(self, once=False):
+        while True:
+            start = monotonic()
+            published = await self.poll()
+            if published:
+                self.write_index()
+                print(f"{datetime.now():%Y-%m-%d %H:%M:%S} published {', '.join(published)}")
+            if once:
+                break
+            await asyncio.sleep(max(0, self.interval - (monotonic() - start)))
+
+    async def poll(self):
+        """
+        Refresh the experiments that changed and publish those whose snapshot changed
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[self.refresh_experiment(experiment) for experiment in self.experiments])
+
+        # One scheduler query for the unfinished jobs of all the experiments
+        perf = None
+        if self.accounting is not None:
+            jobids = [jobid for experiment in self.experiments for jobid in experiment.jobids(self.ncycles)]
+            await loop.run_in_executor(self.executor, self.accounting.update, jobids)
+            perf = self.accounting.records
+
+        return [experiment.name for experiment in self.experiments if self.publish(experiment, perf)]
+
+    async def refresh_experiment(self, experiment):
+        if not experiment.changed():
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, experiment.refresh)
+            self.refreshes += 1
+        except Exception as err:
+            print(f'WARNING: unable to read {experiment.name} ({experiment.database_file}): {err}')
+
+    def publish(self, experiment, perf=None):
+        """
+        Write the snapshot of experiment if it changed since it was last written
+        """
+        snapshot = experiment.snapshot(self.ncycles, perf)
+        content = json.dumps(snapshot, indent=1)
+        if self.snapshots.get(experiment.name, (None,))[0] == content:
+            return False
+        self.snapshots[experiment.name] = (content, snapshot)
+
+        self._write(f'{experiment.name}.json', content)
+        self._write(f'{experiment.name}.html', render_html(snapshot))
+        return True
+
+    def write_index(self):
+        index = []
+        for name, (_, snapshot) in sorted(self.snapshots.items()):
+            last = snapshot['cycles'][-1] if snapshot['cycles'] else {'cycle': '-', 'states': {}}
+            index.append({'experiment': name, 'updated': snapshot['updated'],
+                          'cycle': last['cycle'], 'states': last['states']})
+        self._write('index.json', json.dumps(index, indent=1))
+
+        rows = []
+        for entry in index:
+            states = ' '.join(_colored(state, f'{state} {count}') for state, count in sorted(entry['states'].items()))
+            name = html.escape(entry['experiment'])
+            rows.append(f'<tr><td><a href="{name}.html">{name}</a></td><td>{entry["cycle"]}</td>'
+                        f'<td>{states}</td><td>{entry["updated"]}</td></tr>')
+        self._write('index.html', rocoto_viewer.ccs_html +
+                    '<table>\n<thead><tr><td>EXPERIMENT</td><td>CYCLE</td><td>STATES</td><td>UPDATED</td></tr></thead>\n'
+                    '<tbody>\n' + '\n'.join(rows) + '\n</tbody>\n</table>\n</html>\n')
+
+    def _write(self, filename, content):
+        path = os.path.join(self.output_dir, filename)
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(content)
+        os.replace(f'{path}.tmp', path)
+
+
+def _colored(state, text):
+    color = STATE_COLORS.get(state)
+    text = html.escape(text)
+    return f'<{color}>{text}</{color}>' if color else text
+
+
+def render_html(snapshot):
+    """
+    HTML page of an experiment snapshot, in the style of the rocoto_viewer html output
+    """
+    perf_columns = ('slots', 'qtime', 'cputime', 'runtime')
+    page = [rocoto_viewer.ccs_html,
+            f'<table>\n<thead><tr><td><a href="index.html">All experiments</a></td>'
+            f'<td>Refreshed: {snapshot["updated"]}</td><td>PSLOT: {html.escape(snapshot["experiment"])}</td></tr>\n'
+            f'</thead>\n</table>\n<br>\n']
+    for cycle in reversed(snapshot['cycles']):
+        if 'tasks' not in cycle:
+            break
+        has_perf = any('slots' in task for task in cycle['tasks'])
+        header = '<td>CYCLE</td><td>TASK</td><td>JOBID</td><td>STATE</td><td>EXIT</td><td>TRIES</td><td>DURATION</td>'
+        if has_perf:
+            header += '<td>SLOTS</td><td>QTIME</td><td>CPU</td><td>RUN</td>'
+        page.append(f'<table>\n<thead><tr>{header}</tr></thead>\n<tbody>\n')
+        for task in cycle['tasks']:
+            columns = [cycle['cycle'], html.escape(task['task']), task['jobid'], _colored(task['state'], task['state']),
+                       task['exit_status'], task['tries'], task['duration']]
+            if has_perf:
+                columns += [task.get(column, '-') for column in perf_columns]
+            page.append('<tr>' + ''.join(f'<td>{column}</td>' for column in columns) + '</tr>\n')
+        page.append('</tbody>\n</table>\n<br>\n')
+    page.append('</html>\n')
+    return ''.join(page)
+
+
+def find_experiment(spec):
+    """
+    Workflow XML and database of an experiment given as XML:DB or as its EXPDIR
+    """
+    if ':' in spec:
+        return spec.split(':', 1)
+    pslot = os.path.basename(os.path.normpath(spec))
+    return os.path.join(spec, f'{pslot}.xml'), os.path.join(spec, f'{pslot}.db')
+
+
+def input_args():
+    parser = ArgumentParser(description='Publish JSON and HTML status snapshots of Rocoto experiments')
+    parser.add_argument('experiments', nargs='+', help='EXPDIR (with PSLOT.xml and PSLOT.db) or XML:DB of each experiment')
+    parser.add_argument('-o', '--output', required=True, help='directory where the snapshots are written')
+    parser.add_argument('-i', '--interval', type=float, default=60, help='seconds between polls')
+    parser.add_argument('-n', '--cycles', type=int, default=3, help='number of most recent cycles listed task by task')
+    parser.add_argument('--scheduler-stats', action='store_true', help='add scheduler job statistics (sacct, qstat or bjobs)')
+    parser.add_argument('--once', action='store_true', help='poll and publish once, then exit')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = input_args()
+
+    experiments = []
+    for spec in args.experiments:
+        workflow_file, database_file = find_experiment(spec)
+        if not os.path.isfile(workflow_file):
+            sys.exit(f'ERROR: workflow file {workflow_file} not found')
+        experiment = Experiment(workflow_file, database_file)
+        if experiment.name in [other.name for other in experiments]:
+            experiment.name = f'{experiment.name}_{len(experiments)}'
+        experiments.append(experiment)
+
+    service = StatusService(experiments, args.output, interval=args.interval, ncycles=args.cycles,
+                            scheduler_stats=args.scheduler_stats)
+    try:
+        asyncio.run(service.run(once=args.once))
+    except KeyboardInterrupt:
+        pass
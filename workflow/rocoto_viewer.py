@@ -45,9 +45,13 @@ from datetime import datetime, timedelta
 import re
 import traceback
 import pickle
+import hashlib
 
 import sqlite3
 import collections
+
+from rocoto_accounting import augment_database, get_accounting_backend
+
 try:
     # The stock XML parser does not expand external entities, so
     # try to load lxml instead.
@@ -71,11 +75,12 @@ except ImportError:
 # Global Variables
 database_file_agmented = None
 use_performance_metrics = False
+# Scheduler accounting backend of the viewer session (with performance metrics)
+accounting_backend = None
 job_name_length_max = 50
 default_column_length_master = 125
 stat_read_time_delay = 3 * 60
 header_string = ''
-format_string = "jobid slots submit_time start_time cpu_used run_time delimiter=';'"
 
 ccs_html = '''
 <html>
@@ -340,23 +345,8 @@ Optional arguments:
 
 def augment_SQLite3(filename):
     connection = sqlite3.connect(filename)
-    c = connection.cursor()
-    # qinfo=q = c.execute("DROP TABLE IF EXISTS jobs_augment;")
-    c.execute("PRAGMA table_info(jobs_augment)").fetchall()
-    if any('qtime' in element for element in qinfo):
-        c.close()
-        return 'is_already_augmented'
-    else:
-        sql_create_augment_table = "CREATE TABLE jobs_augment AS SELECT * FROM jobs;"
-        c.execute(sql_create_augment_table)
-        c.execute("alter table jobs_augment add column qtime integer;")
-        c.execute("alter table jobs_augment add column cputime integer;")
-        c.execute("alter table jobs_augment add column runtime integer;")
-        c.execute("alter table jobs_augment add column slots integer;")
-        connection.commit()
-
-    c.close()
-    return 'now_augmented'
+    augment_database(connection)
+    connection.close()
 
 
 def isSQLite3(filename):
@@ -438,6 +428,10 @@ def get_arguments():
     elif perfmetrics_on is not None:
         usage('perfmetrics must be either set to true or false (e.g. --perfmetrics=True')
 
+    global accounting_backend
+    if use_performance_metrics:
+        accounting_backend = get_accounting_backend()
+
     send_html_to_rzdm = False
     if len(rzdm_path) != 0:
         if ':' not in rzdm_path or '@' not in rzdm_path:
@@ -487,92 +481,6 @@ def get_entity_values(workflow_file):
     return entity_values
 
 
-def timedelta_total_seconds(timedelta):
-    return (
-        timedelta.microseconds + 0.0 + (timedelta.seconds + timedelta.days * 24 * 3600) * 10 ** 6) / 10 ** 6
-
-
-def get_aug_perf_values(username):
-    global html_ouput
-    global format_keys
-    try:
-        which_bjobs = syscall(['which', 'bjobs'])
-    except Exception:
-        return None
-    bjobs = collections.defaultdict(dict)
-    aug_perf = collections.defaultdict(dict)
-    bjobs_line = syscall([which_bjobs, '-a', '-o', format_string, '-u', username])
-    if 'No job found' in bjobs_line:
-        return None
-    bjobs_lines = bjobs_line.split('\n')
-    for line_number, line in enumerate(bjobs_lines):
-        split_line = line.split(';')
-        if line_number == 0:
-            format_keys = split_line
-            continue
-        for i, value in enumerate(split_line):
-            if i == 0:
-                key = value
-            else:
-                if format_keys[i] in ('RUN_TIME', 'CPU_USED'):
-                    value_list = value.split()
-                    if len(value_list) > 1:
-                        value = value_list[0]
-                bjobs[key][format_keys[i]] = value
-    sub_time_string = ''
-    year = str(datetime.now().year) + ' '
-    sub_time = None
-    bstart_time = None
-    for jobid, keys in bjobs.items():
-        # debug.write(jobid+'\n')
-        for key in keys:
-            # debug.write('   '+key+":"+bjobs[jobid][key]+'\n')
-            try:
-                int_key = int(bjobs[jobid][key].strip())
-                str_key = str(int_key)
-            except Exception:
-                str_key = bjobs[jobid][key].strip()
-
-            if key == 'SUBMIT_TIME':
-                sub_time_string = str_key
-                try:
-                    sub_time = datetime.strptime(year + sub_time_string, '%Y %b %d %H:%M')
-                except Exception:
-                    sub_time = None
-                continue
-            elif key == 'START_TIME':
-                bstart_time_string = str_key
-                try:
-                    bstart_time = datetime.strptime(year + bstart_time_string, '%Y %b %d %H:%M')
-                except Exception:
-                    bstart_time = None
-                continue
-            elif key == 'RUN_TIME':
-                aug_perf[jobid]['runtime'] = str_key
-            elif key == 'CPU_USED':
-                aug_perf[jobid]['cputime'] = str_key
-            elif key == 'SLOTS':
-                aug_perf[jobid]['slots'] = str_key
-
-        if bstart_time_string == sub_time_string:
-            aug_perf[jobid]['qtime'] = '0'
-        elif sub_time is not None and bstart_time is None:
-            try:
-                aug_perf[jobid]['qtime'] = str(int((datetime.now() - sub_time).total_seconds()))
-            except AttributeError:
-                aug_perf[jobid]['qtime'] = str(int(timedelta_total_seconds(datetime.now() - sub_time)))
-
-        elif sub_time is not None and bstart_time is not None:
-            try:
-                aug_perf[jobid]['qtime'] = str(int((bstart_time - sub_time).total_seconds()))
-            except AttributeError:
-                aug_perf[jobid]['qtime'] = str(int(timedelta_total_seconds(bstart_time - sub_time)))
-        else:
-            aug_perf[jobid]['qtime'] = '-'
-
-    return aug_perf
-
-
 def help_screen(screen):
     max_row = 25
     box_cols = 60
@@ -867,8 +775,124 @@ def rocoto_run(params):
     return stat
 
 
+class CycleDefGroup:
+    """
+    Cycles of a cycledef group
+
+    Cycles defined by a start, an end and an increment are tested arithmetically
+    rather than enumerated; only cycles with a monthly increment (ugcs) are listed.
+    Membership is tested with a datetime or a YYYYMMDDHHMM string.
+    """
+
+    def __init__(self):
+        self.ranges = []
+        self.cycles = set()
+
+    def add_range(self, start_cycle, end_cycle, inc_cycle):
+        if inc_cycle <= timedelta(0):
+            if start_cycle <= end_cycle:
+                self.cycles.add(start_cycle)
+            return
+        self.ranges.append((start_cycle, end_cycle, inc_cycle))
+
+    def add_cycle(self, cycle):
+        self.cycles.add(cycle)
+
+    def __contains__(self, cycle):
+        if isinstance(cycle, str):
+            cycle = datetime.strptime(cycle, '%Y%m%d%H%M')
+        if cycle in self.cycles:
+            return True
+        for start_cycle, end_cycle, inc_cycle in self.ranges:
+            if start_cycle <= cycle <= end_cycle and (cycle - start_cycle) % inc_cycle == timedelta(0):
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.cycles) + sum((end_cycle - start_cycle) // inc_cycle + 1
+                                      for start_cycle, end_cycle, inc_cycle in self.ranges)
+
+    def __eq__(self, other):
+        return isinstance(other, CycleDefGroup) and (self.ranges, self.cycles) == (other.ranges, other.cycles)
+
+    def __hash__(self):
+        return hash((tuple(self.ranges), frozenset(self.cycles)))
+
+    def to_data(self):
+        return list(self.ranges), sorted(self.cycles)
+
+    @classmethod
+    def from_data(cls, data):
+        group = cls()
+        ranges, cycles = data
+        group.ranges = list(ranges)
+        group.cycles = set(cycles)
+        return group
+
+
+# The cache holds plain data only (no class of this module), so that it can be read
+# whether this module runs as a script (rocoto_viewer) or is imported (rocoto_status)
+tasklist_cache_version = 2
+
+
+def _tasklist_to_cache(tasklist):
+    tasks_ordered, metatask_list, cycledef_group_cycles = tasklist
+    return (list(tasks_ordered), dict(metatask_list),
+            {name: group.to_data() for name, group in cycledef_group_cycles.items()})
+
+
+def _tasklist_from_cache(data):
+    tasks_ordered, metatask_list, cycledef_groups = data
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
+    for name, group_data in cycledef_groups.items():
+        cycledef_group_cycles[name] = CycleDefGroup.from_data(group_data)
+    return tasks_ordered, collections.defaultdict(list, metatask_list), cycledef_group_cycles
+
+
 def get_tasklist(workflow_file):
+    """
+    Tasks, metatasks and cycledef groups of the workflow
+
+    The compiled task lists are cached next to the workflow file, keyed by the
+    hash and modification time of the XML, so that only the first viewer started
+    on a workflow (or after the XML changes) parses and expands it.
+    """
+    if list_tasks:
+        return compile_tasklist(workflow_file)
+
+    workflow_path = os.path.abspath(workflow_file)
+    cache_file = os.path.join(os.path.dirname(workflow_path), f'.{basename(workflow_path)}.tasklist.pkl')
+    with open(workflow_path, 'rb') as f:
+        workflow_hash = hashlib.sha256(f.read()).hexdigest()
+    cache_key = (tasklist_cache_version, workflow_hash, os.stat(workflow_path).st_mtime_ns, PACKAGE)
+    if PACKAGE.lower() == 'ugcs':
+        cache_key += tuple(entity_values[name] for name in ('SDATE', 'EDATE', 'INC_MONTHS'))
+
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_key, cached_tasklist = pickle.load(f)
+        if cached_key == cache_key:
+            return _tasklist_from_cache(cached_tasklist)
+    except Exception:
+        # Missing, stale or unreadable cache: compile the task lists again
+        pass
+
+    tasklist = compile_tasklist(workflow_file)
+
+    # The cache is only an optimization: ignore a read-only experiment directory
+    try:
+        with open(f'{cache_file}.{os.getpid()}', 'wb') as f:
+            pickle.dump((cache_key, _tasklist_to_cache(tasklist)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{cache_file}.{os.getpid()}', cache_file)
+    except OSError:
+        pass
+
+    return tasklist
+
+
+def compile_tasklist(workflow_file):
     tasks_ordered = []
+    task_names = set()
     metatask_list = collections.defaultdict(list)
     try:
         tree = ET.parse(workflow_file)
@@ -890,7 +914,7 @@ def get_tasklist(workflow_file):
             raise
 
     root = tree.getroot()
-    cycledef_group_cycles = collections.defaultdict(list)
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
     if list_tasks:
         curses.endwin()
         print()
@@ -903,7 +927,6 @@ def get_tasklist(workflow_file):
                 cycle_def_name = cycle_noname
             cycle_string = child.text.split()
 
-            ucgs_is_cron = None
             if PACKAGE.lower() == 'ugcs':
                 start_cycle = datetime.strptime(entity_values['SDATE'], '%Y%m%d%H%M')
                 end_cycle = datetime.strptime(entity_values['EDATE'], '%Y%m%d%H%M')
@@ -911,21 +934,13 @@ def get_tasklist(workflow_file):
                 # NOTE: this is for the special case when cycle for every month
                 inc_cycle = int(entity_values['INC_MONTHS'])
                 if inc_cycle == 0:
-                    inc_cycle = string_to_timedelta(cycle_string[2])
-                    ucgs_is_cron = False
-                else:
-                    ucgs_is_cron = True
-            else:
-                start_cycle = datetime.strptime(cycle_string[0], '%Y%m%d%H%M')
-                end_cycle = datetime.strptime(cycle_string[1], '%Y%m%d%H%M')
-                inc_cycle = string_to_timedelta(cycle_string[2])
-
-            while start_cycle <= end_cycle:
-                cycledef_group_cycles[cycle_def_name].append(start_cycle.strftime("%Y%m%d%H%M"))
-                if PACKAGE.lower() == 'ugcs' and ucgs_is_cron:
+                    cycledef_group_cycles[cycle_def_name].add_range(start_cycle, end_cycle, string_to_timedelta(cycle_string[2]))
+                    continue
+                while start_cycle <= end_cycle:
+                    cycledef_group_cycles[cycle_def_name].add_cycle(start_cycle)
                     try:
                         start_cycle = start_cycle + relativedelta(months=+inc_cycle)
-                    except AttributeError:
+                    except NameError:
                         curses.endwin()
                         eprint("""
                             Could not handle cycle increment measured in months because dateutil
@@ -936,8 +951,10 @@ def get_tasklist(workflow_file):
 
                             """)
                         sys.exit(-1)
-                else:
-                    start_cycle = start_cycle + inc_cycle
+            else:
+                start_cycle = datetime.strptime(cycle_string[0], '%Y%m%d%H%M')
+                end_cycle = datetime.strptime(cycle_string[1], '%Y%m%d%H%M')
+                cycledef_group_cycles[cycle_def_name].add_range(start_cycle, end_cycle, string_to_timedelta(cycle_string[2]))
         if child.tag == 'task':
             task_name = child.attrib['name']
             log_file = child.find('join').find('cyclestr').text.replace('@Y@m@d@H', 'CYCLE')
@@ -952,6 +969,7 @@ def get_tasklist(workflow_file):
                 #    for them in dependency.getchildren():
                 #        print(them.attrib)
             tasks_ordered.append((task_name, task_cycledefs, log_file))
+            task_names.add(task_name)
         elif child.tag == 'metatask':
             all_metatasks_iterator = child.iter('metatask')
             all_vars = dict()
@@ -994,8 +1012,9 @@ def get_tasklist(workflow_file):
                                     add_task.append((new_task_name, each_task_name[1], new_task_log))
                         for task in add_task:
                             if '#' not in task[0]:
-                                if task[0] not in [j[0] for j in tasks_ordered]:
+                                if task[0] not in task_names:
                                     tasks_ordered.append(task)
+                                    task_names.add(task[0])
                                     if not first_task_resolved:
                                         first_task_resolved = True
                                         first_task_resolved_name = task[0]
@@ -1022,163 +1041,187 @@ def get_tasklist(workflow_file):
     return tasks_ordered, metatask_list, cycledef_group_cycles
 
 
-def get_rocoto_stat(params, queue_stat):
-    workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles = params
-
-    global database_file_agmented
-    if len(tasks_ordered) == 0 or len(metatask_list) == 0 or len(cycledef_group_cycles) == 0 or list_tasks:
-        tasks_ordered, metatask_list, cycledef_group_cycles = get_tasklist(workflow_file)
-
-    if use_performance_metrics:
-        aug_perf = get_aug_perf_values(get_user)
-    else:
-        aug_perf = None
+class RocotoStatModel:
+    """
+    Indexed in-memory copy of the jobs and cycles tables of a Rocoto database
+
+    Each poll reads only the job rows added since the previous poll and the
+    rows that were not yet succeeded or expired (dead jobs may be rebooted).
+    Changes to other rows (e.g. rocotoboot of a succeeded task) are picked up by
+    the periodic complete reload.  The model is reloaded completely
+    when rows disappear (e.g. after rocotorewind), every full_reload_polls polls
+    and, with performance metrics, every time (accounting records keep changing
+    after the jobs finish).
+    The status lines of a cycle are only rebuilt when its job lines change.
+    """
 
-    info = collections.defaultdict(list)
-    cycles = set()
+    final_states = ('SUCCEEDED', 'EXPIRED')
+    full_reload_polls = 20
+    max_sql_variables = 500
 
-    connection = sqlite3.connect(database_file)
-    c = connection.cursor()
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self.jobs = dict()
+        self.active_ids = set()
+        self.max_id = -1
+        self.cycles = set()
+        self.polls = 0
+        self.cycle_cache = dict()
+        self.tasks_key = None
 
-    if use_performance_metrics:
-        c.execute("DROP TABLE IF EXISTS jobs_augment_tmp;")
-        sql_create_augment_table = "CREATE TABLE jobs_augment_tmp AS SELECT * FROM jobs;"
-        c.execute(sql_create_augment_table)
-        c.execute("alter table jobs_augment_tmp add column qtime integer;")
-        c.execute("alter table jobs_augment_tmp add column cputime integer;")
-        c.execute("alter table jobs_augment_tmp add column runtime integer;")
-        c.execute("alter table jobs_augment_tmp add column slots integer;")
-
-        sq_command = ''
-        column_updates = ('qtime', 'cputime', 'runtime', 'slots')
-        for column in column_updates:
-            sq_command += f"{column}=(SELECT jobs_augment.{column} FROM jobs_augment WHERE jobs_augment.id=jobs_augment_tmp.id)" + ','
-        sq_command = ';'.join(sq_command.rsplit(',', 1))
-        sq_command = 'UPDATE jobs_augment_tmp SET ' + sq_command
-        c.execute(sq_command)
-
-        sq_command = 'UPDATE jobs_augment_tmp SET'
-        for perf_jobid, perf_values in aug_perf.items():
-            for name, each_value in perf_values.items():
-                c.execute(f"{sq_command} {name} = '{each_value}' WHERE jobs_augment_tmp.jobid = {perf_jobid}")
-
-        c.execute("DROP TABLE IF EXISTS jobs_augment;")
-        c.execute("ALTER TABLE jobs_augment_tmp RENAME TO jobs_augment;")
-
-    cycledifitions = []
-    q = c.execute('SELECT id, groupname, cycledef FROM cycledef')
-    for row in q:
-        (theid, groupname, cycledef) = row
-        cycledifitions.append((theid, groupname, cycledef))
-
-    cycle_done_stat = dict()
-    q = c.execute('SELECT id,cycle,done FROM cycles')
-    for row in q:
-        (theid, cycle, done) = row
-        cycles.add(cycle)
-        cycle_done_stat[cycle] = done
+    def poll(self, cursor):
+        """
+        Bring the model up to date with the database
+        """
+        self.polls += 1
 
-    if use_performance_metrics:
-        q = c.execute('SELECT id,jobid,taskname,cycle,state,exit_status,duration,tries,qtime,cputime,runtime,slots FROM jobs_augment')
-    else:
-        q = c.execute('SELECT id,jobid,taskname,cycle,state,exit_status,duration,tries FROM jobs')
+        self.cycles = set(row[0] for row in cursor.execute('SELECT cycle FROM cycles'))
 
-    q_get = []
-    entered_jobids = []
-    last_task_index = 0
-    for row in q:
-        row = tuple('-' if x is None else x for x in row)
         if use_performance_metrics:
-            (theid, jobid, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
-        else:
-            (theid, jobid, taskname, cycle, state, exit_status, duration, tries, ) = row
-        if jobid in entered_jobids:
-            continue
+            columns = 'id,jobid,taskname,cycle,state,exit_status,duration,tries,qtime,cputime,runtime,slots'
+            table = 'jobs_augment'
         else:
-            if taskname in tasks_ordered:
-                task_index = [x[0] for x in task_ordered].index(taskname)
-                last_task_index = task_index
-            else:
-                task_index = last_task_index
-
-            if use_performance_metrics:
-                q_get.append((theid, jobid, task_index, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots))
-            else:
-                q_get.append((theid, jobid, task_index, taskname, cycle, state, exit_status, duration, tries))
-        entered_jobids.append(jobid)
-
-    q_get.sort(key=lambda x: x[2])
-
-    connection.commit()
-    c.close()
-
-    for row in q_get:
-        if use_performance_metrics:
-            (theid, jobid, task_order, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
-        else:
-            (theid, jobid, task_order, taskname, cycle, state, exit_status, duration, tries) = row
-        if jobid != '-':
+            columns = 'id,jobid,taskname,cycle,state,exit_status,duration,tries'
+            table = 'jobs'
+
+        if use_performance_metrics or self.max_id < 0 or self.polls % self.full_reload_polls == 0:
+            self._reload(cursor, columns, table)
+            return
+
+        self._merge(cursor.execute(f'SELECT {columns} FROM {table} WHERE id > ?', (self.max_id,)))
+        active_ids = sorted(self.active_ids)
+        for i in range(0, len(active_ids), self.max_sql_variables):
+            chunk = active_ids[i:i + self.max_sql_variables]
+            self._merge(cursor.execute(f"SELECT {columns} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+
+        # Rows were deleted if the table is now smaller than the model
+        (count,) = cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()
+        if count != len(self.jobs):
+            self._reload(cursor, columns, table)
+
+    def _reload(self, cursor, columns, table):
+        self.jobs.clear()
+        self.active_ids.clear()
+        self.max_id = -1
+        self._merge(cursor.execute(f'SELECT {columns} FROM {table}'))
+
+    def _merge(self, query):
+        """
+        Store the job id, task name, cycle and status line of each row by row id
+        """
+        for row in query:
+            row = tuple('-' if x is None else x for x in row)
             if use_performance_metrics:
+                (theid, jobid, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
                 line = (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
                         f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
                         f"{str(tries)} {str(duration).split('.')[0]} {str(slots)} "
                         f"{str(qtime)} {str(cputime).split('.')[0]} {str(runtime)}")
             else:
+                (theid, jobid, taskname, cycle, state, exit_status, duration, tries, ) = row
                 line = (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
                         f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
                         f"{str(tries)} {str(duration).split('.')[0]}")
-            info[cycle].append(line)
-
-    for every_cycle in cycles:
-        if len(info[every_cycle]) == 0:
-            info[every_cycle].append('place holder')
-
-    new_info = collections.defaultdict(list)
-    job_ids = []
-    job_id = ''
-    for each_cycle, lines_in_cycle in info.items():
-        for task in tasks_ordered:
-            skip_task = False
-            for each_line in lines_in_cycle:
-                if task[0] == each_line.split()[1]:
-                    job_id = each_line.split()[2]
-                    if job_id in job_ids:
-                        break
-                    cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
-                    cycledefs = task[1].split(',')
-                    if len(cycledefs) > 1:
-                        for each_cycledef in cycledefs:
-                            if cycle_string in cycledef_group_cycles[each_cycledef]:
-                                new_info[each_cycle].append(each_line)
-                                job_ids.append(job_id)
-                                skip_task = True
-                                break
-                    elif cycle_string in cycledef_group_cycles[task[1]]:
-                        new_info[each_cycle].append(each_line)
-                        job_ids.append(job_id)
-                        skip_task = True
-                        break
-            if skip_task:
+            self.jobs[theid] = (jobid, taskname, cycle, line)
+            self.max_id = max(self.max_id, theid)
+            if state in self.final_states:
+                self.active_ids.discard(theid)
+            else:
+                self.active_ids.add(theid)
+
+    def lines_by_cycle(self):
+        """
+        Task name, job id and status line of every job (first row of each job id, in table order), by cycle
+        """
+        info = collections.defaultdict(list)
+        entered_jobids = set()
+        for theid in sorted(self.jobs):
+            (jobid, taskname, cycle, line) = self.jobs[theid]
+            if jobid in entered_jobids:
                 continue
-            line = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M') + ' ' * 7 + task[0] + ' - - - - -'
-            cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
+            entered_jobids.add(jobid)
+            if jobid != '-':
+                info[cycle].append((taskname, str(jobid), line))
+        return info
+
+    def rocoto_stat(self, tasks_ordered, cycledef_group_cycles):
+        """
+        Status lines of each cycle with at least one task, in cycle order
+        """
+        tasks_key = (tuple(tasks_ordered), tuple(cycledef_group_cycles.items()))
+        if tasks_key != self.tasks_key:
+            self.cycle_cache.clear()
+            self.tasks_key = tasks_key
+
+        info = self.lines_by_cycle()
+        rocoto_stat = []
+        for cycle in sorted(self.cycles):
+            job_lines = tuple(info.get(cycle, ()))
+            cached = self.cycle_cache.get(cycle)
+            if cached is None or cached[0] != job_lines:
+                cached = (job_lines, self._cycle_lines(cycle, job_lines, tasks_ordered, cycledef_group_cycles))
+                self.cycle_cache[cycle] = cached
+            if len(cached[1]) != 0:
+                rocoto_stat.append(cached[1])
+        return rocoto_stat
+
+    @staticmethod
+    def _cycle_lines(cycle, job_lines, tasks_ordered, cycledef_group_cycles):
+        cycle_time = datetime.fromtimestamp(cycle)
+        cycle_string = cycle_time.strftime('%Y%m%d%H%M')
+        cycle_groups = set(name for name, cycles in cycledef_group_cycles.items() if cycle_time in cycles)
+
+        task_jobs = collections.defaultdict(list)
+        for taskname, jobid, line in job_lines:
+            task_jobs[taskname].append((jobid, line))
+
+        lines = []
+        job_ids = set()
+        for task in tasks_ordered:
             cycledefs = task[1].split(',')
-            if len(cycledefs) > 1:
-                for each_cycledef in cycledefs:
-                    if cycle_string in cycledef_group_cycles[each_cycledef]:
-                        new_info[each_cycle].append(line)
-                        skip_task = True
-                        break
-            elif cycle_string in cycledef_group_cycles[task[1]]:
-                new_info[each_cycle].append(line)
-                skip_task = True
-            if skip_task:
+            if not any(cycledef in cycle_groups for cycledef in cycledefs):
                 continue
+            # A task with several cycledefs lists all its jobs in the cycle, others only the first
+            task_has_job = False
+            for jobid, line in task_jobs.get(task[0], ()):
+                if jobid in job_ids:
+                    break
+                lines.append(line)
+                job_ids.add(jobid)
+                task_has_job = True
+                if len(cycledefs) == 1:
+                    break
+            if not task_has_job:
+                lines.append(cycle_string + ' ' * 7 + task[0] + ' - - - - -')
+        return lines
+
+
+def get_rocoto_stat(params, queue_stat):
+    workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model = params
+
+    global database_file_agmented
+    if len(tasks_ordered) == 0 or len(metatask_list) == 0 or len(cycledef_group_cycles) == 0 or list_tasks:
+        tasks_ordered, metatask_list, cycledef_group_cycles = get_tasklist(workflow_file)
+
+    if stat_model is None or stat_model.database_file != database_file:
+        stat_model = RocotoStatModel(database_file)
+
+    connection = sqlite3.connect(database_file)
+
+    if use_performance_metrics:
+        if accounting_backend is not None:
+            accounting_backend.update_database(connection)
+        else:
+            augment_database(connection)
+
+    c = connection.cursor()
+
+    stat_model.poll(c)
+
+    connection.commit()
+    c.close()
 
-    rocoto_stat = []
-    for cycle in sorted(cycles):
-        if len(new_info[cycle]) != 0:
-            rocoto_stat.append(new_info[cycle])
+    rocoto_stat = stat_model.rocoto_stat(tasks_ordered, cycledef_group_cycles)
 
     if save_checkfile_path is not None:
         stat_update_time = str(datetime.now()).rsplit(':', 1)[0]
@@ -1189,9 +1232,9 @@ def get_rocoto_stat(params, queue_stat):
             sys.exit(0)
 
     if use_multiprocessing:
-        queue_stat.put((rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles))
+        queue_stat.put((rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model))
     else:
-        return (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles)
+        return (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
 
 
 def display_results(results, screen, params):
@@ -1382,7 +1425,8 @@ def main(screen):
 
     tasks_ordered = []
     metatask_list = collections.defaultdict(list)
-    cycledef_group_cycles = collections.defaultdict(list)
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
+    stat_model = None
 
     queue_stat = Queue()
     queue_check = Queue()
@@ -1391,7 +1435,7 @@ def main(screen):
         curses.endwin()
         sys.stdout = os.fdopen(0, 'w', 0)
         print('Creating check point file ...')
-        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
         get_rocoto_stat(params, queue_stat)
 
     stat_update_time = ''
@@ -1438,21 +1482,21 @@ def main(screen):
                 header = header[:-reduce_header_size]
                 header = header[reduce_header_size:]
     if list_tasks:
-        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
         get_rocoto_stat(params, Queue())
         curses.endwin()
         sys.stdout = os.fdopen(0, 'w', 0)
         sys.exit(0)
 
     if save_checkfile_path is None or (save_checkfile_path is not None and not os.path.isfile(save_checkfile_path)):
-        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+        params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
         if use_multiprocessing:
             process_get_rocoto_stat = Process(target=get_rocoto_stat, args=[params, queue_stat])
             process_get_rocoto_stat.start()
             screen.addstr(mlines - 2, 0, 'No checkpoint file, must get rocoto stats please wait', curses.A_BOLD)
             screen.addstr(mlines - 1, 0, 'Running rocotostat ', curses.A_BOLD)
         else:
-            (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = get_rocoto_stat(params, Queue())
+            (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model) = get_rocoto_stat(params, Queue())
             header = header_string
             stat_update_time = str(datetime.now()).rsplit(':', 1)[0]
             header = header.replace('t' * 16, stat_update_time)
@@ -1491,7 +1535,7 @@ def main(screen):
                     sys.exit(1)
 
             if len(rocoto_stat_params) != 0:
-                (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = rocoto_stat_params
+                (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model) = rocoto_stat_params
                 if use_multiprocessing:
                     process_get_rocoto_stat.join()
                     process_get_rocoto_stat.terminate()
@@ -2031,7 +2075,7 @@ def main(screen):
                 except Exception:
                     rocoto_stat_tmp = ''
                 if len(rocoto_stat_tmp) != 0:
-                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = rocoto_stat_tmp
+                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model) = rocoto_stat_tmp
                     process_get_rocoto_stat.join()
                     process_get_rocoto_stat.terminate()
                     update_pad = True
@@ -2458,8 +2502,8 @@ def main(screen):
             if diff > stat_read_time_delay and not loading_stat:
                 start_time = current_time
                 if not use_multiprocessing:
-                    params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
-                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = get_rocoto_stat(params, Queue())
+                    params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
+                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model) = get_rocoto_stat(params, Queue())
                     stat_update_time = str(datetime.now()).rsplit(':', 1)[0]
                     header = header_string
                     header = header.replace('t' * 16, stat_update_time)
@@ -2473,7 +2517,7 @@ def main(screen):
                 else:
                     loading_stat = True
                     screen.addstr(mlines - 2, 0, 'Running rocotostat                                        ')
-                    params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+                    params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles, stat_model)
                     process_get_rocoto_stat = Process(target=get_rocoto_stat, args=[params, queue_stat])
                     process_get_rocoto_stat.start()
 
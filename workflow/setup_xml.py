@@ -7,8 +7,8 @@ import os
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
 from applications.application_factory import app_config_factory
+from config_cache import CachedConfiguration
 from rocoto.rocoto_xml_factory import rocoto_xml_factory
-from wxflow import Configuration
 
 
 def input_args(*argv):
@@ -36,6 +36,8 @@ def input_args(*argv):
                         default=25, required=False)
     parser.add_argument('--verbosity', help='verbosity level of Rocoto', type=int,
                         default=10, required=False)
+    parser.add_argument('--no-config-cache', help='ignore and do not write the cache of sourced config files',
+                        dest='config_cache', action='store_false', required=False)
 
     return parser.parse_args(argv[0][0] if len(argv[0]) else None)
 
@@ -57,7 +59,9 @@ def main(*argv):
                          'taskthrottle': user_inputs.taskthrottle,
                          'verbosity': user_inputs.verbosity}
 
-    cfg = Configuration(user_inputs.expdir)
+    # Sourced configs are cached in EXPDIR and reused until a config file (or the environment it references) changes
+    cache_file = os.path.join(user_inputs.expdir, '.config_cache.json') if user_inputs.config_cache else None
+    cfg = CachedConfiguration(user_inputs.expdir, cache_file=cache_file)
 
     base = cfg.parse_config('config.base')
 
@@ -68,6 +72,8 @@ def main(*argv):
 
     # Configure the application
     app_config = app_config_factory.create(f'{net}_{mode}', cfg)
+    print(f'config sourcing cache: {cfg.hits} hits, {cfg.misses} misses')
+    cfg.save()
 
     # Create Rocoto Tasks and Assemble them into an XML
     xml = rocoto_xml_factory.create(f'{net}_{mode}', app_config, rocoto_param_dict)